@@ -0,0 +1,41 @@
+from django_filters import rest_framework as filters
+
+from backend.models import CatalogItem, Order, STATE_CHOICES
+from backend.services.product_facets import filter_by_parameters, parse_parameter_filters
+from backend.services.product_search import search_catalog_items
+
+
+class CatalogItemFilter(filters.FilterSet):
+    product_id = filters.NumberFilter(field_name='product_id')
+    shop_id = filters.NumberFilter(field_name='shop_id')
+    external_id = filters.NumberFilter(field_name='external_id')
+    category_id = filters.NumberFilter(field_name='category_id')
+    product__category__name = filters.CharFilter(field_name='category_name')
+    search = filters.CharFilter(method='filter_search', label='Поиск по названию и модели')
+
+    class Meta:
+        model = CatalogItem
+        fields = ['product_id', 'shop_id', 'external_id', 'category_id', 'product__category__name']
+
+    def filter_search(self, queryset, name, value):
+        return search_catalog_items(queryset, value)
+
+    def filter_queryset(self, queryset):
+        """
+        Кроме полей фильтра применяет фильтры по параметрам товара param[<имя>]=<значение>
+        """
+        queryset = super().filter_queryset(queryset)
+        return filter_by_parameters(queryset, parse_parameter_filters(self.data))
+
+
+class OrderFilter(filters.FilterSet):
+    state = filters.ChoiceFilter(field_name='state', choices=STATE_CHOICES)
+    dt = filters.IsoDateTimeFromToRangeFilter(field_name='dt', label='Дата заказа (dt_after, dt_before)')
+
+    class Meta:
+        model = Order
+        fields = ['state', 'dt']
+
+
+class ShopOrderFilter(OrderFilter):
+    dt = filters.IsoDateTimeFromToRangeFilter(field_name='shop_dt', label='Дата заказа (dt_after, dt_before)')
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from backend.models import Shop
+from backend.services.catalog import rebuild_shop_catalog
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает плоский каталог товаров (CatalogItem) всех или указанных магазинов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shop', type=int, nargs='*', help='id магазинов')
+
+    def handle(self, *args, **options):
+        shop_ids = options['shop'] or Shop.objects.values_list('id', flat=True)
+        for shop_id in shop_ids:
+            self.stdout.write(f'{shop_id}: {rebuild_shop_catalog(shop_id)}')
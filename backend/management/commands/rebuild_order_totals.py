@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from backend.services.order_totals import ORDER_TOTALS_CHUNK_SIZE, rebuild_order_totals
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сохраненные суммы и количество позиций всех заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=ORDER_TOTALS_CHUNK_SIZE,
+                            help='Сколько заказов обновлять одним запросом')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Обновлено заказов: {rebuild_order_totals(options["chunk_size"])}')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from backend.services.feed_scheduler import refresh_shop_feeds
+
+
+class Command(BaseCommand):
+    help = 'Обновляет прайсы всех магазинов, у которых указана ссылка на прайс'
+
+    def handle(self, *args, **options):
+        results = refresh_shop_feeds()
+        for shop_id, result in results.items():
+            self.stdout.write(f'{shop_id}: {result}')
+        failed = sum(1 for result in results.values() if not result['Status'])
+        self.stdout.write(f'Обновлено магазинов: {len(results) - failed}, с ошибками: {failed}')
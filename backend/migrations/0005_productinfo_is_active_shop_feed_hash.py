@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:26
+
+from django.db import migrations, models
+
+
+def dedupe_product_infos(apps, schema_editor):
+    """
+    Оставляет одну позицию (последнюю созданную) на пару магазин - внешний ИД:
+    позиции заказов с дублями переносятся на нее (количество в одном заказе складывается),
+    дубли удаляются
+    """
+    ProductInfo = apps.get_model('backend', 'ProductInfo')
+    OrderItem = apps.get_model('backend', 'OrderItem')
+
+    duplicates = list(ProductInfo.objects.values('shop_id', 'external_id').order_by().annotate(
+        count=models.Count('id'), keep_id=models.Max('id')).filter(count__gt=1))
+    for duplicate in duplicates:
+        keep_id = duplicate['keep_id']
+        stale_ids = list(ProductInfo.objects.filter(shop_id=duplicate['shop_id'], external_id=duplicate[
+            'external_id']).exclude(id=keep_id).values_list('id', flat=True))
+        for order_item in OrderItem.objects.filter(product_info_id__in=stale_ids).order_by('id'):
+            kept = OrderItem.objects.filter(order_id=order_item.order_id, product_info_id=keep_id).first()
+            if kept:
+                kept.quantity += order_item.quantity
+                kept.save(update_fields=['quantity'])
+                order_item.delete()
+            else:
+                order_item.product_info_id = keep_id
+                order_item.save(update_fields=['product_info'])
+        ProductInfo.objects.filter(id__in=stale_ids).delete()
+
+    if schema_editor.connection.vendor == 'postgresql':
+        # отложенные проверки внешних ключей выполняются до изменения схемы таблицы
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0004_alter_order_user_alter_product_category_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='productinfo',
+            name='unique_product_info',
+        ),
+        migrations.AddField(
+            model_name='productinfo',
+            name='is_active',
+            field=models.BooleanField(default=True, verbose_name='Есть в прайсе'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='feed_hash',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='Хеш последнего прайса'),
+        ),
+        migrations.RunPython(dedupe_product_infos, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='productinfo',
+            constraint=models.UniqueConstraint(fields=('shop', 'external_id'), name='unique_product_info'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0005_productinfo_is_active_shop_feed_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='feed_etag',
+            field=models.CharField(blank=True, default='', max_length=200, verbose_name='ETag последнего прайса'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='feed_last_modified',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='Last-Modified последнего прайса'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0006_shop_feed_etag_last_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='last_import_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последняя успешная загрузка прайса'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='last_import_duration',
+            field=models.FloatField(blank=True, null=True, verbose_name='Длительность последней загрузки, с'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='last_import_rows',
+            field=models.PositiveIntegerField(default=0, verbose_name='Товаров в последнем прайсе'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0007_shop_last_import'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productinfo',
+            index=models.Index(fields=['shop', 'id'], name='product_info_shop_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productinfo',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['id'], name='product_info_active_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:38
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_INDEX = 'product_info_search_idx'
+
+
+def create_search_index(apps, schema_editor):
+    """
+    GIN индекс и заполнение search_vector существующих позиций (только PostgreSQL)
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON backend_productinfo USING gin (search_vector)')
+    schema_editor.execute(
+        "UPDATE backend_productinfo SET search_vector = "
+        "setweight(to_tsvector('simple', coalesce(backend_product.name, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(backend_productinfo.model, '')), 'B') "
+        "FROM backend_product WHERE backend_product.id = backend_productinfo.product_id")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0008_productinfo_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productinfo',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0009_productinfo_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productparameter',
+            index=models.Index(fields=['parameter', 'value', 'product_info'], name='product_parameter_facet_idx'),
+        ),
+    ]
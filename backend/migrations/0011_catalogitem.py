@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:41
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+SEARCH_INDEX = 'catalog_item_search_idx'
+
+
+def fill_catalog(apps, schema_editor):
+    """
+    Заполняет каталог позициями в продаже включенных магазинов,
+    в PostgreSQL создает GIN индекс и поисковые векторы
+    """
+    CatalogItem = apps.get_model('backend', 'CatalogItem')
+    ProductInfo = apps.get_model('backend', 'ProductInfo')
+    ProductParameter = apps.get_model('backend', 'ProductParameter')
+
+    # параметры загружаются одним запросом на пачку из 2000 позиций
+    product_infos = ProductInfo.objects.filter(shop__state=True, is_active=True).select_related(
+        'product__category').prefetch_related(models.Prefetch(
+            'product_parameters', queryset=ProductParameter.objects.select_related('parameter').order_by('id')))
+    items = []
+    for product_info in product_infos.iterator(chunk_size=2000):
+        product = product_info.product
+        parameters = [(product_parameter.parameter.name, product_parameter.value)
+                      for product_parameter in product_info.product_parameters.all()]
+        items.append(CatalogItem(product_info_id=product_info.id, product_id=product.id, shop_id=product_info.shop_id,
+                                 category_id=product.category_id, external_id=product_info.external_id,
+                                 model=product_info.model, product_name=product.name,
+                                 category_name=product.category.name, quantity=product_info.quantity,
+                                 price=product_info.price, price_rrc=product_info.price_rrc,
+                                 parameters=[{'parameter': name, 'value': value} for name, value in parameters]))
+        if len(items) >= 2000:
+            CatalogItem.objects.bulk_create(items)
+            items = []
+    CatalogItem.objects.bulk_create(items)
+
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON backend_catalogitem USING gin (search_vector)')
+        schema_editor.execute(
+            "UPDATE backend_catalogitem SET search_vector = "
+            "setweight(to_tsvector('simple', coalesce(product_name, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(model, '')), 'B')")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0010_productparameter_facet_index'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='productinfo',
+            name='search_vector',
+        ),
+        migrations.CreateModel(
+            name='CatalogItem',
+            fields=[
+                ('product_info', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='catalog_item', serialize=False, to='backend.productinfo', verbose_name='Информация о продукте')),
+                ('external_id', models.PositiveIntegerField(verbose_name='Внешний ИД')),
+                ('model', models.CharField(max_length=80, verbose_name='Модель')),
+                ('product_name', models.CharField(max_length=80, verbose_name='Название продукта')),
+                ('category_name', models.CharField(max_length=40, verbose_name='Название категории')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Количество')),
+                ('price', models.PositiveIntegerField(verbose_name='Цена')),
+                ('price_rrc', models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')),
+                ('parameters', models.JSONField(default=list, verbose_name='Параметры')),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='catalog_items', to='backend.category', verbose_name='Категория')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='catalog_items', to='backend.product', verbose_name='Продукт')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='catalog_items', to='backend.shop', verbose_name='Магазин')),
+            ],
+            options={
+                'verbose_name': 'Позиция каталога',
+                'verbose_name_plural': 'Каталог',
+                'indexes': [models.Index(fields=['shop', 'product_info'], name='catalog_item_shop_idx'), models.Index(fields=['category_name', 'product_info'], name='catalog_item_category_idx')],
+            },
+        ),
+        migrations.RunPython(fill_catalog, drop_search_index),
+    ]
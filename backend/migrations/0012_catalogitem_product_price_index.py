@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0011_catalogitem'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='catalogitem',
+            index=models.Index(fields=['product', 'price'], name='catalog_item_product_price_idx'),
+        ),
+    ]
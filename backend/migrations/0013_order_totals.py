@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:49
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_order_totals(apps, schema_editor):
+    Order = apps.get_model('backend', 'Order')
+    OrderItem = apps.get_model('backend', 'OrderItem')
+    items = OrderItem.objects.filter(order_id=OuterRef('pk')).order_by().values('order_id')
+    Order.objects.update(
+        total_sum=Coalesce(Subquery(items.annotate(total=Sum(F('quantity') * F('product_info__price'))).values('total')), 0),
+        items_count=Coalesce(Subquery(items.annotate(count=Count('id')).values('count')), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0012_catalogitem_product_price_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество позиций'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_sum',
+            field=models.PositiveBigIntegerField(default=0, editable=False, verbose_name='Сумма заказа'),
+        ),
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+    ]
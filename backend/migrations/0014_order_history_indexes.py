@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0013_order_totals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-dt', '-id'], name='order_user_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'state', '-dt', '-id'], name='order_user_state_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-dt', '-id'], name='order_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['product_info', 'order'], name='order_item_product_info_idx'),
+        ),
+    ]
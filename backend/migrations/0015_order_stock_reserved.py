@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0014_order_history_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_reserved',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Товар зарезервирован'),
+        ),
+    ]
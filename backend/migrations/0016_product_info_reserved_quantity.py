@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:13
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def move_reservations(apps, schema_editor):
+    """
+    Товар оформленных заказов раньше списывался из quantity:
+    возвращаем его в quantity и переносим в reserved_quantity
+    """
+    ProductInfo = apps.get_model('backend', 'ProductInfo')
+    OrderItem = apps.get_model('backend', 'OrderItem')
+    reserved = OrderItem.objects.filter(order__stock_reserved=True).values('product_info_id').annotate(
+        total=Sum('quantity')).values_list('product_info_id', 'total')
+    for product_info_id, total in reserved.iterator():
+        ProductInfo.objects.filter(id=product_info_id).update(quantity=F('quantity') + total, reserved_quantity=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0015_order_stock_reserved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productinfo',
+            name='reserved_quantity',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Зарезервировано в заказах'),
+        ),
+        migrations.RunPython(move_reservations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_order_shops(apps, schema_editor):
+    """
+    Заполняет магазины заказов по их позициям пачками по 1000 заказов
+    """
+    Order = apps.get_model('backend', 'Order')
+    OrderItem = apps.get_model('backend', 'OrderItem')
+    OrderShop = apps.get_model('backend', 'OrderShop')
+    last_id = 0
+    while True:
+        order_ids = list(Order.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:1000])
+        if not order_ids:
+            return
+        order_shops = OrderItem.objects.filter(order_id__in=order_ids).order_by().values_list(
+            'order_id', 'product_info__shop_id', 'order__dt').distinct()
+        OrderShop.objects.bulk_create([OrderShop(order_id=order_id, shop_id=shop_id, dt=dt)
+                                       for order_id, shop_id, dt in order_shops])
+        last_id = order_ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0016_product_info_reserved_quantity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderShop',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dt', models.DateTimeField(verbose_name='Дата заказа')),
+            ],
+            options={
+                'verbose_name': 'Магазин заказа',
+                'verbose_name_plural': 'Магазины заказов',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_dt_idx',
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='product_info',
+            field=models.ForeignKey(blank=True, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='ordered_items', to='backend.productinfo', verbose_name='Информация о продукте'),
+        ),
+        migrations.AddField(
+            model_name='ordershop',
+            name='order',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='order_shops', to='backend.order', verbose_name='Заказ'),
+        ),
+        migrations.AddField(
+            model_name='ordershop',
+            name='shop',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='order_shops', to='backend.shop', verbose_name='Магазин'),
+        ),
+        migrations.RunPython(fill_order_shops, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ordershop',
+            index=models.Index(fields=['shop', '-dt', '-order'], name='order_shop_dt_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ordershop',
+            constraint=models.UniqueConstraint(fields=('order', 'shop'), name='unique_order_shop'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:27
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def refresh_basket(apps, order_id):
+    """
+    Пересчитывает сумму, число позиций и магазины корзины после переноса в нее позиций
+    """
+    Order = apps.get_model('backend', 'Order')
+    OrderItem = apps.get_model('backend', 'OrderItem')
+    OrderShop = apps.get_model('backend', 'OrderShop')
+    items = OrderItem.objects.filter(order_id=OuterRef('pk')).order_by().values('order_id')
+    total_sum = items.annotate(total=Sum(F('quantity') * F('product_info__price'))).values('total')
+    Order.objects.filter(id=order_id).update(
+        total_sum=Coalesce(Subquery(total_sum), 0),
+        items_count=Coalesce(Subquery(items.annotate(count=Count('id')).values('count')), 0))
+    order_shops = OrderItem.objects.filter(order_id=order_id).order_by().values_list(
+        'product_info__shop_id', 'order__dt').distinct()
+    OrderShop.objects.bulk_create([OrderShop(order_id=order_id, shop_id=shop_id, dt=dt) for shop_id, dt in order_shops],
+                                  ignore_conflicts=True)
+
+
+def merge_baskets(apps, schema_editor):
+    """
+    Оставляет у пользователя одну корзину (первую созданную): позиции остальных корзин
+    переносятся в нее (количество одного товара складывается), остальные корзины удаляются
+    """
+    Order = apps.get_model('backend', 'Order')
+    OrderItem = apps.get_model('backend', 'OrderItem')
+
+    duplicates = list(Order.objects.filter(state='basket').values('user_id').order_by().annotate(
+        count=Count('id'), keep_id=Min('id')).filter(count__gt=1))
+    for duplicate in duplicates:
+        keep_id = duplicate['keep_id']
+        stale_ids = list(Order.objects.filter(user_id=duplicate['user_id'], state='basket').exclude(
+            id=keep_id).values_list('id', flat=True))
+        for order_item in OrderItem.objects.filter(order_id__in=stale_ids).order_by('id'):
+            kept = OrderItem.objects.filter(order_id=keep_id, product_info_id=order_item.product_info_id).first()
+            if kept:
+                kept.quantity += order_item.quantity
+                kept.save(update_fields=['quantity'])
+                order_item.delete()
+            else:
+                order_item.order_id = keep_id
+                order_item.save(update_fields=['order'])
+        Order.objects.filter(id__in=stale_ids).delete()
+        refresh_basket(apps, keep_id)
+
+    if schema_editor.connection.vendor == 'postgresql':
+        # отложенные проверки внешних ключей выполняются до изменения схемы таблицы
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0017_order_shops'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_baskets, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('state', 'basket')), fields=('user',), name='unique_user_basket'),
+        ),
+    ]
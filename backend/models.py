@@ -6,6 +6,7 @@ from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.contrib.auth.models import UserManager as BaseUserManager
+from django.contrib.postgres.search import SearchVectorField
 
 
 
@@ -108,8 +109,13 @@ class Shop(models.Model):
                                 blank=True, null=True,
                                 on_delete=models.CASCADE)
     state = models.BooleanField(verbose_name='статус получения заказов', default=True)
-
-    # filename
+    feed_hash = models.CharField(verbose_name='Хеш последнего прайса', max_length=64, blank=True, default='')
+    feed_etag = models.CharField(verbose_name='ETag последнего прайса', max_length=200, blank=True, default='')
+    feed_last_modified = models.CharField(verbose_name='Last-Modified последнего прайса', max_length=64,
+                                          blank=True, default='')
+    last_import_at = models.DateTimeField(verbose_name='Последняя успешная загрузка прайса', null=True, blank=True)
+    last_import_duration = models.FloatField(verbose_name='Длительность последней загрузки, с', null=True, blank=True)
+    last_import_rows = models.PositiveIntegerField(verbose_name='Товаров в последнем прайсе', default=0)
 
     class Meta:
         verbose_name = 'Магазин'
@@ -155,14 +161,21 @@ class ProductInfo(models.Model):
     shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='product_infos',
                              on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(verbose_name='Количество')
+    reserved_quantity = models.PositiveIntegerField(verbose_name='Зарезервировано в заказах', default=0,
+                                                    editable=False)
     price = models.PositiveIntegerField(verbose_name='Цена')
     price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
+    is_active = models.BooleanField(verbose_name='Есть в прайсе', default=True)
 
     class Meta:
         verbose_name = 'Информация о продукте'
         verbose_name_plural = "Информационный список о продуктах"
         constraints = [
-            models.UniqueConstraint(fields=['product', 'shop', 'external_id'], name='unique_product_info'),
+            models.UniqueConstraint(fields=['shop', 'external_id'], name='unique_product_info'),
+        ]
+        indexes = [
+            models.Index(fields=['shop', 'id'], name='product_info_shop_id_idx'),
+            models.Index(fields=['id'], condition=models.Q(is_active=True), name='product_info_active_idx'),
         ]
 
 
@@ -192,6 +205,43 @@ class ProductParameter(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['product_info', 'parameter'], name='unique_product_parameter'),
         ]
+        indexes = [
+            models.Index(fields=['parameter', 'value', 'product_info'], name='product_parameter_facet_idx'),
+        ]
+
+
+class CatalogItem(models.Model):
+    """
+    Плоская копия позиции каталога для чтения: продукт, категория, магазин
+    и параметры в одной строке. Содержит только позиции в продаже
+    у включенных магазинов и перестраивается по магазину после загрузки прайса
+    и изменения статуса магазина (backend.services.catalog).
+    """
+    product_info = models.OneToOneField(ProductInfo, verbose_name='Информация о продукте', primary_key=True,
+                                        related_name='catalog_item', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, verbose_name='Продукт', related_name='catalog_items',
+                                on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='catalog_items', on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, verbose_name='Категория', related_name='catalog_items',
+                                 on_delete=models.CASCADE)
+    external_id = models.PositiveIntegerField(verbose_name='Внешний ИД')
+    model = models.CharField(max_length=80, verbose_name='Модель')
+    product_name = models.CharField(max_length=80, verbose_name='Название продукта')
+    category_name = models.CharField(max_length=40, verbose_name='Название категории')
+    quantity = models.PositiveIntegerField(verbose_name='Количество')
+    price = models.PositiveIntegerField(verbose_name='Цена')
+    price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
+    parameters = models.JSONField(verbose_name='Параметры', default=list)
+    search_vector = SearchVectorField(verbose_name='Поисковый вектор', null=True, editable=False)
+
+    class Meta:
+        verbose_name = 'Позиция каталога'
+        verbose_name_plural = "Каталог"
+        indexes = [
+            models.Index(fields=['shop', 'product_info'], name='catalog_item_shop_idx'),
+            models.Index(fields=['category_name', 'product_info'], name='catalog_item_category_idx'),
+            models.Index(fields=['product', 'price'], name='catalog_item_product_price_idx'),
+        ]
 
 
 class Contact(models.Model):
@@ -224,11 +274,21 @@ class Order(models.Model):
     contact = models.ForeignKey(Contact, verbose_name='Контакт',
                                 blank=True, null=True,
                                 on_delete=models.SET_NULL)
+    total_sum = models.PositiveBigIntegerField(verbose_name='Сумма заказа', default=0, editable=False)
+    items_count = models.PositiveIntegerField(verbose_name='Количество позиций', default=0, editable=False)
+    stock_reserved = models.BooleanField(verbose_name='Товар зарезервирован', default=False, editable=False)
 
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = "Список заказ"
         ordering = ('-dt',)
+        constraints = [
+            models.UniqueConstraint(fields=['user'], condition=models.Q(state='basket'), name='unique_user_basket'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-dt', '-id'], name='order_user_dt_idx'),
+            models.Index(fields=['user', 'state', '-dt', '-id'], name='order_user_state_dt_idx'),
+        ]
 
     def __str__(self):
         return str(self.dt)
@@ -238,8 +298,9 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, verbose_name='Заказ', related_name='ordered_items', blank=True,
                               on_delete=models.CASCADE)
 
+    # индекс по product_info - первое поле order_item_product_info_idx
     product_info = models.ForeignKey(ProductInfo, verbose_name='Информация о продукте', related_name='ordered_items',
-                                     blank=True,
+                                     blank=True, db_index=False,
                                      on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(verbose_name='Количество')
 
@@ -249,6 +310,34 @@ class OrderItem(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['order_id', 'product_info'], name='unique_order_item'),
         ]
+        indexes = [
+            models.Index(fields=['product_info', 'order'], name='order_item_product_info_idx'),
+        ]
+
+
+class OrderShop(models.Model):
+    """
+    Магазины заказа: строка на каждый магазин, товары которого есть в заказе,
+    с датой заказа. По индексу (shop, -dt, -order) заказы поставщика выбираются
+    от новых к старым без просмотра таблицы заказов. Строки обновляются вместе
+    с суммой заказа при изменении его позиций (backend.services.order_totals).
+    """
+    # индексы по order и shop - первые поля unique_order_shop и order_shop_dt_idx
+    order = models.ForeignKey(Order, verbose_name='Заказ', related_name='order_shops', db_index=False,
+                              on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='order_shops', db_index=False,
+                             on_delete=models.CASCADE)
+    dt = models.DateTimeField(verbose_name='Дата заказа')
+
+    class Meta:
+        verbose_name = 'Магазин заказа'
+        verbose_name_plural = "Магазины заказов"
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'shop'], name='unique_order_shop'),
+        ]
+        indexes = [
+            models.Index(fields=['shop', '-dt', '-order'], name='order_shop_dt_idx'),
+        ]
 
 
 class ConfirmOrderToken(models.Model):
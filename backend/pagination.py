@@ -0,0 +1,119 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Постраничный вывод по курсору из значений всех полей ordering.
+
+    CursorPagination хранит в курсоре только первое поле сортировки, а строки
+    с тем же значением пропускает смещением. Здесь позиция - значения всех полей
+    последней строки, и следующая страница выбирается условием (a, b) < (x, y),
+    поэтому последнее поле ordering должно быть уникальным.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse, position = (self.cursor.reverse, self.cursor.position) if self.cursor else (False, None)
+
+        queryset = queryset.order_by(*(_reverse_ordering(self.ordering) if reverse else self.ordering))
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.position_filter(json.loads(position), reverse))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.next_position = position is not None, position
+            self.has_previous, self.previous_position = following_position is not None, following_position
+        else:
+            self.has_next, self.next_position = following_position is not None, following_position
+            self.has_previous, self.previous_position = position is not None, position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def position_filter(self, values: list, reverse: bool) -> Q:
+        """
+        Строки после позиции values в порядке ordering: a < x или a = x и b < y.
+        Условие a <= x по первому полю задает границу просмотра индекса
+        """
+        if len(values) != len(self.ordering):
+            raise ValueError(values)
+        lookups = ['lt' if order.startswith('-') != reverse else 'gt' for order in self.ordering]
+        fields = [order.lstrip('-') for order in self.ordering]
+        condition, equal = Q(), Q()
+        for field, lookup, value in zip(fields, lookups, values):
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        bound = 'lte' if lookups[0] == 'lt' else 'gte'
+        return Q(**{f'{fields[0]}__{bound}': values[0]}) & condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        return json.dumps([str(getattr(instance, order.lstrip('-'))) for order in ordering])
+
+
+class CatalogCursorPagination(KeysetCursorPagination):
+    """
+    Постраничный вывод каталога по курсору (keyset): страница выбирается
+    условием pk > последний pk, поэтому дальние страницы не дороже первой
+    """
+    ordering = 'pk'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Результаты полнотекстового поиска выдаются по убыванию релевантности;
+        в курсоре хранятся и релевантность, и pk последней строки
+        """
+        if 'search_rank' in queryset.query.annotations:
+            return '-search_rank', 'pk'
+        return super().get_ordering(request, queryset, view)
+
+
+class ProductCompareCursorPagination(CursorPagination):
+    """
+    Постраничный вывод сравнения цен по курсору product_id
+    """
+    ordering = 'product_id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class OrderCursorPagination(KeysetCursorPagination):
+    """
+    Постраничный вывод заказов по курсору от новых к старым
+    """
+    ordering = ('-dt', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class ShopOrderCursorPagination(OrderCursorPagination):
+    """
+    Постраничный вывод заказов поставщика по дате заказа в OrderShop (индекс order_shop_dt_idx)
+    """
+    ordering = ('-shop_dt', '-id')
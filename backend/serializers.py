@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
 from backend.models import Category, Shop, Contact, Product, ProductParameter, ProductInfo, OrderItem, Order
+from backend.services.basket import BASKET_BULK_MAX_ITEMS
 
 from django.db.utils import IntegrityError
 
@@ -72,6 +73,11 @@ class OrderItemSerializer(serializers.ModelSerializer):
             'order': {'write_only': True}
         }
 
+    def validate_product_info(self, value):
+        if not value.is_active:
+            raise serializers.ValidationError({'error': "Товара нет в прайсе поставщика"})
+        return value
+
     def create(self, validated_data):
         user = validated_data.pop('user')
         order, _ = Order.objects.get_or_create(user=user, state='basket')
@@ -79,7 +85,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
             try:
                 contact = Contact.objects.get(user=user)
                 order.contact = contact
-                order.save()
+                order.save(update_fields=['contact'])
             except Contact.DoesNotExist:
                 order.contact = None
         try:
@@ -89,6 +95,23 @@ class OrderItemSerializer(serializers.ModelSerializer):
         return order_items
 
 
+class BasketLineSerializer(serializers.Serializer):
+    product_info = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=0)
+
+
+class BasketBulkSerializer(serializers.Serializer):
+    items = BasketLineSerializer(many=True, allow_empty=False, max_length=BASKET_BULK_MAX_ITEMS)
+
+    def validate_items(self, value):
+        added = {item['product_info'] for item in value if item['quantity']}
+        unknown = added - set(ProductInfo.objects.filter(id__in=added, is_active=True).values_list('id', flat=True))
+        if unknown:
+            raise serializers.ValidationError({'error': "Товара нет в прайсе поставщика",
+                                               'product_info': sorted(unknown)})
+        return value
+
+
 class OrderItemCreateSerializer(OrderItemSerializer):
     product_info = ProductInfoSerializer(read_only=True)
 
@@ -96,16 +119,128 @@ class OrderItemCreateSerializer(OrderItemSerializer):
 class OrderSerializer(serializers.ModelSerializer):
     ordered_items = OrderItemCreateSerializer(read_only=True, many=True)
 
-    total_sum = serializers.IntegerField(default=None)
     contact = ContactSerializer(read_only=True)
 
     class Meta:
         model = Order
-        fields = ('id', 'ordered_items', 'state', 'dt', 'total_sum', 'contact',)
-        read_only_fields = ('id',)
+        fields = ('id', 'ordered_items', 'state', 'dt', 'total_sum', 'items_count', 'contact',)
+        read_only_fields = ('id', 'total_sum', 'items_count',)
 
     def validate_state(self, value):
         if 'new' == value:
             if self.instance.contact == None:
                 raise serializers.ValidationError({'error': "contact is None"})
         return value
+
+    def update(self, instance, validated_data):
+        """
+        Сохраняет только измененные поля, не затирая total_sum и items_count,
+        пересчитанные в базе после загрузки заказа
+        """
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
+
+
+# Быстрые сериализаторы только для чтения.
+# Строят тот же JSON, что и ModelSerializer выше, из уже загруженных объектов
+# (с select_related/prefetch_related) без создания полей на каждую строку.
+
+datetime_field = serializers.DateTimeField()
+
+
+def product_info_data(product_info: ProductInfo) -> dict:
+    product = product_info.product
+    return {
+        'id': product_info.id,
+        'model': product_info.model,
+        'product': {'name': product.name, 'category': str(product.category)},
+        'shop': product_info.shop_id,
+        'quantity': product_info.quantity,
+        'price': product_info.price,
+        'price_rrc': product_info.price_rrc,
+        'product_parameters': [{'parameter': str(product_parameter.parameter), 'value': product_parameter.value}
+                               for product_parameter in product_info.product_parameters.all()],
+    }
+
+
+def contact_data(contact: Contact) -> dict:
+    return {
+        'city': contact.city,
+        'street': contact.street,
+        'house': contact.house,
+        'structure': contact.structure,
+        'building': contact.building,
+        'apartment': contact.apartment,
+        'phone': contact.phone,
+    }
+
+
+def order_data(order: Order) -> dict:
+    return {
+        'id': order.id,
+        'ordered_items': [{'id': order_item.id,
+                           'product_info': product_info_data(order_item.product_info),
+                           'quantity': order_item.quantity} for order_item in order.ordered_items.all()],
+        'state': order.state,
+        'dt': datetime_field.to_representation(order.dt),
+        'total_sum': order.total_sum,
+        'items_count': order.items_count,
+        'contact': None if order.contact is None else contact_data(order.contact),
+    }
+
+
+class ProductInfoFastSerializer(serializers.BaseSerializer):
+    """
+    ProductInfoSerializer для чтения
+    """
+
+    def to_representation(self, instance):
+        return product_info_data(instance)
+
+
+class CatalogItemSerializer(serializers.BaseSerializer):
+    """
+    Позиция каталога в том же виде, что и ProductInfoSerializer
+    """
+
+    def to_representation(self, instance):
+        return {
+            'id': instance.product_info_id,
+            'model': instance.model,
+            'product': {'name': instance.product_name, 'category': instance.category_name},
+            'shop': instance.shop_id,
+            'quantity': instance.quantity,
+            'price': instance.price,
+            'price_rrc': instance.price_rrc,
+            'product_parameters': instance.parameters,
+        }
+
+
+class OrderFastSerializer(serializers.BaseSerializer):
+    """
+    OrderSerializer для чтения
+    """
+
+    def to_representation(self, instance):
+        return order_data(instance)
+
+
+class ProductCompareSerializer(serializers.BaseSerializer):
+    """
+    Строка сравнения цен продукта в разных магазинах (из compare_products)
+    """
+
+    def to_representation(self, instance):
+        return {
+            'product_id': instance['product_id'],
+            'name': instance['product_name'],
+            'category': instance['category_name'],
+            'offers': instance['offers'],
+            'min_price': instance['min_price'],
+            'max_price': instance['max_price'],
+            'avg_price': round(float(instance['avg_price']), 2),
+            'quantity': instance['quantity'],
+            'cheapest_shop': instance['cheapest_shop'],
+        }
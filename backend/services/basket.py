@@ -0,0 +1,42 @@
+from typing import Iterable
+
+from django.db import transaction
+
+from backend.models import Contact, Order, OrderItem
+from backend.services.order_totals import deferred_order_totals, schedule_order_totals
+
+BASKET_BULK_MAX_ITEMS = 500
+
+
+def get_basket_for_update(user_id: int) -> Order:
+    """
+    Корзина пользователя, заблокированная до конца транзакции; создается, если ее нет.
+    Корзина у пользователя одна (unique_user_basket): при параллельном создании
+    второй запрос получает IntegrityError и берет корзину, созданную первым
+    """
+    order, _ = Order.objects.select_for_update().get_or_create(user_id=user_id, state='basket', defaults={
+        'contact': lambda: Contact.objects.filter(user_id=user_id).first()})
+    return order
+
+
+def update_basket(user_id: int, items: Iterable[dict]) -> Order:
+    """
+    Добавляет, изменяет и удаляет позиции корзины одной транзакцией:
+    удаление - одним DELETE, остальные позиции - одним INSERT ... ON CONFLICT
+    по unique_order_item, сумма корзины пересчитывается один раз
+    :param items: [{'product_info': id, 'quantity': количество}], quantity 0 удаляет позицию
+    :return: корзина
+    """
+    quantities = {item['product_info']: item['quantity'] for item in items}
+    with transaction.atomic(), deferred_order_totals():
+        order = get_basket_for_update(user_id)
+        removed = [product_info_id for product_info_id, quantity in quantities.items() if not quantity]
+        if removed:
+            OrderItem.objects.filter(order=order, product_info_id__in=removed).delete()
+        lines = [OrderItem(order=order, product_info_id=product_info_id, quantity=quantity)
+                 for product_info_id, quantity in quantities.items() if quantity]
+        if lines:
+            OrderItem.objects.bulk_create(lines, update_conflicts=True, unique_fields=['order', 'product_info'],
+                                          update_fields=['quantity'])
+        schedule_order_totals([order.id])
+    return order
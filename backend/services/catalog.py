@@ -0,0 +1,95 @@
+from django.db import transaction
+from django.db.models import Prefetch
+
+from backend.models import CatalogItem, ProductInfo, ProductParameter, Shop
+from backend.services.product_search import update_search_vectors
+from backend.services.response_cache import bump_catalog_version, PRODUCTS
+from backend.services.stock import available_quantity
+
+CATALOG_CHUNK_SIZE = 2000
+CATALOG_FIELDS = ['product_id', 'category_id', 'external_id', 'model', 'product_name', 'category_name', 'quantity',
+                  'price', 'price_rrc', 'parameters']
+SEARCH_FIELDS = ('product_name', 'model')
+
+
+def build_catalog_item(product_info: ProductInfo) -> CatalogItem:
+    """
+    Плоская позиция каталога из ProductInfo с продуктом, категорией и параметрами;
+    quantity позиции - свободный остаток без резерва оформленных заказов
+    """
+    product = product_info.product
+    return CatalogItem(product_info_id=product_info.id, product_id=product.id, shop_id=product_info.shop_id,
+                       category_id=product.category_id, external_id=product_info.external_id,
+                       model=product_info.model, product_name=product.name, category_name=product.category.name,
+                       quantity=available_quantity(product_info.quantity, product_info.reserved_quantity),
+                       price=product_info.price, price_rrc=product_info.price_rrc,
+                       parameters=[{'parameter': product_parameter.parameter.name, 'value': product_parameter.value}
+                                   for product_parameter in product_info.product_parameters.all()])
+
+
+def sync_catalog_items(items: list) -> int:
+    """
+    Сохраняет позиции каталога: новые создает, измененные обновляет, остальные не трогает.
+    Поисковый вектор пересчитывается только у позиций с новым названием или моделью
+    :return: количество созданных и обновленных позиций
+    """
+    existing = CatalogItem.objects.defer('search_vector').in_bulk([item.pk for item in items])
+    new, changed, reindexed = [], [], []
+    for item in items:
+        current = existing.get(item.pk)
+        if current is None:
+            new.append(item)
+            reindexed.append(item.pk)
+        elif any(getattr(current, field) != getattr(item, field) for field in CATALOG_FIELDS):
+            changed.append(item)
+            if any(getattr(current, field) != getattr(item, field) for field in SEARCH_FIELDS):
+                reindexed.append(item.pk)
+    CatalogItem.objects.bulk_create(new)
+    CatalogItem.objects.bulk_update(changed, CATALOG_FIELDS)
+    if reindexed:
+        update_search_vectors(CatalogItem.objects.filter(pk__in=reindexed))
+    return len(new) + len(changed)
+
+
+def rebuild_shop_catalog(shop_id: int) -> int:
+    """
+    Синхронизирует позиции каталога магазина одной транзакцией:
+    у включенного магазина создаются и обновляются только изменившиеся позиции в продаже
+    и удаляются снятые с продажи, у выключенного каталог очищается.
+    Если каталог изменился, закэшированные ответы каталога становятся недействительными.
+    :return: количество позиций в каталоге магазина
+    """
+    count = 0
+    with transaction.atomic():
+        if not Shop.objects.filter(id=shop_id, state=True).exists():
+            if CatalogItem.objects.filter(shop_id=shop_id).delete()[0]:
+                bump_catalog_version(PRODUCTS)
+            return count
+        modified = CatalogItem.objects.filter(shop_id=shop_id, product_info__is_active=False).delete()[0]
+        product_infos = ProductInfo.objects.filter(shop_id=shop_id, is_active=True).select_related(
+            'product__category').prefetch_related(Prefetch(
+            'product_parameters', queryset=ProductParameter.objects.select_related('parameter').order_by('id')))
+
+        chunk = []
+        for product_info in product_infos.iterator(chunk_size=CATALOG_CHUNK_SIZE):
+            chunk.append(build_catalog_item(product_info))
+            if len(chunk) >= CATALOG_CHUNK_SIZE:
+                modified += sync_catalog_items(chunk)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            modified += sync_catalog_items(chunk)
+            count += len(chunk)
+        if modified:
+            bump_catalog_version(PRODUCTS)
+    return count
+
+
+def rename_catalog_categories(names: dict) -> None:
+    """
+    Обновляет название категорий {category_id: name} в каталоге всех магазинов
+    """
+    for category_id, name in names.items():
+        CatalogItem.objects.filter(category_id=category_id).update(category_name=name)
+    if names:
+        bump_catalog_version(PRODUCTS)
@@ -0,0 +1,110 @@
+import csv
+import io
+import zlib
+from typing import Iterable, Iterator
+
+import ujson
+from django.db.models import QuerySet
+
+from backend.serializers import CatalogItemSerializer
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_BUFFER_SIZE = 64 * 1024
+CSV_COLUMNS = ('id', 'shop', 'model', 'name', 'category', 'quantity', 'price', 'price_rrc', 'parameters')
+
+
+def iter_catalog_rows(queryset: QuerySet) -> Iterator[dict]:
+    """
+    Позиции каталога в виде ответа /products/, выбираемые серверным курсором по EXPORT_CHUNK_SIZE строк
+    """
+    serializer = CatalogItemSerializer()
+    for item in queryset.defer('search_vector').order_by('pk').iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield serializer.to_representation(item)
+
+
+def iter_ndjson(queryset: QuerySet) -> Iterator[str]:
+    for row in iter_catalog_rows(queryset):
+        yield ujson.dumps(row, ensure_ascii=False) + '\n'
+
+
+def iter_csv(queryset: QuerySet) -> Iterator[str]:
+    """
+    CSV с колонками CSV_COLUMNS, параметры - JSON объект {имя: значение}
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values) -> str:
+        writer.writerow(values)
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    yield line(CSV_COLUMNS)
+    for row in iter_catalog_rows(queryset):
+        parameters = {parameter['parameter']: parameter['value'] for parameter in row['product_parameters']}
+        yield line((row['id'], row['shop'], row['model'], row['product']['name'], row['product']['category'],
+                    row['quantity'], row['price'], row['price_rrc'], ujson.dumps(parameters, ensure_ascii=False)))
+
+
+EXPORT_FORMATS = {
+    'ndjson': (iter_ndjson, 'application/x-ndjson'),
+    'csv': (iter_csv, 'text/csv; charset=utf-8'),
+}
+
+
+def buffered(lines: Iterable[str], size: int = EXPORT_BUFFER_SIZE) -> Iterator[bytes]:
+    """
+    Собирает строки в блоки примерно по size байт: меньше мелких записей в сокет
+    """
+    chunk, length = [], 0
+    for line in lines:
+        data = line.encode()
+        chunk.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(chunk)
+            chunk, length = [], 0
+    if chunk:
+        yield b''.join(chunk)
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Клиент принимает gzip: кодировка gzip (или *, если gzip не указан) с q > 0
+    """
+    qualities = {}
+    for coding in accept_encoding.split(','):
+        name, *params = [part.strip() for part in coding.split(';')]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name.lower()] = quality
+    quality = qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0)))
+    return quality > 0
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Сжимает поток gzip по частям; каждый блок сбрасывается сразу, чтобы клиент получал данные без задержки
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def export_catalog(queryset: QuerySet, export_format: str, gzip: bool = False) -> Iterator[bytes]:
+    """
+    Поток выгрузки каталога в формате ndjson или csv
+    """
+    serialize, _ = EXPORT_FORMATS[export_format]
+    chunks = buffered(serialize(queryset))
+    return gzip_chunks(chunks) if gzip else chunks
@@ -1,7 +1,7 @@
 from backend.models import ConfirmOrderToken, User
 from django.template.loader import render_to_string
 from backend.serializers import OrderSerializer
-from backend.services.toolbox_queryset import get_queryset_order_user, get_queryset_orders_for_send_email
+from backend.services.toolbox_queryset import get_queryset_orders
 from backend.tasks import celery_send_email
 
 
@@ -24,7 +24,7 @@ def send_order_status_update_email(instance):
         Отправка email клиенту: с обновленным статуcом заказа'
     """
     html_template = 'email_update_state_order.html'
-    instans = get_queryset_order_user(instance.id)
+    instans = get_queryset_orders(order_id=instance.id)
     serializer = OrderSerializer(instans, many=True)
     html_message = render_to_string(html_template, serializer.data[0])
 
@@ -36,7 +36,7 @@ def send_gratias_ordinis_email(instance):
         Отправка email клиенту: 'Спасибо за заказ'
     """
     html_template = 'email_thanks_order.html'
-    instans = get_queryset_order_user(instance.id)
+    instans = get_queryset_orders(order_id=instance.id)
     serializer = OrderSerializer(instans, many=True)
 
     html_message = render_to_string(html_template, serializer.data[0])
@@ -50,7 +50,7 @@ def send_shop_new_order_email(instance):
     html_template = 'email_new_order.html'
     shops_admins = User.objects.filter(shop__product_infos__ordered_items__order=instance.id).distinct()
     for admin in shops_admins:
-        data_order = get_queryset_orders_for_send_email(admin.id, instance.id)
+        data_order = get_queryset_orders(shop_user_id=admin.id, order_id=instance.id)
 
         serializer = OrderSerializer(data_order, many=True)
 
@@ -0,0 +1,88 @@
+import hashlib
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Iterable, NamedTuple, Optional, Tuple
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+from backend.services.feed_parsers import FeedFormatError
+
+FEED_CHUNK_SIZE = 64 * 1024
+FEED_SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+FEED_TIMEOUT = (5, 60)
+FEED_POOL_SIZE = 10
+
+_session = None
+
+
+class FetchedFeed(NamedTuple):
+    file: BinaryIO
+    content_hash: str
+    etag: str
+    last_modified: str
+    content_type: str
+
+
+def get_session() -> Session:
+    """
+    Общая сессия с пулом соединений для скачивания прайсов:
+    повторные загрузки с одного хоста не открывают новое TLS соединение
+    """
+    global _session
+    if _session is None:
+        session = Session()
+        adapter = HTTPAdapter(pool_connections=FEED_POOL_SIZE, pool_maxsize=FEED_POOL_SIZE, max_retries=2)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['Accept-Encoding'] = 'gzip, deflate'
+        _session = session
+    return _session
+
+
+def spool_feed(chunks: Iterable[bytes], max_size: Optional[int] = None) -> Tuple[BinaryIO, str]:
+    """
+    Сохраняет файл прайса во временный файл, считая его sha256.
+    Небольшие файлы остаются в памяти, большие сбрасываются на диск.
+    :param max_size: ограничение размера файла; при превышении скачивание прерывается
+    :raises FeedFormatError: файл больше max_size
+    :return: файл, открытый на начале, и хеш содержимого
+    """
+    digest, size = hashlib.sha256(), 0
+    file = SpooledTemporaryFile(max_size=FEED_SPOOL_MAX_MEMORY)
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            if max_size and size > max_size:
+                raise FeedFormatError(f'Размер прайса превышает {max_size} байт')
+            digest.update(chunk)
+            file.write(chunk)
+    except BaseException:
+        file.close()
+        raise
+    file.seek(0)
+    return file, digest.hexdigest()
+
+
+def fetch_feed(url: str, etag: str = '', last_modified: str = '',
+               max_size: Optional[int] = None) -> Optional[FetchedFeed]:
+    """
+    Скачивает прайс условным запросом
+    :param etag: ETag прошлой загрузки, отправляется в If-None-Match
+    :param last_modified: Last-Modified прошлой загрузки, отправляется в If-Modified-Since
+    :param max_size: ограничение размера скачиваемого прайса
+    :raises FeedFormatError: прайс больше max_size
+    :return: None, если сервер ответил 304 Not Modified
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    with get_session().get(url, headers=headers, stream=True, timeout=FEED_TIMEOUT) as response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        file, content_hash = spool_feed(response.iter_content(FEED_CHUNK_SIZE), max_size)
+        return FetchedFeed(file, content_hash, response.headers.get('ETag', ''),
+                           response.headers.get('Last-Modified', ''), response.headers.get('Content-Type', ''))
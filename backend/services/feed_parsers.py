@@ -0,0 +1,295 @@
+import csv
+import gzip
+import io
+from os.path import splitext
+from typing import BinaryIO, Callable, Iterator, Optional, Tuple
+from urllib.parse import urlparse
+
+import ujson
+try:
+    import zstandard
+except ImportError:  # поддержка zstd необязательна
+    zstandard = None
+from yaml.events import AliasEvent, ScalarEvent, SequenceStartEvent, SequenceEndEvent, MappingStartEvent, \
+    MappingEndEvent, StreamStartEvent, DocumentStartEvent
+from yaml.nodes import ScalarNode
+
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:  # PyYAML собран без libyaml
+    from yaml import SafeLoader as YamlLoader
+
+SHOP = 'shop'
+CATEGORY = 'category'
+GOOD = 'good'
+
+Record = Tuple[str, object]
+
+STR_TAG = 'tag:yaml.org,2002:str'
+
+SECTIONS = {'categories': CATEGORY, 'goods': GOOD}
+
+CSV_GOOD_COLUMNS = ('id', 'category', 'model', 'name', 'price', 'price_rrc', 'quantity')
+CSV_SERVICE_COLUMNS = ('shop', 'category_name')
+
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+COMPRESSED_EXTENSIONS = ('.gz', '.gzip', '.zst', '.zstd')
+
+
+class FeedFormatError(ValueError):
+    """
+    Файл прайса не соответствует ожидаемой структуре
+    """
+
+
+class LimitedReader(io.RawIOBase):
+    """
+    Поток, который не дает прочитать больше max_size байт
+    (защита от распаковки слишком больших архивов)
+    """
+
+    def __init__(self, stream: BinaryIO, max_size: int):
+        self.stream = stream
+        self.max_size = max_size
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.stream.read(len(buffer))
+        self.bytes_read += len(data)
+        if self.bytes_read > self.max_size:
+            raise FeedFormatError(f'Размер прайса превышает {self.max_size} байт')
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def open_feed_stream(stream: BinaryIO, max_size: Optional[int] = None) -> BinaryIO:
+    """
+    Возвращает поток с распакованным содержимым прайса.
+    Сжатие gzip и zstd определяется по сигнатуре файла, распаковка идет по частям.
+    :param max_size: ограничение размера распакованного прайса
+    """
+    stream = io.BufferedReader(stream) if not hasattr(stream, 'peek') else stream
+    magic = stream.peek(len(ZSTD_MAGIC))[:len(ZSTD_MAGIC)]
+    if magic.startswith(GZIP_MAGIC):
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    elif magic.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise FeedFormatError('Прайс сжат zstd, но пакет zstandard не установлен')
+        stream = zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+    if max_size:
+        stream = io.BufferedReader(LimitedReader(stream, max_size))
+    return stream
+
+
+def iter_document_records(data: dict) -> Iterator[Record]:
+    """
+    Преобразует уже разобранный прайс (как data/shop1.yaml) в поток записей
+    """
+    if not isinstance(data, dict):
+        raise FeedFormatError('Прайс должен быть словарем')
+    yield SHOP, data['shop']
+    for category in data.get('categories') or ():
+        yield CATEGORY, category
+    for item in data.get('goods') or ():
+        yield GOOD, item
+
+
+def _construct_value(loader: YamlLoader, anchors: dict):
+    """
+    Строит значение YAML (dict, list или скаляр) прямо из событий парсера.
+
+    Промежуточное дерево узлов не создается, а строки в кавычках
+    не проходят через резолвер, что заметно ускоряет разбор.
+    Результат совпадает с yaml.safe_load для структур прайса.
+    """
+    event = loader.get_event()
+    if isinstance(event, AliasEvent):
+        return anchors[event.anchor]
+
+    if isinstance(event, ScalarEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = STR_TAG if event.style else loader.resolve(ScalarNode, event.value, event.implicit)
+        if tag == STR_TAG:
+            value = event.value
+        else:
+            node = ScalarNode(tag, event.value, event.start_mark, event.end_mark, style=event.style)
+            constructor = loader.yaml_constructors.get(tag)
+            value = constructor(loader, node) if constructor else loader.construct_document(node)
+    elif isinstance(event, SequenceStartEvent):
+        value = []
+        while not loader.check_event(SequenceEndEvent):
+            value.append(_construct_value(loader, anchors))
+        loader.get_event()
+    elif isinstance(event, MappingStartEvent):
+        value = {}
+        while not loader.check_event(MappingEndEvent):
+            key = _construct_value(loader, anchors)
+            value[key] = _construct_value(loader, anchors)
+        loader.get_event()
+    else:
+        raise FeedFormatError(f'Неожиданное событие YAML: {event}')
+
+    if event.anchor is not None:
+        anchors[event.anchor] = value
+    return value
+
+
+def _expect(loader: YamlLoader, event_class) -> None:
+    if not loader.check_event(event_class):
+        raise FeedFormatError(f'Ожидалось {event_class.__name__}, получено {loader.peek_event()}')
+    loader.get_event()
+
+
+def iter_yaml_records(stream: BinaryIO) -> Iterator[Record]:
+    """
+    Потоково разбирает YAML прайс и возвращает записи по одной.
+
+    Файл читается парсером по частям, а в памяти одновременно находится
+    только текущий элемент categories/goods, поэтому потребление памяти
+    не зависит от размера прайса. Используется парсер libyaml (CSafeLoader),
+    если PyYAML собран с ним.
+    """
+    loader = YamlLoader(stream)
+    anchors = {}
+    try:
+        _expect(loader, StreamStartEvent)
+        _expect(loader, DocumentStartEvent)
+        _expect(loader, MappingStartEvent)
+        while not loader.check_event(MappingEndEvent):
+            key = _construct_value(loader, anchors)
+            kind = SECTIONS.get(key)
+            if kind and loader.check_event(SequenceStartEvent):
+                loader.get_event()
+                while not loader.check_event(SequenceEndEvent):
+                    yield kind, _construct_value(loader, anchors)
+                loader.get_event()
+            else:
+                value = _construct_value(loader, anchors)
+                if key == SHOP:
+                    yield SHOP, value
+    finally:
+        loader.dispose()
+
+
+def iter_json_records(stream: BinaryIO) -> Iterator[Record]:
+    """
+    Разбирает прайс в JSON той же структуры, что и YAML
+    """
+    try:
+        data = ujson.load(stream)
+    except ValueError as e:
+        raise FeedFormatError(f'Некорректный JSON: {e}')
+    yield from iter_document_records(data)
+
+
+def iter_ndjson_records(stream: BinaryIO) -> Iterator[Record]:
+    """
+    Потоково разбирает прайс в NDJSON.
+
+    Первая строка - заголовок {"shop": ..., "categories": [...]},
+    каждая следующая строка - один товар.
+    """
+    header = None
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            value = ujson.loads(line)
+        except ValueError as e:
+            raise FeedFormatError(f'Некорректный JSON в строке {number}: {e}')
+        if header is None:
+            if not isinstance(value, dict) or 'shop' not in value:
+                raise FeedFormatError('Первая строка NDJSON должна содержать магазин')
+            header = value
+            yield SHOP, header['shop']
+            for category in header.get('categories') or ():
+                yield CATEGORY, category
+        else:
+            yield GOOD, value
+
+
+def iter_csv_records(stream: BinaryIO) -> Iterator[Record]:
+    """
+    Потоково разбирает прайс в CSV.
+
+    Колонки: shop, id, category, category_name, model, name, price, price_rrc, quantity,
+    остальные колонки - параметры товара (пустые значения пропускаются).
+    Категория возвращается при первом появлении, до первого товара с ней.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    missing = {'shop', *CSV_GOOD_COLUMNS} - set(reader.fieldnames or ())
+    if missing:
+        raise FeedFormatError(f'В CSV нет колонок: {", ".join(sorted(missing))}')
+    parameter_columns = [column for column in reader.fieldnames
+                         if column not in CSV_GOOD_COLUMNS and column not in CSV_SERVICE_COLUMNS]
+
+    shop = None
+    categories = set()
+    for row in reader:
+        if shop is None:
+            shop = row['shop']
+            yield SHOP, shop
+        if row['category'] not in categories and row.get('category_name'):
+            categories.add(row['category'])
+            yield CATEGORY, {'id': row['category'], 'name': row['category_name']}
+        good = {column: row[column] for column in CSV_GOOD_COLUMNS}
+        good['parameters'] = {column: row[column] for column in parameter_columns if row[column]}
+        yield GOOD, good
+
+
+PARSERS = {
+    'yaml': iter_yaml_records,
+    'json': iter_json_records,
+    'ndjson': iter_ndjson_records,
+    'csv': iter_csv_records,
+}
+
+CONTENT_TYPES = {
+    'application/x-yaml': 'yaml',
+    'application/yaml': 'yaml',
+    'text/yaml': 'yaml',
+    'text/x-yaml': 'yaml',
+    'application/json': 'json',
+    'text/json': 'json',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/jsonlines': 'ndjson',
+    'text/csv': 'csv',
+}
+
+EXTENSIONS = {
+    '.yaml': 'yaml',
+    '.yml': 'yaml',
+    '.json': 'json',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.csv': 'csv',
+}
+
+DEFAULT_FORMAT = 'yaml'
+
+
+def detect_format(content_type: str = '', file_name: str = '') -> str:
+    """
+    Определяет формат прайса по Content-Type, а если он не указан
+    или неинформативен (text/plain, application/octet-stream, application/gzip) -
+    по расширению файла или ссылки (price.csv.gz считается CSV)
+    """
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    if media_type in CONTENT_TYPES:
+        return CONTENT_TYPES[media_type]
+    path, extension = splitext(urlparse(file_name or '').path.lower())
+    if extension in COMPRESSED_EXTENSIONS:
+        extension = splitext(path)[1]
+    return EXTENSIONS.get(extension, DEFAULT_FORMAT)
+
+
+def get_parser(content_type: str = '', file_name: str = '') -> Callable[[BinaryIO], Iterator[Record]]:
+    return PARSERS[detect_format(content_type, file_name)]
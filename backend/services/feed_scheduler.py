@@ -0,0 +1,34 @@
+from backend.models import Shop
+from backend.services.price_list_import import load_price_list_from_url
+
+
+def feed_shop_ids() -> list:
+    """
+    id магазинов, у которых указана ссылка на прайс
+    """
+    return list(Shop.objects.filter(url__isnull=False, user__isnull=False).exclude(url='').order_by(
+        'id').values_list('id', flat=True))
+
+
+def refresh_shop_feed(shop_id: int) -> dict:
+    """
+    Обновляет прайс одного магазина по ссылке.
+    Магазин, прайс которого уже загружается, пропускается.
+    """
+    shop = Shop.objects.filter(id=shop_id).exclude(url='').exclude(url__isnull=True).values(
+        'user_id', 'url').first()
+    if shop is None or shop['user_id'] is None:
+        return {'Status': False, 'Errors': 'У магазина нет ссылки на прайс'}
+    try:
+        return load_price_list_from_url(shop['url'], shop['user_id'], wait=False)
+    except Exception as e:
+        return {'Status': False, 'Errors': repr(e)}
+
+
+def refresh_shop_feeds() -> dict:
+    """
+    Обновляет прайсы всех магазинов со ссылкой по очереди в текущем процессе
+    (для команды refresh_shop_feeds; celery beat ставит отдельную задачу на каждый магазин)
+    :return: {id магазина: результат загрузки}
+    """
+    return {shop_id: refresh_shop_feed(shop_id) for shop_id in feed_shop_ids()}
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import re
+import tempfile
+import uuid
+from typing import BinaryIO, Iterable, Optional
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import Storage
+from django.utils.module_loading import import_string
+from rest_framework.request import Request
+
+from backend.services.feed_fetch import FEED_CHUNK_SIZE
+
+URL_MEDIA_TYPES = ('application/json', 'application/x-www-form-urlencoded', '')
+# запрос со ссылкой на прайс не больше этого размера; тело больше считается файлом прайса
+URL_REQUEST_MAX_SIZE = 8 * 1024
+MULTIPART_MEDIA_TYPE = 'multipart/form-data'
+
+FILENAME_RE = re.compile(r'filename\*?=(?:UTF-8\'\')?"?([^";]+)"?', re.IGNORECASE)
+
+
+class UploadTooLarge(ValueError):
+    """
+    Загружаемый файл прайса больше PRICE_LIST_MAX_UPLOAD_SIZE
+    """
+
+
+def price_list_storage() -> Storage:
+    """
+    Хранилище загруженных прайсов (PRICE_LIST_UPLOAD_STORAGE), общее для веб-процессов и воркеров celery
+    """
+    options = settings.PRICE_LIST_UPLOAD_STORAGE
+    return import_string(options['BACKEND'])(**options.get('OPTIONS', {}))
+
+
+def check_upload_size(request: Request) -> None:
+    """
+    Отклоняет запрос по заголовку Content-Length до разбора тела запроса
+    :raises UploadTooLarge: тело запроса больше PRICE_LIST_MAX_UPLOAD_SIZE
+    """
+    max_size = settings.PRICE_LIST_MAX_UPLOAD_SIZE
+    if int(request.META.get('CONTENT_LENGTH') or 0) > max_size + FEED_CHUNK_SIZE:
+        raise UploadTooLarge(max_size)
+
+
+def is_price_list_upload(request: Request) -> bool:
+    """
+    Прайс передан файлом (multipart) или телом запроса, а не ссылкой.
+    Тело с Content-Type запроса со ссылкой (JSON, форма) считается файлом, если передано
+    с Content-Disposition: attachment или больше URL_REQUEST_MAX_SIZE: такое тело не разбирается в память.
+    Разбирает multipart, поэтому вызывается после check_upload_size
+    """
+    media_type = request.content_type.split(';')[0].strip().lower()
+    if media_type == MULTIPART_MEDIA_TYPE:
+        return 'file' in request.FILES
+    return (media_type not in URL_MEDIA_TYPES or 'attachment' in request.headers.get('Content-Disposition', '')
+            or int(request.META.get('CONTENT_LENGTH') or 0) > URL_REQUEST_MAX_SIZE)
+
+
+def _iter_stream(stream: Optional[BinaryIO]) -> Iterable[bytes]:
+    if stream is None:
+        return
+    while chunk := stream.read(FEED_CHUNK_SIZE):
+        yield chunk
+
+
+def save_price_list_upload(request: Request) -> dict:
+    """
+    Сохраняет прайс из запроса в хранилище загрузок по частям,
+    не загружая его в память целиком
+    :raises UploadTooLarge: файл больше PRICE_LIST_MAX_UPLOAD_SIZE
+    :return: имя файла в хранилище, его sha256, Content-Type и исходное имя файла
+    """
+    max_size = settings.PRICE_LIST_MAX_UPLOAD_SIZE
+
+    if request.content_type.startswith(MULTIPART_MEDIA_TYPE):
+        upload = request.FILES['file']
+        chunks, content_type, file_name = upload.chunks(FEED_CHUNK_SIZE), upload.content_type, upload.name
+    else:
+        match = FILENAME_RE.search(request.headers.get('Content-Disposition', ''))
+        chunks, content_type = _iter_stream(request.stream), request.content_type
+        file_name = match.group(1) if match else ''
+
+    digest, size = hashlib.sha256(), 0
+    with tempfile.TemporaryFile() as file:
+        for chunk in chunks:
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLarge(max_size)
+            digest.update(chunk)
+            file.write(chunk)
+        if not size:
+            raise ValueError('Файл прайса пуст')
+        file.seek(0)
+        name = price_list_storage().save(f'{uuid.uuid4().hex}.upload', File(file))
+
+    return {'name': name, 'content_hash': digest.hexdigest(), 'content_type': content_type,
+            'file_name': os.path.basename(file_name)}
+
+
+def delete_price_list_upload(upload: dict) -> None:
+    """
+    Удаляет загруженный прайс из хранилища
+    """
+    price_list_storage().delete(upload['name'])
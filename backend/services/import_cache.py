@@ -0,0 +1,198 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from backend.models import Category, Product, Parameter
+
+LOOKUPS_VERSION_KEY = 'price_list_lookups:version'
+
+_shared_lookups = None
+_shared_version = None
+_shared_lock = Lock()
+
+
+class LRUCache:
+    """
+    Потокобезопасный словарь ограниченного размера, вытесняющий давно не использованные ключи
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_many(self, keys: Iterable) -> dict:
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    found[key] = self._data[key]
+        return found
+
+    def set_many(self, values: dict) -> None:
+        with self._lock:
+            for key, value in values.items():
+                self._data[key] = value
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+def get_lookups_version() -> int:
+    cache.add(LOOKUPS_VERSION_KEY, 1, timeout=None)
+    return cache.get(LOOKUPS_VERSION_KEY) or 1
+
+
+def _incr_lookups_version() -> None:
+    try:
+        cache.incr(LOOKUPS_VERSION_KEY)
+    except ValueError:
+        cache.add(LOOKUPS_VERSION_KEY, 1, timeout=None)
+
+
+def get_shared_lookups() -> Optional[dict]:
+    """
+    Общий для процесса кэш {'products': LRUCache, 'parameters': LRUCache}
+    размером PRICE_LIST_LOOKUP_CACHE_SIZE; None, если кэш отключен.
+    Кэш создается заново, если версия в кэше Django изменилась (clear_shared_lookups
+    в любом процессе)
+    """
+    global _shared_lookups, _shared_version
+    max_size = settings.PRICE_LIST_LOOKUP_CACHE_SIZE
+    if not max_size:
+        return None
+    version = get_lookups_version()
+    with _shared_lock:
+        if _shared_lookups is None or _shared_lookups['products'].max_size != max_size or _shared_version != version:
+            _shared_lookups = {'products': LRUCache(max_size), 'parameters': LRUCache(max_size)}
+            _shared_version = version
+        return _shared_lookups
+
+
+def clear_shared_lookups() -> None:
+    """
+    Сбрасывает общий кэш во всех процессах (вызывается при удалении категорий,
+    продуктов и параметров). Версия увеличивается сразу и еще раз после фиксации
+    транзакции, чтобы процесс, прочитавший удаляемые строки до фиксации,
+    не сохранил их id под новой версией.
+    """
+    _incr_lookups_version()
+    transaction.on_commit(_incr_lookups_version)
+    if _shared_lookups is not None:
+        for lookups in _shared_lookups.values():
+            lookups.clear()
+
+
+class ImportLookupCache:
+    """
+    Первичные ключи справочников на время одной загрузки прайса:
+    {category_id: name}, {name: parameter_id} и {(name, category_id): product_id}.
+
+    Категории и имена параметров загружаются целиком, продукты - те, что
+    уже продаются магазином, по одному запросу на таблицу. Отсутствующие
+    ключи ищутся сначала в общем LRU кэше процесса, затем в базе,
+    и создаются, если их нет; новые строки сразу попадают в кэш.
+    Общий кэш пополняется только после фиксации транзакции,
+    чтобы в него не попали id откаченных строк.
+    """
+
+    def __init__(self, shared: Optional[dict] = None):
+        self.shared = shared
+        self.categories = {}
+        self.parameters = {}
+        self.products = {}
+
+    def preload(self, shop_id: int) -> None:
+        self.categories = dict(Category.objects.values_list('id', 'name'))
+        self.parameters = dict(Parameter.objects.values_list('name', 'id'))
+        self.products = {(name, category_id): product_id for name, category_id, product_id in Product.objects.filter(
+            product_infos__shop_id=shop_id).values_list('name', 'category_id', 'id').distinct()}
+
+    def add_categories(self, categories: dict) -> dict:
+        """
+        Запоминает категории {category_id: name}
+        :return: категории, название которых изменилось
+        """
+        renamed = {category_id: name for category_id, name in categories.items()
+                   if category_id in self.categories and self.categories[category_id] != name}
+        self.categories.update(categories)
+        return renamed
+
+    def known_categories(self, category_ids: set) -> set:
+        """
+        Возвращает те из category_ids, что есть в базе
+        """
+        unknown = category_ids - self.categories.keys()
+        if unknown:
+            self.categories.update(Category.objects.filter(id__in=unknown).values_list('id', 'name'))
+        return category_ids & self.categories.keys()
+
+    def resolve_products(self, keys: set) -> dict:
+        """
+        Возвращает {(name, category_id): product_id}, создавая недостающие продукты одним запросом
+        """
+
+        def fetch(keys):
+            queryset = Product.objects.filter(name__in={name for name, _ in keys},
+                                              category_id__in={category_id for _, category_id in keys})
+            return {(name, category_id): product_id
+                    for name, category_id, product_id in queryset.values_list('name', 'category_id', 'id')
+                    if (name, category_id) in keys}
+
+        def create(keys):
+            Product.objects.bulk_create([Product(name=name, category_id=category_id) for name, category_id in keys])
+
+        return self._resolve(self.products, 'products', keys, fetch, create)
+
+    def resolve_parameters(self, names: set) -> dict:
+        """
+        Возвращает {name: parameter_id}, создавая недостающие имена параметров одним запросом
+        """
+
+        def fetch(names):
+            return dict(Parameter.objects.filter(name__in=names).values_list('name', 'id'))
+
+        def create(names):
+            Parameter.objects.bulk_create([Parameter(name=name) for name in names])
+
+        return self._resolve(self.parameters, 'parameters', names, fetch, create)
+
+    def _resolve(self, cache: dict, shared_name: str, keys: set, fetch, create) -> dict:
+        missing = keys - cache.keys()
+        if missing and self.shared is not None:
+            cache.update(self.shared[shared_name].get_many(missing))
+            missing -= cache.keys()
+        if missing:
+            cache.update(fetch(missing))
+            missing -= cache.keys()
+        if missing:
+            create(missing)
+            cache.update(fetch(missing))
+        return {key: cache[key] for key in keys}
+
+    def publish(self) -> None:
+        """
+        Передает найденные ключи в общий кэш после фиксации транзакции
+        """
+        if self.shared is None:
+            return
+        products, parameters = self.products, self.parameters
+        shared = self.shared
+
+        def update():
+            shared['products'].set_many(products)
+            shared['parameters'].set_many(parameters)
+
+        transaction.on_commit(update)
@@ -0,0 +1,103 @@
+from contextlib import contextmanager
+from threading import local
+from typing import Iterable
+
+from django.db.models import Count, Exists, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from backend.models import Order, OrderItem, OrderShop
+
+ORDER_TOTALS_CHUNK_SIZE = 1000
+
+_deferred = local()
+
+
+def order_totals() -> dict:
+    """
+    Выражения для UPDATE заказа: сумма (количество * цена) и число позиций
+    по его OrderItem, вычисляемые подзапросом в базе
+    """
+    items = OrderItem.objects.filter(order_id=OuterRef('pk')).order_by().values('order_id')
+    total_sum = items.annotate(total_sum=Sum(F('quantity') * F('product_info__price'))).values('total_sum')
+    items_count = items.annotate(items_count=Count('id')).values('items_count')
+    return {'total_sum': Coalesce(Subquery(total_sum), 0), 'items_count': Coalesce(Subquery(items_count), 0)}
+
+
+def refresh_order_shops(order_ids: list) -> None:
+    """
+    Приводит магазины заказов (OrderShop) в соответствие с их позициями:
+    удаляет магазины, позиций которых в заказе не осталось, и добавляет новые
+    """
+    items = OrderItem.objects.filter(order_id=OuterRef('order_id'), product_info__shop_id=OuterRef('shop_id'))
+    OrderShop.objects.filter(order_id__in=order_ids).exclude(Exists(items)).delete()
+    order_shops = OrderItem.objects.filter(order_id__in=order_ids).order_by().values_list(
+        'order_id', 'product_info__shop_id', 'order__dt').distinct()
+    OrderShop.objects.bulk_create([OrderShop(order_id=order_id, shop_id=shop_id, dt=dt)
+                                   for order_id, shop_id, dt in order_shops], ignore_conflicts=True)
+
+
+def refresh_order_totals(order_ids: Iterable[int]) -> int:
+    """
+    Пересчитывает total_sum и items_count заказов одним запросом
+    и обновляет магазины заказов
+    """
+    order_ids = list(order_ids)
+    if not order_ids:
+        return 0
+    refresh_order_shops(order_ids)
+    return Order.objects.filter(id__in=order_ids).update(**order_totals())
+
+
+@contextmanager
+def deferred_order_totals():
+    """
+    Откладывает пересчет заказов, запрошенный через schedule_order_totals,
+    до конца блока и выполняет его одним запросом
+    """
+    if getattr(_deferred, 'order_ids', None) is not None:
+        yield
+        return
+    _deferred.order_ids = set()
+    try:
+        yield
+        refresh_order_totals(_deferred.order_ids)
+    finally:
+        _deferred.order_ids = None
+
+
+def schedule_order_totals(order_ids: Iterable[int]) -> None:
+    """
+    Пересчитывает заказы сразу или в конце блока deferred_order_totals
+    """
+    order_ids = set(order_ids)
+    if getattr(_deferred, 'order_ids', None) is not None:
+        _deferred.order_ids |= order_ids
+    else:
+        refresh_order_totals(order_ids)
+
+
+def refresh_order_totals_for_product_infos(product_info_ids: Iterable[int]) -> int:
+    """
+    Пересчитывает суммы корзин, в которых есть указанные позиции (после изменения их цены).
+    Сумма оформленного заказа фиксируется при оформлении и от цен прайса больше не зависит
+    """
+    product_info_ids = list(product_info_ids)
+    if not product_info_ids:
+        return 0
+    orders = OrderItem.objects.filter(product_info_id__in=product_info_ids).values('order_id')
+    return Order.objects.filter(id__in=orders, state='basket').update(**order_totals())
+
+
+def rebuild_order_totals(chunk_size: int = ORDER_TOTALS_CHUNK_SIZE) -> int:
+    """
+    Пересчитывает суммы и магазины всех заказов пачками по chunk_size
+    :return: количество обновленных заказов
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        order_ids = list(Order.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not order_ids:
+            return updated
+        updated += refresh_order_totals(order_ids)
+        last_id = order_ids[-1]
@@ -1,48 +1,85 @@
-from requests import get
-from yaml import load as load_yaml, Loader
+import uuid
+
 from rest_framework.request import Request
+from django.core.cache import cache
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError
-from backend.models import Category, ProductInfo, Product, Shop, ProductParameter, Parameter
+from config.celery import get_result
+from backend.tasks import celery_update_price_list, celery_update_price_list_from_file
+from backend.services.feed_upload import check_upload_size, is_price_list_upload, save_price_list_upload, \
+    delete_price_list_upload, UploadTooLarge
+
+TASK_OWNER_TIMEOUT = 24 * 60 * 60
+
+
+def task_owner_key(task_id: str) -> str:
+    return f'price_list_task:{task_id}'
+
+
+def enqueue_price_list_task(task, args: tuple, user_id: int) -> str:
+    """
+    Запоминает владельца задачи до постановки в очередь, чтобы статус
+    любой задачи (в том числе еще не начатой) был доступен только ему
+    :return: id задачи
+    """
+    task_id = str(uuid.uuid4())
+    cache.set(task_owner_key(task_id), user_id, TASK_OWNER_TIMEOUT)
+    task.apply_async(args, task_id=task_id)
+    return task_id
 
 
 def updating_the_price_list_from_file(request: Request) -> dict:
     """
-    Загуржает данные из файла поставщиков
+    Ставит в очередь загрузку данных из файла поставщиков.
+    Файл передается ссылкой (url), полем file в multipart или телом запроса.
     :param request:
-    :return:
+    :return: id задачи celery для получения статуса загрузки
     """
+    try:
+        check_upload_size(request)
+        upload = save_price_list_upload(request) if is_price_list_upload(request) else None
+    except UploadTooLarge as e:
+        return {'Status': False, 'Errors': f'Размер файла превышает {e} байт'}
+    except ValueError as e:
+        return {'Status': False, 'Errors': str(e)}
+    if upload:
+        try:
+            task_id = enqueue_price_list_task(celery_update_price_list_from_file, (upload, request.user.id),
+                                              request.user.id)
+        except Exception:
+            delete_price_list_upload(upload)
+            raise
+        return {'Status': True, 'task_id': task_id}
+
     url = request.data.get('url')
     if url:
         try:
-            URLValidator(url)
+            URLValidator()(url)
         except ValidationError as e:
             return {'Status': False, 'Error': str(e)}
         else:
-            stream = get(url).content
-
-            data = load_yaml(stream, Loader=Loader)
-
-            shop, _ = Shop.objects.get_or_create(name=data['shop'], user_id=request.user.id)
-            for category in data['categories']:
-                category_object, _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
-                category_object.shops.add(shop.id)
-                category_object.save()
-            ProductInfo.objects.filter(shop_id=shop.id).delete()
-            for item in data['goods']:
-                product, _ = Product.objects.get_or_create(name=item['name'], category_id=item['category'])
-                product_info = ProductInfo.objects.create(product_id=product.id,
-                                                          external_id=item['id'],
-                                                          model=item['model'],
-                                                          price=item['price'],
-                                                          price_rrc=item['price_rrc'],
-                                                          quantity=item['quantity'],
-                                                          shop_id=shop.id)
-                for name, value in item['parameters'].items():
-                    parameter_object, _ = Parameter.objects.get_or_create(name=name)
-                    ProductParameter.objects.create(product_info_id=product_info.id,
-                                                    parameter_id=parameter_object.id,
-                                                    value=value)
-
-            return {'Status': True}
+            task_id = enqueue_price_list_task(celery_update_price_list, (url, request.user.id), request.user.id)
+
+            return {'Status': True, 'task_id': task_id}
     return {'Status': False, 'Errors': 'Не указаны все необходимые аргументы'}
+
+
+def get_price_list_update_status(task_id: str, user_id: int) -> dict:
+    """
+    Возвращает ход загрузки прайса: обработано товаров, ошибки и прошедшее время
+    :param task_id: id задачи celery
+    :param user_id: id пользователя-поставщика, запустившего загрузку
+    :return:
+    """
+    if cache.get(task_owner_key(task_id)) != user_id:
+        return {'Status': False, 'Errors': 'Задача не найдена'}
+    result = get_result(task_id)
+    info = result.info if isinstance(result.info, dict) else {}
+
+    status = {'Status': True, 'task_id': task_id, 'state': result.state}
+    for field in ('processed', 'errors_count', 'errors', 'elapsed'):
+        if field in info:
+            status[field] = info[field]
+    if result.failed():
+        status['errors'] = [repr(result.info)]
+    return status
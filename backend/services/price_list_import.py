@@ -0,0 +1,347 @@
+from itertools import islice
+from time import monotonic
+from typing import Callable, Iterable, Iterator, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from backend.models import Category, ProductInfo, Shop, ProductParameter, User
+from backend.services.feed_parsers import SHOP, CATEGORY, GOOD, Record, FeedFormatError, iter_document_records, \
+    get_parser, open_feed_stream
+from backend.services.feed_fetch import fetch_feed
+from backend.services.feed_upload import price_list_storage
+from backend.services.import_cache import ImportLookupCache, get_shared_lookups
+from backend.services.catalog import rebuild_shop_catalog, rename_catalog_categories
+from backend.services.order_totals import refresh_order_totals_for_product_infos
+from backend.services.response_cache import bump_catalog_version, CATEGORIES
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+GOOD_INTEGER_FIELDS = ('id', 'category', 'price', 'price_rrc', 'quantity')
+GOOD_STRING_FIELDS = ('model', 'name')
+SYNC_FIELDS = ['product_id', 'model', 'price', 'price_rrc', 'quantity', 'is_active']
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """
+    Разбивает последовательность на списки длиной не более size
+    """
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def clean_good(item: dict) -> dict:
+    """
+    Приводит товар из прайса к типам полей модели
+    :raises KeyError, TypeError, ValueError: товар не может быть загружен
+    """
+    good = {field: int(item[field]) for field in GOOD_INTEGER_FIELDS}
+    if any(good[field] < 0 for field in GOOD_INTEGER_FIELDS):
+        raise ValueError('отрицательное значение')
+    good.update({field: str(item[field]) for field in GOOD_STRING_FIELDS})
+    good['parameters'] = {str(name): str(value) for name, value in (item.get('parameters') or {}).items()}
+    return good
+
+
+class PriceListImporter:
+    """
+    Пакетная загрузка прайса поставщика.
+
+    Категории, продукты и имена параметров берутся из ImportLookupCache,
+    который загружается один раз на прайс, а ProductInfo и ProductParameter записываются через bulk_create,
+    поэтому число запросов зависит от количества пачек, а не товаров.
+
+    Товары, которые не удалось разобрать, пропускаются и попадают в errors.
+    После каждой пачки вызывается progress(importer).
+    """
+
+    def __init__(self, user_id: int, chunk_size: int = IMPORT_CHUNK_SIZE, progress: Optional[Callable] = None):
+        self.user_id = user_id
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.shop = None
+        self.lookups = ImportLookupCache(get_shared_lookups())
+        self.processed = 0
+        self.created = 0
+        self.updated = 0
+        self.retired = 0
+        self.seen_ids = set()
+        self.errors_count = 0
+        self.errors = []
+
+    def lock(self, wait: bool = True) -> bool:
+        """
+        Блокирует пользователя-поставщика до конца транзакции,
+        чтобы загрузки прайса одного магазина выполнялись по очереди
+        :param wait: ждать окончания другой загрузки; иначе сразу вернуть False
+        """
+        return bool(list(User.objects.select_for_update(skip_locked=not wait).filter(id=self.user_id).values_list(
+            'id', flat=True)))
+
+    def add_error(self, item: dict, error: Exception) -> None:
+        self.errors_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            external_id = item.get('id') if isinstance(item, dict) else None
+            self.errors.append(f'{external_id}: {error!r}')
+
+    def import_shop(self, name: str) -> Shop:
+        self.shop, _ = Shop.objects.update_or_create(user_id=self.user_id, defaults={'name': name})
+        self.lookups.preload(self.shop.id)
+        return self.shop
+
+    def import_categories(self, categories: Iterable[dict]) -> None:
+        categories = {int(category['id']): str(category['name']) for category in categories}
+        if not categories:
+            return
+        Category.objects.bulk_create([Category(id=category_id, name=name) for category_id, name in categories.items()],
+                                     update_conflicts=True, unique_fields=['id'], update_fields=['name'])
+        Category.shops.through.objects.bulk_create(
+            [Category.shops.through(category_id=category_id, shop_id=self.shop.id) for category_id in categories],
+            ignore_conflicts=True)
+        # bulk_create не отправляет post_save, поэтому список категорий сбрасывается здесь
+        bump_catalog_version(CATEGORIES)
+        rename_catalog_categories(self.lookups.add_categories(categories))
+
+    def import_records(self, records: Iterable[Record]) -> None:
+        """
+        Синхронизирует каталог магазина с потоком записей прайса.
+
+        Категории накапливаются и записываются перед очередной пачкой
+        товаров, товары сверяются с каталогом пачками по chunk_size.
+        Позиции, которых нет в прайсе, снимаются с продажи.
+        """
+        categories, goods = [], []
+        for kind, payload in records:
+            if kind == SHOP:
+                self.import_shop(payload)
+            elif kind == CATEGORY:
+                categories.append(payload)
+            elif kind == GOOD:
+                if self.shop is None:
+                    raise FeedFormatError('Магазин должен быть указан до товаров')
+                goods.append(payload)
+                if len(goods) >= self.chunk_size:
+                    self.import_categories(categories)
+                    self.import_goods_chunk(goods)
+                    categories, goods = [], []
+        if self.shop is None:
+            raise FeedFormatError('В прайсе не указан магазин')
+        self.import_categories(categories)
+        if goods:
+            self.import_goods_chunk(goods)
+        self.retire_missing()
+        self.lookups.publish()
+
+    def import_goods_chunk(self, chunk: list) -> None:
+        self._write_chunk(self._clean_chunk(chunk))
+        self.processed += len(chunk)
+        if self.progress:
+            self.progress(self)
+
+    def _clean_chunk(self, chunk: list) -> list:
+        goods = {}
+        for item in chunk:
+            try:
+                good = clean_good(item)
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                self.add_error(item, e)
+            else:
+                goods[good['id']] = good
+
+        known = self.lookups.known_categories({item['category'] for item in goods.values()})
+        valid = []
+        for item in goods.values():
+            if item['category'] in known:
+                valid.append(item)
+            else:
+                self.add_error(item, LookupError(f'неизвестная категория {item["category"]}'))
+        return valid
+
+    def _write_chunk(self, chunk: list) -> None:
+        """
+        Сверяет пачку товаров с ProductInfo магазина по external_id:
+        создает новые позиции, обновляет только изменившиеся поля и параметры
+        """
+        if not chunk:
+            return
+        products = self.lookups.resolve_products({(item['name'], item['category']) for item in chunk})
+        parameters = self.lookups.resolve_parameters({name for item in chunk for name in item['parameters']})
+
+        items = {item['id']: item for item in chunk}
+        existing = {product_info.external_id: product_info for product_info in ProductInfo.objects.filter(
+            shop_id=self.shop.id, external_id__in=items.keys()).only('id', 'external_id', *SYNC_FIELDS)}
+
+        new, changed, repriced = [], [], []
+        for external_id, item in items.items():
+            values = {'product_id': products[(item['name'], item['category'])], 'model': item['model'],
+                      'price': item['price'], 'price_rrc': item['price_rrc'], 'quantity': item['quantity'],
+                      'is_active': True}
+            product_info = existing.get(external_id)
+            if product_info is None:
+                new.append(ProductInfo(shop_id=self.shop.id, external_id=external_id, **values))
+            elif any(getattr(product_info, field) != value for field, value in values.items()):
+                if product_info.price != values['price']:
+                    repriced.append(product_info.id)
+                for field, value in values.items():
+                    setattr(product_info, field, value)
+                changed.append(product_info)
+
+        if new:
+            ProductInfo.objects.bulk_create(new)
+            existing.update({product_info.external_id: product_info for product_info in ProductInfo.objects.filter(
+                shop_id=self.shop.id, external_id__in=[i.external_id for i in new]).only('id', 'external_id')})
+        if changed:
+            ProductInfo.objects.bulk_update(changed, SYNC_FIELDS)
+        if repriced:
+            refresh_order_totals_for_product_infos(repriced)
+        self.created += len(new)
+        self.updated += len(changed)
+        self.seen_ids.update(product_info.id for product_info in existing.values())
+
+        self._sync_parameters({existing[external_id].id: {parameters[name]: value
+                                                          for name, value in item['parameters'].items()}
+                               for external_id, item in items.items()},
+                              new_ids={existing[i.external_id].id for i in new})
+
+    @staticmethod
+    def _sync_parameters(wanted: dict, new_ids: set) -> None:
+        """
+        Приводит ProductParameter к {product_info_id: {parameter_id: value}}
+        """
+        current = {}
+        existing_ids = wanted.keys() - new_ids
+        if existing_ids:
+            for product_parameter in ProductParameter.objects.filter(product_info_id__in=existing_ids):
+                current.setdefault(product_parameter.product_info_id, {})[
+                    product_parameter.parameter_id] = product_parameter
+
+        to_create, to_update, to_delete = [], [], []
+        for product_info_id, values in wanted.items():
+            current_values = current.get(product_info_id, {})
+            for parameter_id, value in values.items():
+                product_parameter = current_values.get(parameter_id)
+                if product_parameter is None:
+                    to_create.append(ProductParameter(product_info_id=product_info_id, parameter_id=parameter_id,
+                                                      value=value))
+                elif product_parameter.value != value:
+                    product_parameter.value = value
+                    to_update.append(product_parameter)
+            to_delete.extend(product_parameter.id for parameter_id, product_parameter in current_values.items()
+                             if parameter_id not in values)
+
+        if to_create:
+            ProductParameter.objects.bulk_create(to_create)
+        if to_update:
+            ProductParameter.objects.bulk_update(to_update, ['value'])
+        if to_delete:
+            ProductParameter.objects.filter(id__in=to_delete).delete()
+
+    def retire_missing(self) -> None:
+        """
+        Снимает с продажи позиции магазина, которых не было в прайсе
+        """
+        active_ids = ProductInfo.objects.filter(shop_id=self.shop.id, is_active=True).values_list('id', flat=True)
+        missing = [product_info_id for product_info_id in active_ids.iterator() if product_info_id not in self.seen_ids]
+        for chunk in chunked(missing, self.chunk_size):
+            self.retired += ProductInfo.objects.filter(id__in=chunk).update(is_active=False)
+
+    def result(self) -> dict:
+        return {'Status': True, 'processed': self.processed, 'created': self.created, 'updated': self.updated,
+                'retired': self.retired, 'errors_count': self.errors_count, 'errors': self.errors}
+
+
+def import_price_list_records(records: Iterable[Record], user_id: int, progress: Optional[Callable] = None,
+                              feed_state: Optional[dict] = None, wait: bool = True) -> dict:
+    """
+    Синхронизирует каталог поставщика с потоком записей прайса одной транзакцией
+    и перестраивает позиции магазина в CatalogItem
+    :param records: записи (SHOP | CATEGORY | GOOD, данные)
+    :param user_id: id пользователя-поставщика
+    :param progress: вызывается с импортером после каждой пачки товаров
+    :param feed_state: поля Shop, описывающие загруженный файл (url, feed_hash, feed_etag, feed_last_modified).
+        Сохраняются после загрузки; если feed_hash совпадает с прошлым, загрузка пропускается.
+    :param wait: ждать окончания уже идущей загрузки этого магазина; иначе пропустить загрузку
+    :return:
+    """
+    started = monotonic()
+    feed_state = feed_state or {}
+    importer = PriceListImporter(user_id, progress=progress)
+    with transaction.atomic():
+        if not importer.lock(wait):
+            return {'Status': False, 'Errors': 'Загрузка прайса этого магазина уже выполняется'}
+        content_hash = feed_state.get('feed_hash')
+        if content_hash and Shop.objects.filter(user_id=user_id, feed_hash=content_hash).exists():
+            Shop.objects.filter(user_id=user_id).update(**feed_state, **import_stats(started))
+            return {'Status': True, 'skipped': True}
+        importer.import_records(records)
+        rebuild_shop_catalog(importer.shop.id)
+        shop_state = {**feed_state, **import_stats(started, importer.processed)}
+        for field, value in shop_state.items():
+            setattr(importer.shop, field, value)
+        importer.shop.save(update_fields=list(shop_state))
+    return importer.result()
+
+
+def import_stats(started: float, rows: Optional[int] = None) -> dict:
+    """
+    Поля Shop с результатом последней успешной загрузки
+    :param started: время начала загрузки по time.monotonic()
+    :param rows: число обработанных товаров, если прайс разбирался
+    """
+    stats = {'last_import_at': timezone.now(), 'last_import_duration': round(monotonic() - started, 3)}
+    if rows is not None:
+        stats['last_import_rows'] = rows
+    return stats
+
+
+def import_price_list(data: dict, user_id: int, progress: Optional[Callable] = None) -> dict:
+    """
+    Записывает разобранный прайс поставщика в формате data/shop1.yaml
+    """
+    return import_price_list_records(iter_document_records(data), user_id, progress)
+
+
+def load_price_list_from_url(url: str, user_id: int, progress: Optional[Callable] = None, wait: bool = True) -> dict:
+    """
+    Скачивает прайс поставщика по ссылке и синхронизирует с ним каталог.
+
+    Запрос к серверу поставщика условный: при 304 Not Modified или при том же
+    содержимом, что и в прошлый раз, прайс не разбирается.
+    Формат прайса определяется по Content-Type ответа или расширению в ссылке.
+    """
+    started = monotonic()
+    shop = Shop.objects.filter(user_id=user_id, url=url).first()
+    feed = fetch_feed(url, etag=shop.feed_etag if shop else '', last_modified=shop.feed_last_modified if shop else '',
+                      max_size=settings.PRICE_LIST_MAX_FEED_SIZE)
+    if feed is None:
+        Shop.objects.filter(user_id=user_id).update(**import_stats(started))
+        return {'Status': True, 'skipped': True}
+
+    feed_state = {'url': url, 'feed_hash': feed.content_hash, 'feed_etag': feed.etag,
+                  'feed_last_modified': feed.last_modified}
+    with feed.file:
+        parser = get_parser(feed.content_type, url)
+        stream = open_feed_stream(feed.file, settings.PRICE_LIST_MAX_FEED_SIZE)
+        return import_price_list_records(parser(stream), user_id, progress, feed_state, wait)
+
+
+def load_price_list_from_file(name: str, user_id: int, progress: Optional[Callable] = None, content_hash: str = '',
+                              content_type: str = '', file_name: str = '') -> dict:
+    """
+    Синхронизирует каталог с загруженным файлом прайса (возможно, сжатым gzip или zstd)
+    из хранилища загрузок и удаляет файл после загрузки.
+    ETag и Last-Modified прошлой загрузки по ссылке сбрасываются: они описывают другой файл,
+    и следующее обновление по ссылке иначе получило бы 304 Not Modified
+    """
+    storage = price_list_storage()
+    feed_state = {'feed_hash': content_hash, 'feed_etag': '', 'feed_last_modified': ''}
+    try:
+        with storage.open(name, 'rb') as file:
+            parser = get_parser(content_type, file_name)
+            stream = open_feed_stream(file, settings.PRICE_LIST_MAX_FEED_SIZE)
+            return import_price_list_records(parser(stream), user_id, progress, feed_state)
+    finally:
+        storage.delete(name)
@@ -0,0 +1,23 @@
+from django.db.models import Avg, Count, Max, Min, OuterRef, QuerySet, Subquery, Sum
+
+from backend.models import CatalogItem
+
+
+def compare_products(queryset: QuerySet) -> QuerySet:
+    """
+    Сводка предложений по продуктам одним запросом GROUP BY product_id:
+    число предложений, минимальная, максимальная и средняя цена,
+    общее количество и самый дешевый магазин, у которого товар есть в наличии.
+
+    Каталог содержит только позиции включенных магазинов, поэтому
+    отключенные магазины в сравнении не участвуют.
+    :param queryset: отфильтрованные позиции CatalogItem
+    :return: values() со строками по продуктам
+    """
+    if queryset.query.annotations:
+        queryset = CatalogItem.objects.filter(pk__in=queryset.order_by().values('pk'))
+    cheapest = queryset.filter(product_id=OuterRef('product_id'), quantity__gt=0).order_by(
+        'price', 'shop_id').values('shop_id')[:1]
+    return queryset.order_by().values('product_id', 'product_name', 'category_name').annotate(
+        offers=Count('pk'), min_price=Min('price'), max_price=Max('price'), avg_price=Avg('price'),
+        quantity=Sum('quantity'), cheapest_shop=Subquery(cheapest))
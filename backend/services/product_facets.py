@@ -0,0 +1,61 @@
+import re
+from typing import Mapping
+
+from django.db.models import Count, QuerySet
+
+from backend.models import Parameter, ProductParameter
+
+PARAMETER_FILTER_RE = re.compile(r'^param\[(.+)\]$')
+MAX_FACET_VALUES = 50
+
+
+def parse_parameter_filters(query_params: Mapping) -> dict:
+    """
+    Достает из параметров запроса фильтры param[<имя параметра>]=<значение>
+    :return: {имя параметра: [значения]}, несколько значений одного параметра объединяются через ИЛИ
+    """
+    filters = {}
+    for key in query_params:
+        match = PARAMETER_FILTER_RE.match(key)
+        if match:
+            values = [value for value in query_params.getlist(key) if value]
+            if values:
+                filters[match.group(1)] = values
+    return filters
+
+
+def filter_by_parameters(queryset: QuerySet, parameter_filters: dict) -> QuerySet:
+    """
+    Оставляет позиции (ProductInfo или CatalogItem), у которых есть все параметры
+    с одним из указанных значений.
+
+    Имена параметров переводятся в id одним запросом, а каждый параметр
+    становится подзапросом id__in по индексу (parameter, value, product_info).
+    """
+    if not parameter_filters:
+        return queryset
+    parameter_ids = {}
+    for parameter_id, name in Parameter.objects.filter(name__in=parameter_filters).values_list('id', 'name'):
+        parameter_ids.setdefault(name, []).append(parameter_id)
+    if parameter_ids.keys() != parameter_filters.keys():
+        return queryset.none()
+    for name, values in parameter_filters.items():
+        queryset = queryset.filter(pk__in=ProductParameter.objects.filter(
+            parameter_id__in=parameter_ids[name], value__in=values).values('product_info_id'))
+    return queryset
+
+
+def get_parameter_facets(queryset: QuerySet) -> dict:
+    """
+    Считает позиции выборки по значениям параметров одним запросом GROUP BY
+    :return: {имя параметра: {значение: количество}}, значения по убыванию количества,
+        не более MAX_FACET_VALUES на параметр
+    """
+    counts = ProductParameter.objects.filter(product_info_id__in=queryset.order_by().values('pk')).values(
+        'parameter__name', 'value').annotate(count=Count('id')).order_by('parameter__name', '-count', 'value')
+    facets = {}
+    for row in counts:
+        values = facets.setdefault(row['parameter__name'], {})
+        if len(values) < MAX_FACET_VALUES:
+            values[row['value']] = row['count']
+    return facets
@@ -0,0 +1,54 @@
+import re
+from functools import reduce
+from operator import and_
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, Q, QuerySet
+
+SEARCH_CONFIG = 'simple'
+MAX_SEARCH_WORDS = 10
+WORD_RE = re.compile(r'\w+')
+
+
+def search_words(text: str) -> list:
+    return WORD_RE.findall(text.lower())[:MAX_SEARCH_WORDS]
+
+
+def uses_full_text_search() -> bool:
+    return connection.vendor == 'postgresql'
+
+
+def search_vector() -> SearchVector:
+    """
+    Поисковый вектор позиции каталога: название продукта (вес A) и модель (вес B)
+    """
+    return (SearchVector('product_name', weight='A', config=SEARCH_CONFIG) +
+            SearchVector('model', weight='B', config=SEARCH_CONFIG))
+
+
+def update_search_vectors(queryset: QuerySet) -> None:
+    """
+    Пересчитывает search_vector у позиций каталога одним запросом (только в PostgreSQL)
+    """
+    if uses_full_text_search():
+        queryset.update(search_vector=search_vector())
+
+
+def search_catalog_items(queryset: QuerySet, text: str) -> QuerySet:
+    """
+    Отбирает позиции, в названии продукта или модели которых есть все слова запроса
+    (слова ищутся по началу: "iphone xr 256").
+
+    В PostgreSQL используется search_vector с GIN индексом, позиции
+    аннотируются search_rank для сортировки по релевантности.
+    В других базах выполняется поиск подстрок без ранжирования.
+    """
+    words = search_words(text)
+    if not words:
+        return queryset
+    if uses_full_text_search():
+        query = SearchQuery(' & '.join(f'{word}:*' for word in words), search_type='raw', config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=query).annotate(search_rank=SearchRank(F('search_vector'), query))
+    return queryset.filter(reduce(and_, (Q(product_name__icontains=word) | Q(model__icontains=word)
+                                         for word in words)))
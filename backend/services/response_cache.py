@@ -0,0 +1,119 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.request import Request
+
+CATEGORIES = 'categories'
+SHOPS = 'shops'
+PRODUCTS = 'products'
+
+
+def catalog_version_key(scope: str) -> str:
+    return f'catalog:version:{scope}'
+
+
+def get_catalog_version(scope: str) -> int:
+    """
+    Версия закэшированных ответов раздела каталога: CATEGORIES, SHOPS или PRODUCTS
+    """
+    key = catalog_version_key(scope)
+    cache.add(key, 1, timeout=None)
+    return cache.get(key) or 1
+
+
+def _incr_catalog_version(*scopes: str) -> None:
+    for scope in scopes:
+        key = catalog_version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, timeout=None)
+
+
+def bump_catalog_version(*scopes: str) -> None:
+    """
+    Делает недействительными закэшированные ответы указанных разделов каталога.
+
+    Версия увеличивается сразу и еще раз после фиксации транзакции:
+    ответ, собранный из данных до фиксации, остается под прежней версией
+    и больше не выдается.
+    """
+    _incr_catalog_version(*scopes)
+    transaction.on_commit(lambda: _incr_catalog_version(*scopes))
+
+
+def response_cache_key(prefix: str, scope: str, request: Request) -> str:
+    """
+    Ключ ответа: версия раздела каталога, представление и хеш адреса с отсортированными
+    параметрами и форматом ответа (адрес входит в ключ, так как ссылки
+    next/previous абсолютные)
+    """
+    query = '&'.join(sorted(f'{key}={value}' for key in request.query_params
+                            for value in request.query_params.getlist(key)))
+    url = f'{request.accepted_renderer.format}:{request.build_absolute_uri(request.path)}?{query}'
+    return f'response:{scope}:{get_catalog_version(scope)}:{prefix}:{hashlib.sha1(url.encode()).hexdigest()}'
+
+
+def response_etag(content: bytes) -> str:
+    """
+    Сильный ETag ответа: хеш тела, поэтому он меняется только вместе с содержимым
+    """
+    return '"%s"' % hashlib.sha1(content).hexdigest()
+
+
+class CachedListMixin:
+    """
+    Кэширует JSON ответ list() по адресу, параметрам запроса и версии раздела каталога cache_scope.
+
+    При попадании в кэш готовое тело ответа возвращается без запросов
+    к базе и сериализаторов. Ответ не зависит от пользователя, поэтому
+    подходит только для общедоступных представлений каталога.
+
+    Ответ содержит ETag (хеш тела, хранится в кэше вместе с ним) и Cache-Control
+    для CDN; на запрос с тем же If-None-Match возвращается 304 Not Modified.
+    """
+    cache_prefix = ''
+    cache_scope = PRODUCTS
+
+    def list(self, request, *args, **kwargs):
+        key = response_cache_key(self.cache_prefix, self.cache_scope, request)
+        is_json = request.accepted_renderer.format == 'json'
+        cached = cache.get(key) if is_json else None
+        if cached is not None:
+            etag, content = cached
+            response = HttpResponse(content, content_type=request.accepted_renderer.media_type)
+            return self.add_conditional_headers(request, response, etag)
+
+        response = self.get_list_response(request, *args, **kwargs)
+        if response.status_code == 200:
+            response.add_post_render_callback(lambda rendered: self.finalize_response_content(
+                request, rendered, key if is_json else None))
+        return response
+
+    def get_list_response(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def finalize_response_content(self, request, response: HttpResponse, key: str = None) -> HttpResponse:
+        """
+        После отрисовки: сохраняет тело и ETag в кэш (если передан key) и добавляет заголовки
+        """
+        etag = response_etag(response.content)
+        if key:
+            cache.set(key, (etag, response.content), settings.RESPONSE_CACHE_TIMEOUT)
+        return self.add_conditional_headers(request, response, etag)
+
+    @staticmethod
+    def add_conditional_headers(request, response: HttpResponse, etag: str) -> HttpResponse:
+        """
+        ETag и Cache-Control ответа; при совпадении If-None-Match - 304 Not Modified без тела
+        """
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Cache-Control'] = f'public, max-age={settings.RESPONSE_CACHE_MAX_AGE}'
+        return response
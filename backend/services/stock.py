@@ -0,0 +1,90 @@
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+
+from backend.models import Order, OrderItem, ProductInfo, CatalogItem
+from backend.services.response_cache import bump_catalog_version, PRODUCTS
+
+RESERVED_STATES = {'new', 'confirmed', 'assembled'}
+RELEASED_STATES = {'sent', 'delivered', 'canceled'}
+
+
+class OutOfStock(ValueError):
+    """
+    Свободного товара у поставщика меньше, чем в заказе
+    """
+
+    def __init__(self, product_info_ids: list):
+        super().__init__(product_info_ids)
+        self.product_info_ids = product_info_ids
+
+
+def available_quantity(quantity: int, reserved_quantity: int) -> int:
+    """
+    Свободный остаток: товар поставщика за вычетом зарезервированного в заказах
+    """
+    return max(quantity - reserved_quantity, 0)
+
+
+def _change_stock(order_id: int, sign: int) -> None:
+    """
+    Резервирует (sign=1) или освобождает (sign=-1) товар позиций заказа.
+
+    Остаток поставщика (quantity) не меняется: его перезаписывает загрузка прайса,
+    резерв хранится отдельно в reserved_quantity. Строки ProductInfo блокируются
+    SELECT ... FOR UPDATE в порядке id, поэтому параллельные оформления заказов
+    с общими товарами ждут друг друга, но не взаимоблокируются. Затем резерв
+    меняется одним UPDATE, свободный остаток в CatalogItem - одним UPDATE,
+    закэшированные ответы каталога становятся недействительными.
+    :raises OutOfStock: при резервировании товара больше свободного остатка
+        или товара, снятого с продажи (нет в последнем прайсе)
+    """
+    quantities = dict(OrderItem.objects.filter(order_id=order_id).values_list('product_info_id', 'quantity'))
+    if not quantities:
+        return
+    stock, inactive = {}, set()
+    for product_info_id, quantity, reserved_quantity, is_active in ProductInfo.objects.select_for_update().filter(
+            id__in=quantities).order_by('id').values_list('id', 'quantity', 'reserved_quantity', 'is_active'):
+        stock[product_info_id] = (quantity, reserved_quantity)
+        if not is_active:
+            inactive.add(product_info_id)
+    if sign > 0:
+        missing = sorted(product_info_id for product_info_id, quantity in quantities.items()
+                         if product_info_id not in stock or product_info_id in inactive
+                         or available_quantity(*stock[product_info_id]) < quantity)
+        if missing:
+            raise OutOfStock(missing)
+    reserved = {product_info_id: max(stock[product_info_id][1] + sign * quantity, 0)
+                for product_info_id, quantity in quantities.items() if product_info_id in stock}
+    ProductInfo.objects.filter(id__in=reserved).update(reserved_quantity=Case(
+        *(When(id=product_info_id, then=Value(value)) for product_info_id, value in reserved.items()),
+        output_field=IntegerField()))
+    CatalogItem.objects.filter(product_info_id__in=reserved).update(quantity=Case(
+        *(When(product_info_id=product_info_id, then=Value(available_quantity(stock[product_info_id][0], value)))
+          for product_info_id, value in reserved.items()), output_field=IntegerField()))
+    bump_catalog_version(PRODUCTS)
+
+
+def sync_order_stock(order: Order, state: str) -> None:
+    """
+    Резервирует товар заказа при переходе из корзины в оформленный статус (new, confirmed, assembled)
+    и снимает резерв, когда товар отправлен покупателю или заказ отменен.
+    Новый статус сравнивается с сохраненным в базе, поэтому заказы, оформленные до появления резерва,
+    не резервируются задним числом. Повторный вызов с тем же статусом ничего не меняет.
+    Вызывается сигналом pre_save заказа, до сохранения нового статуса.
+    :raises OutOfStock: товара не хватает; остатки и заказ не меняются
+    """
+    with transaction.atomic():
+        stored = Order.objects.select_for_update().filter(id=order.id).values_list(
+            'state', 'stock_reserved').first()
+        if stored is None:
+            return
+        stored_state, reserved = stored
+        if state in RESERVED_STATES and stored_state == 'basket' and not reserved:
+            _change_stock(order.id, 1)
+        elif state in RELEASED_STATES and reserved:
+            _change_stock(order.id, -1)
+        else:
+            order.stock_reserved = reserved
+            return
+        order.stock_reserved = not reserved
+        Order.objects.filter(id=order.id).update(stock_reserved=order.stock_reserved)
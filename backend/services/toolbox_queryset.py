@@ -1,51 +1,49 @@
-from django.db.models.query import QuerySet
-from rest_framework.request import Request
-from django.db.models import  Sum, F
-from backend.models import Order, ProductInfo
-from django.db.models import Prefetch
-
-
-def get_queryset_basket_user(request: Request) -> QuerySet:
-    basket = Order.objects.filter(
-        user_id=request.user.id, state='basket').prefetch_related(
-        'ordered_items__product_info__product__category',
-        'ordered_items__product_info__product_parameters__parameter').annotate(
-        total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
-    return basket
-
-
-def get_queryset_orders_shop(request: Request) -> QuerySet:
-    order = Order.objects.prefetch_related(Prefetch('ordered_items__product_info', queryset=ProductInfo.objects.filter(
-        shop__user_id=request.user.id))).exclude(state='basket').prefetch_related(
-        'ordered_items__product_info__product__category',
-        'ordered_items__product_info__product_parameters__parameter').select_related('contact').annotate(
-        total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
-
-    return order
-
+from typing import Optional
 
-def get_queryset_orders_for_send_email(user_id: int, order_id: int) -> QuerySet:
-    order = Order.objects.prefetch_related(Prefetch('ordered_items__product_info', queryset=ProductInfo.objects.filter(
-        shop__user_id=user_id))).filter(id=order_id).prefetch_related(
-        'ordered_items__product_info__product__category',
-        'ordered_items__product_info__product_parameters__parameter').select_related('contact').annotate(
-        total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
-
-    return order
-
-
-def get_queryset_orders_user(request: Request) -> QuerySet:
-    order = Order.objects.filter(
-        user_id=request.user.id).exclude(state='basket').prefetch_related(
-        'ordered_items__product_info__product__category',
-        'ordered_items__product_info__product_parameters__parameter').select_related('contact').annotate(
-        total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
-    return order
-
-
-def get_queryset_order_user(id_order: int) -> QuerySet:
-    order = Order.objects.filter(id=id_order).prefetch_related(
-        'ordered_items__product_info__product__category',
-        'ordered_items__product_info__product_parameters__parameter').select_related('contact').annotate(
-        total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
-    return order
+from django.db.models.query import QuerySet
+from django.db.models import F, Prefetch, Subquery
+from backend.models import Order, OrderItem, ProductParameter, CatalogItem, Shop
+
+
+def get_queryset_orders(user_id: Optional[int] = None, shop_user_id: Optional[int] = None,
+                        order_id: Optional[int] = None, state: Optional[str] = None,
+                        exclude_state: Optional[str] = None) -> QuerySet:
+    """
+    Заказы с позициями, товарами и параметрами для сериализации.
+
+    Выполняет ровно три запроса независимо от числа заказов и позиций:
+    заказы с контактом, позиции с товаром, продуктом и категорией,
+    параметры позиций с именем параметра.
+    :param user_id: заказы покупателя
+    :param shop_user_id: заказы с товарами магазина этого пользователя; в заказах остаются только его позиции,
+        заказы аннотируются shop_dt для ShopOrderCursorPagination
+    :param order_id: один заказ
+    :param state: только заказы в этом статусе
+    :param exclude_state: кроме заказов в этом статусе
+    """
+    orders = Order.objects.select_related('contact')
+    order_items = OrderItem.objects.select_related('product_info__product__category').order_by('id')
+    if user_id is not None:
+        orders = orders.filter(user_id=user_id)
+    if shop_user_id is not None:
+        # заказы магазина выбираются по OrderShop, shop_dt - дата заказа из индекса order_shop_dt_idx
+        order_items = order_items.filter(product_info__shop__user_id=shop_user_id)
+        shop_id = Subquery(Shop.objects.filter(user_id=shop_user_id).order_by().values('id'))
+        orders = orders.filter(order_shops__shop_id=shop_id).annotate(shop_dt=F('order_shops__dt'))
+    if order_id is not None:
+        orders = orders.filter(id=order_id)
+    if state is not None:
+        orders = orders.filter(state=state)
+    if exclude_state is not None:
+        orders = orders.exclude(state=exclude_state)
+    return orders.prefetch_related(
+        Prefetch('ordered_items', queryset=order_items),
+        Prefetch('ordered_items__product_info__product_parameters',
+                 queryset=ProductParameter.objects.select_related('parameter').order_by('id')))
+
+
+def get_queryset_catalog_items() -> QuerySet:
+    """
+    Позиции каталога: одна таблица без JOIN, поисковый вектор не выбирается
+    """
+    return CatalogItem.objects.defer('search_vector').order_by('pk')
@@ -1,10 +1,14 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 
-from backend.models import Contact, Order
+from backend.models import Contact, Order, OrderItem, Category, Product, Parameter, ProductInfo, Shop
 
 from backend.services.email_templates import send_order_confirmation_email, send_order_status_update_email, \
     send_gratias_ordinis_email, send_shop_new_order_email
+from backend.services.import_cache import clear_shared_lookups
+from backend.services.response_cache import bump_catalog_version, CATEGORIES, SHOPS
+from backend.services.stock import RESERVED_STATES, RELEASED_STATES, sync_order_stock
+from backend.services.order_totals import schedule_order_totals, refresh_order_totals_for_product_infos
 
 STATE_CHOICES = {'confirmed', 'assembled', 'sent', 'delivered', 'canceled'}
 
@@ -21,7 +25,16 @@ def create_contact_order(instance, created, **kwargs):
             order = False
         if order:
             order.contact = instance
-            order.save()
+            order.save(update_fields=['contact'])
+
+
+@receiver(pre_save, sender=Order)
+def sync_stock_with_order_state(instance, **kwargs):
+    """
+    Резервирование товара при оформлении заказа и снятие резерва при отправке или отмене
+    """
+    if instance.pk and instance.state in RESERVED_STATES | RELEASED_STATES:
+        sync_order_stock(instance, instance.state)
 
 
 @receiver(post_save, sender=Order)
@@ -43,3 +56,49 @@ def send_email_after_changing_order_status(instance, created, **kwargs):
     elif 'new' == instance.state:
         # отправка emal для подтверждения заказа
         send_order_confirmation_email(instance)
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Parameter)
+def reset_import_lookups(**kwargs):
+    """
+    Сброс общего кэша id справочников загрузки прайсов
+    """
+    clear_shared_lookups()
+
+
+@receiver(post_save, sender=Shop)
+@receiver(post_delete, sender=Shop)
+def reset_shop_responses(**kwargs):
+    """
+    Сброс закэшированного списка магазинов при изменении магазина
+    """
+    bump_catalog_version(SHOPS)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def reset_category_responses(**kwargs):
+    """
+    Сброс закэшированного списка категорий при изменении категории
+    """
+    bump_catalog_version(CATEGORIES)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def update_order_totals(instance, **kwargs):
+    """
+    Пересчет суммы и количества позиций заказа при изменении его позиций
+    """
+    schedule_order_totals([instance.order_id])
+
+
+@receiver(post_save, sender=ProductInfo)
+def update_product_info_order_totals(instance, created, **kwargs):
+    """
+    Пересчет сумм корзин с позицией, цена которой могла измениться
+    """
+    if not created:
+        refresh_order_totals_for_product_infos([instance.id])
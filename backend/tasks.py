@@ -1,8 +1,15 @@
+import random
+from time import monotonic
+
 from django.core.mail import EmailMessage
 from django.conf import settings as conf_settings
 from celery import shared_task
 from django.utils.safestring import SafeString
 
+from backend.services.feed_scheduler import feed_shop_ids, refresh_shop_feed
+from backend.services.price_list_import import load_price_list_from_url, load_price_list_from_file, \
+    PriceListImporter
+
 
 @shared_task()
 def celery_send_email(title: str, html_message: SafeString, email: str):
@@ -12,3 +19,66 @@ def celery_send_email(title: str, html_message: SafeString, email: str):
     message = EmailMessage(title, html_message, conf_settings.EMAIL_HOST_USER, [email])
     message.content_subtype = 'html'
     message.send()
+
+
+def _progress_reporter(task, user_id: int, started: float):
+    def progress(importer: PriceListImporter):
+        if not task.request.is_eager:
+            task.update_state(state='PROGRESS', meta={'user_id': user_id,
+                                                      'processed': importer.processed,
+                                                      'errors_count': importer.errors_count,
+                                                      'errors': importer.errors,
+                                                      'elapsed': round(monotonic() - started, 3)})
+
+    return progress
+
+
+@shared_task(bind=True)
+def celery_update_price_list(self, url: str, user_id: int) -> dict:
+    """
+    Загрузка прайса поставщика по ссылке используя celery.
+
+    Ход загрузки публикуется в состоянии задачи 'PROGRESS':
+    количество обработанных товаров, ошибки и прошедшее время.
+    """
+    started = monotonic()
+    result = load_price_list_from_url(url, user_id, _progress_reporter(self, user_id, started))
+    result.update({'user_id': user_id, 'elapsed': round(monotonic() - started, 3)})
+    return result
+
+
+@shared_task(bind=True)
+def celery_update_price_list_from_file(self, upload: dict, user_id: int) -> dict:
+    """
+    Загрузка прайса, переданного файлом в partner/update, используя celery.
+    Ход загрузки публикуется так же, как в celery_update_price_list.
+    """
+    started = monotonic()
+    result = load_price_list_from_file(upload['name'], user_id, _progress_reporter(self, user_id, started),
+                                       upload['content_hash'], upload['content_type'], upload['file_name'])
+    result.update({'user_id': user_id, 'elapsed': round(monotonic() - started, 3)})
+    return result
+
+
+@shared_task()
+def celery_refresh_shop_feed(shop_id: int) -> dict:
+    """
+    Обновление прайса одного магазина по ссылке. Задачи идут в очередь PRICE_LIST_REFRESH_QUEUE,
+    число одновременных загрузок ограничивается concurrency воркера этой очереди.
+    """
+    return refresh_shop_feed(shop_id)
+
+
+@shared_task()
+def celery_refresh_shop_feeds() -> int:
+    """
+    Периодическое обновление прайсов всех магазинов (запускается celery beat):
+    ставит задачу на каждый магазин со ссылкой, время старта случайно
+    распределяется на отрезке [0, PRICE_LIST_REFRESH_JITTER] секунд
+    :return: количество поставленных задач
+    """
+    shop_ids = feed_shop_ids()
+    jitter = conf_settings.PRICE_LIST_REFRESH_JITTER
+    for shop_id in shop_ids:
+        celery_refresh_shop_feed.apply_async((shop_id,), countdown=random.uniform(0, jitter))
+    return len(shop_ids)
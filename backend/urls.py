@@ -1,8 +1,9 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from backend.views import CategoryView, ShopView, ContactView, PartnerUpdate, ProductInfoView, PartnerStateView, \
-    BasketView, PartnerOrders, OrderView, ConfirmOrder
+from backend.views import CategoryView, ShopView, ContactView, PartnerUpdate, PartnerUpdateStatus, ProductInfoView, \
+    ProductCompareView, CatalogExportView, PartnerStateView, BasketView, BasketBulkView, PartnerOrders, OrderView, \
+    ConfirmOrder
 
 http_method = {"delete": "destroy",
                "post": "create",
@@ -22,11 +23,15 @@ urlpatterns = [
                   path('', include('social_django.urls', namespace='social') ),
                   path('categories', CategoryView.as_view(), name='categories'),
                   path('shops', ShopView.as_view(), name='shops'),
+                  path('products/compare', ProductCompareView.as_view(), name='products-compare'),
+                  path('products/export', CatalogExportView.as_view(), name='products-export'),
                   path('user/contact/', ContactView.as_view(http_method), name='contact'),
                   path('partner/update', PartnerUpdate.as_view(), name='partner-update'),
+                  path('partner/update/status', PartnerUpdateStatus.as_view(), name='partner-update-status'),
                   path('partner/state', PartnerStateView.as_view({"put": "partial_update",
                                                                   "get": "retrieve"}), name='partner-state'),
                   path('basket/', BasketView.as_view(http_method), name='contact'),
+                  path('basket/bulk', BasketBulkView.as_view(), name='basket-bulk'),
                   path('partner/orders', PartnerOrders.as_view(), name='partner-orders'),
                   path('order', OrderView.as_view({"put": "partial_update",
                                                    "get": "list"}), name='order'),
@@ -1,6 +1,11 @@
-from django.http import JsonResponse
-from rest_framework import permissions
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework import permissions, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import BooleanField
 from rest_framework.generics import ListAPIView
+from rest_framework.throttling import AnonRateThrottle, ScopedRateThrottle, UserRateThrottle
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.response import Response
@@ -8,16 +13,26 @@ from rest_framework.response import Response
 from rest_framework.generics import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 
-from backend.services.partner_update import updating_the_price_list_from_file
-from backend.models import Category, Shop, Contact, ProductInfo, OrderItem, ConfirmOrderToken
-from backend.serializers import CategorySerializer, ShopSerializer, ContactSerializer, ProductInfoSerializer, \
-    StateShopSerializer, OrderSerializer, OrderItemSerializer
+from backend.services.partner_update import updating_the_price_list_from_file, get_price_list_update_status
+from backend.services.product_facets import get_parameter_facets
+from backend.services.product_compare import compare_products
+from backend.services.catalog_export import EXPORT_FORMATS, accepts_gzip, export_catalog
+from backend.models import Category, Shop, Contact, OrderItem, ConfirmOrderToken, CatalogItem
+from backend.serializers import CategorySerializer, ShopSerializer, ContactSerializer, CatalogItemSerializer, \
+    StateShopSerializer, OrderSerializer, OrderItemSerializer, OrderFastSerializer, ProductCompareSerializer, \
+    BasketBulkSerializer
 from backend.permissions import OnlyShops
-from backend.services.toolbox_queryset import get_queryset_basket_user, get_queryset_orders_shop, \
-    get_queryset_orders_user
+from backend.pagination import CatalogCursorPagination, ProductCompareCursorPagination, OrderCursorPagination, \
+    ShopOrderCursorPagination
+from backend.filters import CatalogItemFilter, OrderFilter, ShopOrderFilter
+from backend.services.basket import update_basket
+from backend.services.catalog import rebuild_shop_catalog
+from backend.services.response_cache import CachedListMixin, CATEGORIES, SHOPS
+from backend.services.stock import OutOfStock
+from backend.services.toolbox_queryset import get_queryset_orders, get_queryset_catalog_items
 
 
-class CategoryView(ListAPIView):
+class CategoryView(CachedListMixin, ListAPIView):
     """
     Представление для просмотра категорий.
 
@@ -30,9 +45,11 @@ class CategoryView(ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     http_method_names = ['get', ]
+    cache_prefix = 'categories'
+    cache_scope = CATEGORIES
 
 
-class ShopView(ListAPIView):
+class ShopView(CachedListMixin, ListAPIView):
     """
     Представление для просмотра списка поставщиков
 
@@ -45,6 +62,8 @@ class ShopView(ListAPIView):
     queryset = Shop.objects.filter(state=True)
     serializer_class = ShopSerializer
     http_method_names = ['get', ]
+    cache_prefix = 'shops'
+    cache_scope = SHOPS
 
 
 class ContactView(ModelViewSet):
@@ -94,6 +113,19 @@ class ContactView(ModelViewSet):
 class PartnerUpdate(APIView):
     """
     Представление для обновления прайса от поставщика
+
+    Принимает методы HTTP запроса:
+
+        POST - Ставит загрузку прайса в очередь и возвращает task_id.
+            аргументы:
+                url - ссылка на файл прайса (YAML, JSON, NDJSON или CSV).
+                file - файл прайса в multipart/form-data.
+            Вместо аргументов файл можно передать телом запроса с Content-Type прайса
+            (имя файла - в заголовке Content-Disposition). Файл может быть сжат gzip или zstd.
+            JSON прайс меньше 8 КБ передается с Content-Disposition: attachment,
+            иначе тело запроса считается запросом со ссылкой.
+
+    Доступно только для авторизованных поставщиков.
     """
 
     permission_classes = [permissions.IsAuthenticated, OnlyShops]
@@ -102,7 +134,29 @@ class PartnerUpdate(APIView):
         return JsonResponse(updating_the_price_list_from_file(request))
 
 
-class ProductInfoView(ModelViewSet):
+class PartnerUpdateStatus(APIView):
+    """
+    Представление для получения хода загрузки прайса
+
+    Принимает методы HTTP запроса:
+
+        GET - Возвращает состояние загрузки: обработано товаров, ошибки и прошедшее время.
+            :param
+                :task_id - id задачи, полученный от partner/update
+
+    Доступно только для авторизованных поставщиков.
+    """
+
+    permission_classes = [permissions.IsAuthenticated, OnlyShops]
+
+    def get(self, request, *args, **kwargs):
+        task_id = request.query_params.get('task_id')
+        if not task_id:
+            return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
+        return JsonResponse(get_price_list_update_status(task_id, request.user.id))
+
+
+class ProductInfoView(CachedListMixin, ModelViewSet):
     """
     Пердставление для поиска товаров
 
@@ -115,18 +169,126 @@ class ProductInfoView(ModelViewSet):
          product_id - id продукта.
          shop_id - id магазина.
          external_id - Внешний ИД.
+         category_id - id категории.
          product__category__name  - название категории.
+         search - слова из названия продукта или модели ("iphone xr 256"),
+            результаты сортируются по релевантности.
+         param[<имя параметра>] - значение параметра товара, например
+            param[Цвет]=черный&param[Встроенная память (Гб)]=256
+            (повторение параметра - любое из значений).
+         facets=1 (true) - добавить в ответ facets: количество найденных товаров
+            по значениям параметров {"Цвет": {"черный": 10, ...}}.
+
+    Товары выдаются постранично по курсору (по 50, page_size - до 500):
+    ответ содержит results и ссылки next/previous на соседние страницы.
+    Данные читаются из плоской таблицы CatalogItem, которая перестраивается
+    после загрузки прайса и изменения статуса магазина.
 
     Доступно для всех пользователей
     """
 
     def get_queryset(self):
-        return ProductInfo.objects.filter(shop__state=True)
+        return get_queryset_catalog_items()
 
-    serializer_class = ProductInfoSerializer
+    serializer_class = CatalogItemSerializer
+    pagination_class = CatalogCursorPagination
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['product_id', 'shop_id', 'external_id', 'product__category__name']
+    filterset_class = CatalogItemFilter
     http_method_names = ['get']
+    cache_prefix = 'products'
+
+    def get_list_response(self, request, *args, **kwargs):
+        try:
+            facets = BooleanField().to_internal_value(request.query_params.get('facets', False))
+        except ValidationError as error:
+            raise ValidationError({'facets': error.detail})
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        response = self.get_paginated_response(serializer.data)
+        if facets:
+            response.data['facets'] = get_parameter_facets(queryset)
+        return response
+
+
+class ProductCompareView(CachedListMixin, ListAPIView):
+    """
+    Сравнение цен одного продукта в разных магазинах
+
+    Принимает методы HTTP запроса:
+
+        GET - Возвращает по каждому продукту: число предложений (offers),
+            минимальную, максимальную и среднюю цену, общее количество (quantity)
+            и самый дешевый магазин с товаром в наличии (cheapest_shop).
+
+    Доступна та же фильтрация, что и у списка товаров:
+        category_id, product__category__name, product_id, shop_id, external_id, search
+        и параметры товара param[<имя параметра>]=<значение>.
+
+    Учитываются только включенные магазины. Результаты выдаются
+    постранично по курсору, по возрастанию product_id.
+
+    Доступно для всех пользователей
+    """
+    serializer_class = ProductCompareSerializer
+    pagination_class = ProductCompareCursorPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = CatalogItemFilter
+    http_method_names = ['get']
+    cache_prefix = 'compare'
+
+    def get_queryset(self):
+        return CatalogItem.objects.all()
+
+    def get_list_response(self, request, *args, **kwargs):
+        page = self.paginate_queryset(compare_products(self.filter_queryset(self.get_queryset())))
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+
+class CatalogExportView(APIView):
+    """
+    Выгрузка всего каталога одним потоком
+
+    Принимает методы HTTP запроса:
+
+        GET - Возвращает позиции каталога файлом.
+            аргументы:
+                export_format - ndjson (по умолчанию, строки как в results списка товаров)
+                    или csv (id, shop, model, name, category, quantity, price, price_rrc, parameters).
+            Доступны фильтры списка товаров: shop_id, category_id, product__category__name и др.
+
+    Строки читаются из базы серверным курсором и сразу отправляются клиенту,
+    поэтому память сервера не зависит от размера каталога. При Accept-Encoding: gzip
+    поток сжимается.
+
+    Число выгрузок ограничено (throttle scope catalog_export).
+
+    Доступно для всех пользователей
+    """
+    throttle_classes = [AnonRateThrottle, UserRateThrottle, ScopedRateThrottle]
+    throttle_scope = 'catalog_export'
+
+    def perform_content_negotiation(self, request, force=False):
+        # тип ответа задает export_format, а не заголовок Accept
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return Response({'Status': False, 'Errors': f'Неизвестный формат {export_format}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        filterset = CatalogItemFilter(request.query_params, CatalogItem.objects.all(), request=request)
+        if not filterset.is_valid():
+            return Response({'Status': False, 'Errors': filterset.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        use_gzip = accepts_gzip(request.headers.get('Accept-Encoding', ''))
+        response = StreamingHttpResponse(export_catalog(filterset.qs, export_format, use_gzip),
+                                         content_type=EXPORT_FORMATS[export_format][1])
+        response['Content-Disposition'] = f'attachment; filename="catalog.{export_format}"'
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
 
 
 class PartnerStateView(ModelViewSet):
@@ -158,6 +320,10 @@ class PartnerStateView(ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def perform_update(self, serializer):
+        shop = serializer.save()
+        rebuild_shop_catalog(shop.id)
+
 
 class BasketView(ModelViewSet):
     """
@@ -188,9 +354,18 @@ class BasketView(ModelViewSet):
     def get_queryset(self):
         return OrderItem.objects.filter(order__user=self.request.user, order__state='basket')
 
+    @transaction.atomic
     def perform_create(self, serializer):
         return serializer.save(user=self.request.user, )
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+
     def get_object(self):
         self.queryset = self.get_queryset()
         obj = get_object_or_404(self.queryset, product_info=self.request.data.get('product_info'))
@@ -198,27 +373,59 @@ class BasketView(ModelViewSet):
         return obj
 
     def retrieve(self, request, *args, **kwargs):
-        basket = get_queryset_basket_user(request)
-        serializer = OrderSerializer(basket, many=True)
+        basket = get_queryset_orders(user_id=request.user.id, state='basket')
+        serializer = OrderFastSerializer(basket, many=True)
         return Response(serializer.data)
 
 
-class PartnerOrders(APIView):
+class BasketBulkView(APIView):
+    """
+    Представление для изменения нескольких позиций корзины одним запросом
+
+    Принимает методы HTTP запроса:
+
+        POST - Добавляет, изменяет и удаляет позиции корзины одной транзакцией
+            и возвращает корзину с общей суммой.
+            аргументы:
+                items - список {"product_info": id продукта, "quantity": количество},
+                    quantity = 0 удаляет продукт из корзины (не более 500 позиций).
+
+    Доступно только для авторизованных пользователей.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = BasketBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        order = update_basket(request.user.id, serializer.validated_data['items'])
+        basket = get_queryset_orders(order_id=order.id)
+        return Response(OrderFastSerializer(basket, many=True).data[0])
+
+
+class PartnerOrders(ListAPIView):
     """
     Класс для получения заказов поставщиками
 
     Принимает методы HTTP запроса:
 
-        GET - Возвращает новые заказы со статусом "Подтвержден".
+        GET - Возвращает заказы с товарами поставщика (только его позиции),
+            от новых к старым, постранично по курсору.
+            аргументы:
+                state - статус заказа
+                dt_after, dt_before - период оформления заказа (ISO 8601)
+                page_size - размер страницы (не более 100)
 
     Доступно только для авторизованных поставщиков.
     """
     permission_classes = [permissions.IsAuthenticated, OnlyShops]
+    serializer_class = OrderFastSerializer
+    pagination_class = ShopOrderCursorPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ShopOrderFilter
 
-    def get(self, request, *args, **kwargs):
-        order = get_queryset_orders_shop(request)
-        serializer = OrderSerializer(order, many=True)
-        return Response(serializer.data)
+    def get_queryset(self):
+        return get_queryset_orders(shop_user_id=self.request.user.id, exclude_state='basket')
 
 
 class OrderView(ModelViewSet):
@@ -227,25 +434,40 @@ class OrderView(ModelViewSet):
 
     Принимает методы HTTP запроса:
 
-        GET - Возвращает все заказы пользователя.
+        GET - Возвращает заказы пользователя от новых к старым, постранично по курсору.
+            аргументы:
+                state - статус заказа
+                dt_after, dt_before - период оформления заказа (ISO 8601)
+                page_size - размер страницы (не более 100)
 
         PUT - Изменяет статус на "new" переносит из корзины в заказы.
             аргументы:
                 state = new
 
     После PUT запроса с state=new отправляется email c ссылкой на подтверждение заказа.
+    При оформлении заказа товар резервируется: свободный остаток поставщиков уменьшается,
+    если товара не хватает, возвращается ошибка 400 и заказ остается в корзине.
+    Резерв снимается, когда заказ отправлен покупателю или отменен.
 
     Доступно только для авторизованных пользователей.
     """
 
     serializer_class = OrderSerializer
+    pagination_class = OrderCursorPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = OrderFilter
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return get_queryset_orders_user(self.request)
+        return get_queryset_orders(user_id=self.request.user.id, exclude_state='basket')
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return OrderFastSerializer
+        return OrderSerializer
 
     def get_object(self):
-        queryset = get_queryset_basket_user(self.request)
+        queryset = get_queryset_orders(user_id=self.request.user.id, state='basket')
         obj = get_object_or_404(queryset, user=self.request.user)
         self.check_object_permissions(self.request, obj)
         return obj
@@ -253,6 +475,17 @@ class OrderView(ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def update(self, request, *args, **kwargs):
+        try:
+            return super().update(request, *args, **kwargs)
+        except OutOfStock as error:
+            return Response({'error': "Недостаточно товара у поставщика", 'product_info': error.product_info_ids},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+
 
 class ConfirmOrder(APIView):
     """
@@ -271,9 +504,15 @@ class ConfirmOrder(APIView):
 
         order_token = ConfirmOrderToken.objects.filter(key=key).first()
         if order_token:
-            order_token.order.state = 'confirmed'
-            order_token.order.save()
-            order_token.delete()
+            order = order_token.order
+            try:
+                with transaction.atomic():
+                    order.state = 'confirmed'
+                    order.save(update_fields=['state'])
+                    order_token.delete()
+            except OutOfStock as error:
+                return Response({"state": False, "Errors": "Недостаточно товара у поставщика",
+                                 "product_info": error.product_info_ids})
 
             return Response({"state": True})
         return Response({"state": False})
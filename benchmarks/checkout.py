@@ -0,0 +1,141 @@
+"""
+Бенчмарк параллельного оформления заказов с резервированием остатков.
+
+Создает тестовую базу данных (по настройкам DATABASES, удаляется после прогона),
+--products товаров с остатком --stock и --orders корзин по --items случайных
+товаров, затем оформляет корзины в --threads потоков через sync_order_stock.
+Малое число товаров при большом числе потоков дает высокую конкуренцию за строки.
+
+Выводит пропускную способность (оформлений в секунду), число оформленных
+и отклоненных из-за нехватки товара заказов и ошибок базы (в том числе
+взаимоблокировок). После прогона проверяет, что для каждого товара
+резерв равен количеству в оформленных заказах и не превышает остатка
+поставщика; при перепродаже или ошибках завершается с кодом 1.
+
+Запускать на PostgreSQL: SQLite блокирует базу целиком, и параллельные
+оформления в нем завершаются ошибками блокировки (без перепродажи).
+
+    python -m benchmarks.checkout --threads 1 4 16 --products 20 --orders 2000
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+from collections import Counter
+from time import perf_counter
+
+
+def checkout_worker(orders: list, results: Counter, lock: threading.Lock) -> None:
+    from django.db import connection, transaction, DatabaseError
+    from backend.models import Order
+    from backend.services.stock import OutOfStock, sync_order_stock
+
+    local = Counter()
+    try:
+        for order in orders:
+            try:
+                with transaction.atomic():
+                    sync_order_stock(order, 'new')
+                    # статус меняется через update, чтобы не отправлять письма
+                    Order.objects.filter(id=order.id).update(state='new')
+                local['placed'] += 1
+            except OutOfStock:
+                local['rejected'] += 1
+            except DatabaseError:
+                local['errors'] += 1
+    finally:
+        connection.close()
+        with lock:
+            results.update(local)
+
+
+def run(threads: int, options: dict) -> dict:
+    """
+    Один прогон: заполняет базу и оформляет все корзины в threads потоков
+    """
+    from django.db.models import Sum
+    from backend.models import User, Shop, Category, Product, ProductInfo, Order, OrderItem
+
+    rng = random.Random(options['seed'])
+    shop = Shop.objects.create(name=f'Магазин {threads}', user=User.objects.create_user(
+        email=f'shop{threads}@example.com', type='shop'), state=True)
+    category, _ = Category.objects.get_or_create(name='Категория')
+    products = Product.objects.bulk_create([Product(name=f'Товар {threads}/{number}', category=category)
+                                            for number in range(options['products'])])
+    ProductInfo.objects.bulk_create([ProductInfo(shop=shop, product=product, external_id=number, model='',
+                                                 quantity=options['stock'], price=100, price_rrc=100)
+                                     for number, product in enumerate(products)])
+    product_info_ids = list(ProductInfo.objects.filter(shop=shop).order_by('id').values_list('id', flat=True))
+
+    buyer = User.objects.create_user(email=f'buyer{threads}@example.com', type='buyer')
+    orders = Order.objects.bulk_create([Order(user=buyer, state='basket') for _ in range(options['orders'])])
+    OrderItem.objects.bulk_create([OrderItem(order=order, product_info_id=product_info_id,
+                                             quantity=rng.randint(1, options['max_quantity']))
+                                   for order in orders
+                                   for product_info_id in rng.sample(product_info_ids, options['items'])])
+
+    results, lock = Counter(), threading.Lock()
+    workers = [threading.Thread(target=checkout_worker, args=(orders[index::threads], results, lock))
+               for index in range(threads)]
+    started = perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    seconds = perf_counter() - started
+
+    reserved = dict(OrderItem.objects.filter(order__user=buyer, order__stock_reserved=True).values(
+        'product_info_id').annotate(total=Sum('quantity')).values_list('product_info_id', 'total'))
+    oversold = [product_info_id for product_info_id, quantity, reserved_quantity in ProductInfo.objects.filter(
+        shop=shop).values_list('id', 'quantity', 'reserved_quantity')
+                if reserved_quantity > quantity or reserved_quantity != reserved.get(product_info_id, 0)]
+    placed = Order.objects.filter(user=buyer, state='new', stock_reserved=True).count()
+    return {'threads': threads, 'seconds': round(seconds, 3),
+            'checkouts_per_second': round(options['orders'] / seconds),
+            'placed': results['placed'], 'rejected': results['rejected'], 'errors': results['errors'],
+            'oversold': len(oversold) + abs(placed - results['placed'])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16],
+                        help='Число потоков (несколько значений - несколько прогонов)')
+    parser.add_argument('--products', type=int, default=20, help='Товаров у поставщика')
+    parser.add_argument('--stock', type=int, default=200, help='Начальный остаток каждого товара')
+    parser.add_argument('--orders', type=int, default=1000, help='Корзин для оформления')
+    parser.add_argument('--items', type=int, default=3, help='Позиций в корзине')
+    parser.add_argument('--max-quantity', type=int, default=3, help='Наибольшее количество товара в позиции')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--locmem-cache', action='store_true',
+                        help='Кэш в памяти процесса вместо CACHES из настроек (без Redis)')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+
+    if args.locmem_cache:
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    options = vars(args)
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    failed = False
+    try:
+        print(f'{"threads":>7}{"seconds":>9}{"checkouts/s":>13}{"placed":>8}{"rejected":>10}{"errors":>8}'
+              f'{"oversold":>10}')
+        for threads in args.threads:
+            result = run(threads, options)
+            failed = failed or bool(result['errors'] or result['oversold'])
+            print(f'{result["threads"]:>7}{result["seconds"]:>9.2f}{result["checkouts_per_second"]:>13}'
+                  f'{result["placed"]:>8}{result["rejected"]:>10}{result["errors"]:>8}{result["oversold"]:>10}')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Генерация синтетических прайсов поставщиков в формате data/shop1.yaml
+и его вариантах (JSON, NDJSON, CSV) для бенчмарков.
+"""
+import csv
+import io
+import random
+from typing import Iterator
+
+import ujson
+
+CATEGORIES = [{'id': 224, 'name': 'Смартфоны'}, {'id': 15, 'name': 'Аксессуары'}, {'id': 1, 'name': 'Flash-накопители'}]
+COLORS = ['черный', 'белый', 'красный', 'синий', 'золотистый']
+
+
+def iter_goods(count: int, parameters: int = 4, seed: int = 0, shop_index: int = 0, overlap: float = 1.0,
+               changed: float = 0.0) -> Iterator[dict]:
+    """
+    Возвращает count товаров с parameters параметрами у каждого
+    :param shop_index: номер магазина; цены и остатки у магазинов различаются
+    :param overlap: доля товаров, общих со всеми магазинами (одинаковые название и категория)
+    :param changed: доля товаров с измененной ценой относительно того же прайса с changed=0
+    """
+    rng = random.Random(f'{seed}:{shop_index}')
+    shared = int(count * overlap)
+    changed_every = round(1 / changed) if changed else 0
+    for number in range(1, count + 1):
+        category = CATEGORIES[number % len(CATEGORIES)]
+        params = {'Цвет': COLORS[number % len(COLORS)]}
+        for index in range(1, parameters):
+            params[f'Параметр {index}'] = rng.randint(1, 512)
+        price = rng.randint(1000, 150000)
+        quantity = rng.randint(0, 50)
+        if changed_every and number % changed_every == 0:
+            price += 1
+        name = f'Товар {number} ({params["Цвет"]})'
+        if number > shared:
+            name = f'{name} магазина {shop_index}'
+        yield {'id': number,
+               'category': category['id'],
+               'model': f'model/{number % 1000}',
+               'name': name,
+               'price': price,
+               'price_rrc': price + price // 10,
+               'quantity': quantity,
+               'parameters': params}
+
+
+def write_yaml(file: io.TextIOBase, shop: str, goods: Iterator[dict]) -> None:
+    """
+    Пишет прайс в блочном YAML так же, как выглядят файлы поставщиков.
+    Строки экранируются как в JSON: это корректные YAML-скаляры в двойных кавычках.
+    """
+    dumps = lambda value: ujson.dumps(value, ensure_ascii=False)
+    file.write(f'shop: {dumps(shop)}\ncategories:\n')
+    for category in CATEGORIES:
+        file.write(f'  - id: {category["id"]}\n    name: {dumps(category["name"])}\n')
+    file.write('goods:\n')
+    for good in goods:
+        file.write(f'  - id: {good["id"]}\n'
+                   f'    category: {good["category"]}\n'
+                   f'    model: {dumps(good["model"])}\n'
+                   f'    name: {dumps(good["name"])}\n'
+                   f'    price: {good["price"]}\n'
+                   f'    price_rrc: {good["price_rrc"]}\n'
+                   f'    quantity: {good["quantity"]}\n'
+                   f'    parameters:\n')
+        for name, value in good['parameters'].items():
+            file.write(f'      {dumps(name)}: {dumps(value)}\n')
+
+
+def write_json(file: io.TextIOBase, shop: str, goods: Iterator[dict]) -> None:
+    file.write(ujson.dumps({'shop': shop, 'categories': CATEGORIES, 'goods': list(goods)}, ensure_ascii=False))
+
+
+def write_ndjson(file: io.TextIOBase, shop: str, goods: Iterator[dict]) -> None:
+    file.write(ujson.dumps({'shop': shop, 'categories': CATEGORIES}, ensure_ascii=False) + '\n')
+    for good in goods:
+        file.write(ujson.dumps(good, ensure_ascii=False) + '\n')
+
+
+def write_csv(file: io.TextIOBase, shop: str, goods: Iterator[dict]) -> None:
+    categories = {category['id']: category['name'] for category in CATEGORIES}
+    writer = None
+    for good in goods:
+        if writer is None:
+            writer = csv.writer(file)
+            parameters = list(good['parameters'])
+            writer.writerow(['shop', 'id', 'category', 'category_name', 'model', 'name', 'price', 'price_rrc',
+                             'quantity', *parameters])
+        writer.writerow([shop, good['id'], good['category'], categories[good['category']], good['model'],
+                         good['name'], good['price'], good['price_rrc'], good['quantity'],
+                         *(good['parameters'].get(name, '') for name in parameters)])
+
+
+WRITERS = {
+    'yaml': write_yaml,
+    'json': write_json,
+    'ndjson': write_ndjson,
+    'csv': write_csv,
+}
+
+EXTENSIONS = {
+    'yaml': '.yaml',
+    'json': '.json',
+    'ndjson': '.ndjson',
+    'csv': '.csv',
+}
+
+
+def write_feed(path: str, feed_format: str, count: int, parameters: int = 4, shop: str = 'Магазин',
+               seed: int = 0, **goods_options) -> None:
+    """
+    Пишет синтетический прайс в файл
+    :param goods_options: shop_index, overlap и changed для iter_goods
+    """
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        WRITERS[feed_format](file, shop, iter_goods(count, parameters, seed, **goods_options))
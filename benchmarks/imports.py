@@ -0,0 +1,170 @@
+"""
+Бенчмарк загрузки прайсов поставщиков.
+
+Генерирует синтетические прайсы заданного размера, загружает их в тестовую
+базу данных (создается по настройкам DATABASES и удаляется после прогона)
+и измеряет для каждой фазы время, число запросов, пиковую память процесса
+и скорость в товарах в секунду:
+
+    cold     - первая загрузка прайсов всех магазинов в пустую базу;
+    reimport - повторная загрузка тех же прайсов (без изменений);
+    changed  - загрузка прайсов, в которых изменилась доля --changed товаров.
+
+Каждый размер прайса запускается в отдельном процессе, поэтому peak RSS
+относится к одному размеру; внутри процесса значение фазы - максимум
+с начала процесса. Результаты дописываются в benchmarks/results/imports.json
+и сравниваются с прошлым прогоном с теми же параметрами.
+
+    python -m benchmarks.imports --goods 1000 10000 100000 --parameters 4 --shops 2 --overlap 0.5
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+from time import perf_counter
+
+RESULTS_PATH = os.path.join(os.path.dirname(__file__), 'results', 'imports.json')
+REGRESSION_THRESHOLD = 1.2
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run_size(options: dict) -> list:
+    """
+    Прогон одного размера прайса; выполняется в отдельном процессе
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+    from backend.models import User
+    from backend.services.feed_parsers import get_parser
+    from backend.services.price_list_import import import_price_list_records
+    from benchmarks.feeds import EXTENSIONS, write_feed
+
+    if options['locmem_cache']:
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    goods, shops, feed_format = options['goods'], options['shops'], options['format']
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        users = [User.objects.create_user(email=f'shop{index}@example.com', type='shop') for index in range(shops)]
+        results = []
+        with tempfile.TemporaryDirectory() as directory:
+            phases = [('cold', 0.0), ('reimport', 0.0)]
+            if options['changed']:
+                phases.append(('changed', options['changed']))
+            for phase, changed in phases:
+                paths = []
+                for index in range(shops):
+                    path = os.path.join(directory, f'{phase}{index}{EXTENSIONS[feed_format]}')
+                    write_feed(path, feed_format, goods, options['parameters'], shop=f'Магазин {index}',
+                               shop_index=index, overlap=options['overlap'], changed=changed)
+                    paths.append(path)
+
+                counter = QueryCounter()
+                started = perf_counter()
+                with connection.execute_wrapper(counter):
+                    for user, path in zip(users, paths):
+                        with open(path, 'rb') as file:
+                            import_price_list_records(get_parser('', path)(file), user.id)
+                seconds = perf_counter() - started
+                results.append({'phase': phase,
+                                'goods': goods * shops,
+                                'seconds': round(seconds, 3),
+                                'queries': counter.count,
+                                'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                                'rows_per_second': round(goods * shops / seconds)})
+        return results
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def load_runs() -> list:
+    if not os.path.exists(RESULTS_PATH):
+        return []
+    with open(RESULTS_PATH, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_run(run: dict) -> None:
+    runs = load_runs()
+    runs.append(run)
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, 'w', encoding='utf-8') as file:
+        json.dump(runs, file, ensure_ascii=False, indent=2)
+
+
+def find_previous(runs: list, parameters: dict, goods: int, phase: str):
+    for run in reversed(runs):
+        if run['parameters'] == parameters:
+            for result in run['results']:
+                if result['goods_per_shop'] == goods and result['phase'] == phase:
+                    return result
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--goods', type=int, nargs='+', default=[1000, 10000],
+                        help='Товаров в прайсе одного магазина (несколько значений - несколько прогонов)')
+    parser.add_argument('--parameters', type=int, default=4, help='Параметров у товара')
+    parser.add_argument('--shops', type=int, default=1, help='Количество магазинов')
+    parser.add_argument('--overlap', type=float, default=0.5, help='Доля товаров, общих для всех магазинов')
+    parser.add_argument('--changed', type=float, default=0.02, help='Доля измененных товаров в фазе changed')
+    parser.add_argument('--format', default='yaml', choices=['yaml', 'json', 'ndjson', 'csv'])
+    parser.add_argument('--locmem-cache', action='store_true',
+                        help='Кэш в памяти процесса вместо CACHES из настроек (без Redis)')
+    parser.add_argument('--no-save', action='store_true', help='Не сохранять результаты')
+    args = parser.parse_args()
+
+    parameters = {'parameters': args.parameters, 'shops': args.shops, 'overlap': args.overlap,
+                  'changed': args.changed, 'format': args.format}
+    runs = load_runs()
+    results = []
+    context = multiprocessing.get_context('spawn')
+
+    print(f'{"goods":>9} {"phase":<9}{"seconds":>9}{"queries":>9}{"peak RSS, MB":>14}{"rows/s":>9}{"vs prev":>9}')
+    for goods in args.goods:
+        with context.Pool(1) as pool:
+            size_results = pool.apply(run_size, ({**parameters, 'goods': goods,
+                                                      'locmem_cache': args.locmem_cache},))
+        for result in size_results:
+            result['goods_per_shop'] = goods
+            previous = find_previous(runs, parameters, goods, result['phase'])
+            ratio = result['seconds'] / previous['seconds'] if previous and previous['seconds'] else None
+            mark = '' if ratio is None else f'{ratio:.2f}x' + (' !' if ratio > REGRESSION_THRESHOLD else '')
+            print(f'{goods:>9} {result["phase"]:<9}{result["seconds"]:>9.2f}{result["queries"]:>9}'
+                  f'{result["peak_rss_mb"]:>14.1f}{result["rows_per_second"]:>9}{mark:>9}')
+            results.append(result)
+
+    if not args.no_save:
+        save_run({'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                  'revision': git_revision(),
+                  'parameters': parameters,
+                  'results': results})
+
+
+if __name__ == '__main__':
+    main()
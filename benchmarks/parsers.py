@@ -0,0 +1,40 @@
+"""
+Сравнение скорости разбора прайсов в разных форматах.
+
+    python -m benchmarks.parsers --goods 100000 --parameters 4
+"""
+import argparse
+import os
+import tempfile
+from time import perf_counter
+
+from backend.services.feed_parsers import GOOD, PARSERS
+from benchmarks.feeds import EXTENSIONS, write_feed
+
+
+def measure(path: str, feed_format: str) -> tuple:
+    started = perf_counter()
+    with open(path, 'rb') as file:
+        goods = sum(1 for kind, _ in PARSERS[feed_format](file) if kind == GOOD)
+    return goods, perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--goods', type=int, default=100000)
+    parser.add_argument('--parameters', type=int, default=4)
+    parser.add_argument('--formats', nargs='+', default=list(PARSERS), choices=list(PARSERS))
+    args = parser.parse_args()
+
+    print(f'{"format":<8}{"size, MB":>10}{"seconds":>10}{"goods/s":>12}{"MB/s":>8}')
+    with tempfile.TemporaryDirectory() as directory:
+        for feed_format in args.formats:
+            path = os.path.join(directory, 'feed' + EXTENSIONS[feed_format])
+            write_feed(path, feed_format, args.goods, args.parameters)
+            size = os.path.getsize(path) / 1024 / 1024
+            goods, seconds = measure(path, feed_format)
+            print(f'{feed_format:<8}{size:>10.1f}{seconds:>10.2f}{goods / seconds:>12.0f}{size / seconds:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
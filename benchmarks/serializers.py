@@ -0,0 +1,100 @@
+"""
+Сравнение скорости сериализаторов каталога и заказов:
+ModelSerializer (ProductInfoSerializer, OrderSerializer) и быстрых
+сериализаторов для чтения. Объекты создаются в памяти вместе с кэшем
+prefetch_related, поэтому база данных не нужна и измеряется только
+сериализация и рендеринг JSON.
+
+    python -m benchmarks.serializers --rows 20000 --parameters 4 --items 5
+"""
+import argparse
+import os
+import random
+from datetime import datetime, timezone
+from time import perf_counter
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('ENGINE', 'django.db.backends.sqlite3')
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from backend.models import Category, Contact, Order, OrderItem, Parameter, Product, ProductInfo, \
+    ProductParameter  # noqa: E402
+from backend.serializers import OrderFastSerializer, OrderSerializer, ProductInfoFastSerializer, \
+    ProductInfoSerializer  # noqa: E402
+from benchmarks.feeds import CATEGORIES, COLORS  # noqa: E402
+
+
+def prefetched(instance, name: str, objects: list):
+    instance._prefetched_objects_cache = {name: objects}
+    return instance
+
+
+def make_product_infos(count: int, parameters: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    categories = [Category(id=category['id'], name=category['name']) for category in CATEGORIES]
+    names = [Parameter(id=number, name=f'Параметр {number}') for number in range(1, parameters + 1)]
+    product_infos = []
+    for number in range(1, count + 1):
+        product = Product(id=number, name=f'Товар {number}', category=rng.choice(categories))
+        product_info = ProductInfo(id=number, model=f'model/{number}', external_id=number, product=product,
+                                   shop_id=1, quantity=rng.randint(0, 100), price=rng.randint(100, 100000),
+                                   price_rrc=rng.randint(100, 100000))
+        product_infos.append(prefetched(product_info, 'product_parameters', [
+            ProductParameter(id=number * parameters + index, product_info=product_info, parameter=parameter,
+                             value=rng.choice(COLORS)) for index, parameter in enumerate(names)]))
+    return product_infos
+
+
+def make_orders(count: int, items: int, product_infos: list, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    contact = Contact(id=1, city='Москва', street='Тверская', house='1', structure='', building='', apartment='1',
+                      phone='+79990000000')
+    orders = []
+    for number in range(1, count + 1):
+        order = Order(id=number, state='new', dt=datetime(2022, 9, 1, tzinfo=timezone.utc), contact=contact,
+                      items_count=items)
+        ordered_items = []
+        for index in range(items):
+            product_info = rng.choice(product_infos)
+            ordered_items.append(OrderItem(id=number * items + index, order=order, product_info=product_info,
+                                           quantity=2))
+            order.total_sum += product_info.price * 2
+        orders.append(prefetched(order, 'ordered_items', ordered_items))
+    return orders
+
+
+def measure(serializer_class, objects: list) -> tuple:
+    started = perf_counter()
+    content = JSONRenderer().render(serializer_class(objects, many=True).data)
+    return perf_counter() - started, content
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000, help='Количество товаров и заказов')
+    parser.add_argument('--parameters', type=int, default=4, help='Параметров у товара')
+    parser.add_argument('--items', type=int, default=5, help='Позиций в заказе')
+    args = parser.parse_args()
+
+    product_infos = make_product_infos(args.rows, args.parameters)
+    orders = make_orders(args.rows, args.items, product_infos)
+    cases = [('products', ProductInfoSerializer, ProductInfoFastSerializer, product_infos),
+             ('orders', OrderSerializer, OrderFastSerializer, orders)]
+
+    print(f'{"payload":<10}{"serializer":<28}{"seconds":>9}{"rows/s":>10}{"speedup":>9}')
+    for payload, model_serializer, fast_serializer, objects in cases:
+        base_seconds, base_content = measure(model_serializer, objects)
+        fast_seconds, fast_content = measure(fast_serializer, objects)
+        assert fast_content == base_content, f'{fast_serializer.__name__} отличается от {model_serializer.__name__}'
+        for serializer_class, seconds in ((model_serializer, base_seconds), (fast_serializer, fast_seconds)):
+            print(f'{payload:<10}{serializer_class.__name__:<28}{seconds:>9.2f}{len(objects) / seconds:>10.0f}'
+                  f'{base_seconds / seconds:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -10,8 +10,10 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
+from celery.schedules import crontab
 
 load_dotenv()
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -185,12 +187,53 @@ REST_FRAMEWORK = {
     'DEFAULT_THROTTLE_RATES': {
         'user': '100/minute',
         'anon': '50/minute',
+        'catalog_export': os.getenv('CATALOG_EXPORT_RATE', '10/hour'),
 
     },
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'TEST_REQUEST_DEFAULT_FORMAT': 'json',
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_URL', 'redis://127.0.0.1:6379/2'),
+    }
+}
+# время жизни закэшированных ответов каталога, с
+RESPONSE_CACHE_TIMEOUT = 10 * 60
+# Cache-Control: max-age ответов каталога для клиентов и CDN, с
+RESPONSE_CACHE_MAX_AGE = int(os.getenv('RESPONSE_CACHE_MAX_AGE', 60))
+
 CELERY_BROKER_URL = 'redis://127.0.0.1:6379/1'
 CELERY_RESULT_BACKEND = 'redis://127.0.0.1:6379/1'
 CELERY_BROKER_TRANSPORT = 'redis'
+CELERY_TASK_TRACK_STARTED = True
+
+# price lists
+# хранилище загруженных файлов прайсов: их сохраняет веб-процесс, а читает воркер celery,
+# поэтому каталог должен быть общим томом (или задается другое хранилище, например S3)
+PRICE_LIST_UPLOAD_DIR = os.getenv('PRICE_LIST_UPLOAD_DIR', os.path.join(tempfile.gettempdir(), 'price_lists'))
+PRICE_LIST_UPLOAD_STORAGE = {
+    'BACKEND': os.getenv('PRICE_LIST_UPLOAD_STORAGE', 'django.core.files.storage.FileSystemStorage'),
+    'OPTIONS': {'location': PRICE_LIST_UPLOAD_DIR},
+}
+PRICE_LIST_MAX_UPLOAD_SIZE = 512 * 1024 * 1024
+PRICE_LIST_MAX_FEED_SIZE = 4 * 1024 * 1024 * 1024
+# очередь задач обновления прайсов по ссылке; число одновременных загрузок задается
+# concurrency ее воркера: celery -A config worker -Q price_lists -c 4
+PRICE_LIST_REFRESH_QUEUE = os.getenv('PRICE_LIST_REFRESH_QUEUE', 'price_lists')
+PRICE_LIST_REFRESH_JITTER = 15 * 60
+# общий кэш id продуктов и параметров между загрузками прайсов (0 - отключен)
+PRICE_LIST_LOOKUP_CACHE_SIZE = int(os.getenv('PRICE_LIST_LOOKUP_CACHE_SIZE', 0))
+
+CELERY_TASK_ROUTES = {
+    'backend.tasks.celery_refresh_shop_feed': {'queue': PRICE_LIST_REFRESH_QUEUE},
+}
+
+CELERY_BEAT_SCHEDULE = {
+    'refresh-shop-feeds': {
+        'task': 'backend.tasks.celery_refresh_shop_feeds',
+        'schedule': crontab(minute=0, hour=0),
+    },
+}
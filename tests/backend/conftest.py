@@ -0,0 +1,77 @@
+import gzip
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from django.core.cache import cache
+
+
+class FeedServer:
+    """
+    Локальный HTTP сервер, отдающий прайс с ETag, Last-Modified и gzip
+    """
+
+    last_modified = 'Wed, 21 Oct 2015 07:28:00 GMT'
+
+    def __init__(self):
+        self.content = b''
+        self.content_type = 'application/x-yaml'
+        self.requests = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.make_handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def etag(self):
+        return '"%s"' % hashlib.md5(self.content).hexdigest()
+
+    def url(self, path='/shop.yaml'):
+        return f'http://127.0.0.1:{self.server.server_port}{path}'
+
+    def make_handler(self):
+        feed_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                feed_server.requests.append(dict(self.headers))
+                if self.headers.get('If-None-Match') == feed_server.etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+
+                body = feed_server.content
+                self.send_response(200)
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    body = gzip.compress(body)
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Type', feed_server.content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', feed_server.etag)
+                self.send_header('Last-Modified', feed_server.last_modified)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def feed_server():
+    server = FeedServer()
+    server.thread.start()
+    yield server
+    server.server.shutdown()
+    server.server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def locmem_cache(settings):
+    """
+    Кэш в памяти процесса вместо Redis, пустой в каждом тесте
+    """
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    cache.clear()
+    yield
+    cache.clear()
@@ -1,13 +1,33 @@
-from rest_framework.test import APIClient
+import csv
+import gzip
+import io
+import json
+
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.throttling import ScopedRateThrottle
 import pytest
+from django.db import IntegrityError, transaction
+from django.db.models import ExpressionWrapper, F, FloatField, QuerySet
 from model_bakery import baker
 
-from backend.models import Category, User, Shop, Contact, ProductInfo, Product, OrderItem, Order
+from backend.models import Category, User, Shop, Contact, ProductInfo, Product, OrderItem, Order, ProductParameter, \
+    Parameter, CatalogItem
 from rest_framework.authtoken.models import Token
 
+from backend.pagination import CatalogCursorPagination
+from backend.services.basket import get_basket_for_update
+from backend.services.catalog import rebuild_shop_catalog
+from backend.services.response_cache import bump_catalog_version, PRODUCTS
+
 api_url = '/api/v1/'
 
 
+def rebuild_catalog():
+    for shop_id in Shop.objects.values_list('id', flat=True):
+        rebuild_shop_catalog(shop_id)
+
+
 @pytest.fixture
 def client():
     return APIClient()
@@ -136,6 +156,85 @@ def test_get_shop(client, shop_factory):
                 assert item['name'] == i.name
 
 
+@pytest.mark.django_db
+def test_catalog_responses_are_cached(client, shop_factory, product_info_factory, create_token_factory,
+                                      django_assert_num_queries):
+    """
+    Проверка кэша ответов CategoryView, ShopView и ProductInfoView:
+    повторный запрос не обращается к базе, изменение статуса магазина сбрасывает кэш
+    """
+    shop = shop_factory(state=True, user__type='shop')
+    product_info_factory(shop=shop, _quantity=3)
+    rebuild_catalog()
+    token = create_token_factory(user=shop.user)
+
+    for url in ('categories', 'shops', 'products/', 'products/?page_size=2'):
+        first = client.get(api_url + url)
+        with django_assert_num_queries(0):
+            second = client.get(api_url + url)
+        assert second.status_code == 200
+        assert second.content == first.content
+
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+    assert client.put(api_url + 'partner/state', {'state': False}).status_code == 200
+    client.credentials()
+
+    assert client.get(api_url + 'shops').json() == []
+    assert client.get(api_url + 'products/').json()['results'] == []
+
+
+@pytest.mark.django_db
+def test_catalog_cache_reset_on_shop_and_category(client, shop_factory, category_factory, create_token_factory):
+    """
+    Изменение магазина без товаров и новая категория без товаров сбрасывают кэш ответов
+    """
+    shop = shop_factory(state=True, user__type='shop')
+    token = create_token_factory(user=shop.user)
+    assert [item['state'] for item in client.get(api_url + 'shops').json()] == [True]
+    assert client.get(api_url + 'categories').json() == []
+
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+    assert client.put(api_url + 'partner/state', {'state': False}).status_code == 200
+    client.credentials()
+    category = category_factory()
+
+    assert client.get(api_url + 'shops').json() == []
+    assert client.get(api_url + 'categories').json() == [{'id': category.id, 'name': category.name}]
+
+
+@pytest.mark.django_db
+def test_catalog_conditional_get(client, shop_factory, product_info_factory, django_assert_num_queries):
+    """
+    Проверка ETag и If-None-Match у ProductInfoView, CategoryView и ShopView:
+    ETag меняется вместе с телом ответа, а не с версией кэша
+    """
+    shop = shop_factory(state=True)
+    product_info_factory(shop=shop, _quantity=2)
+    rebuild_catalog()
+
+    for url in ('categories', 'shops', 'products/?page_size=1'):
+        respone = client.get(api_url + url)
+        etag = respone['ETag']
+        assert respone.status_code == 200
+        assert respone['Cache-Control'].startswith('public, max-age=')
+
+        with django_assert_num_queries(0):
+            respone = client.get(api_url + url, HTTP_IF_NONE_MATCH=etag)
+        assert respone.status_code == 304
+        assert respone['ETag'] == etag
+        assert not respone.content
+
+    etag = client.get(api_url + 'products/')['ETag']
+    assert client.get(api_url + 'products/?page_size=1')['ETag'] != etag
+    bump_catalog_version(PRODUCTS)
+    assert client.get(api_url + 'products/', HTTP_IF_NONE_MATCH=etag).status_code == 304
+    ProductInfo.objects.filter(shop=shop).update(price=1)
+    rebuild_shop_catalog(shop.id)
+    respone = client.get(api_url + 'products/', HTTP_IF_NONE_MATCH=etag)
+    assert respone.status_code == 200
+    assert respone['ETag'] != etag
+
+
 @pytest.mark.django_db
 def test_get_my_contact(client, contact_factory, create_token_factory):
     """
@@ -221,12 +320,203 @@ def test_search_product_info(client, product_info_factory):
     """
     product_info = product_info_factory(_quantity=5)
     product_shop = product_info[3].shop
+    rebuild_catalog()
 
     respone = client.get(api_url + f'products/?shop_id={product_shop.id}')
     data = respone.json()
 
     assert respone.status_code == 200
-    assert data[0]['shop'] == product_shop.id
+    assert data['results'][0]['shop'] == product_shop.id
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('quantity', [1, 20])
+def test_product_info_list_query_budget(client, product_info_factory, django_assert_num_queries, quantity):
+    """
+    Проверка ProductInfoView: страница каталога читается одним запросом
+    """
+    shop = baker.make(Shop, state=True)
+    for product_info in product_info_factory(shop=shop, _quantity=quantity):
+        baker.make(ProductParameter, product_info=product_info, _quantity=3)
+    rebuild_catalog()
+
+    with django_assert_num_queries(1):
+        respone = client.get(api_url + 'products/')
+    data = respone.json()['results']
+
+    assert respone.status_code == 200
+    assert len(data) == quantity
+    assert data[-1]['product']['category'] == product_info.product.category.name
+    assert len(data[0]['product_parameters']) == 3
+
+
+@pytest.mark.django_db
+def test_product_info_cursor_pagination(client, product_info_factory, django_assert_num_queries):
+    """
+    Проверка ProductInfoView: постраничный вывод по курсору с фильтрами
+    """
+    shop = baker.make(Shop, state=True)
+    product_infos = product_info_factory(shop=shop, _quantity=7)
+    product_info_factory(shop=baker.make(Shop, state=True), _quantity=3)
+    rebuild_catalog()
+
+    ids = []
+    url = api_url + f'products/?shop_id={shop.id}&page_size=3'
+    while url:
+        with django_assert_num_queries(1):
+            respone = client.get(url)
+        data = respone.json()
+        assert respone.status_code == 200
+        assert len(data['results']) <= 3
+        ids.extend(item['id'] for item in data['results'])
+        url = data['next']
+
+    assert ids == [product_info.id for product_info in product_infos]
+
+
+@pytest.mark.django_db
+def test_search_product_info_by_words(client):
+    """
+    Проверка ProductInfoView на поиск по словам из названия и модели
+    """
+    shop = baker.make(Shop, state=True)
+    found = baker.make(ProductInfo, shop=shop, model='apple/iphone/xr', product__name='Смартфон Apple iPhone XR 256GB')
+    baker.make(ProductInfo, shop=shop, model='apple/iphone/xs', product__name='Смартфон Apple iPhone XS 64GB')
+    baker.make(ProductInfo, shop=shop, model='xiaomi/redmi', product__name='Смартфон Xiaomi Redmi 256GB')
+    rebuild_catalog()
+
+    respone = client.get(api_url + 'products/', {'search': 'iphone XR 256'})
+    data = respone.json()
+
+    assert respone.status_code == 200
+    assert [item['id'] for item in data['results']] == [found.id]
+
+
+@pytest.mark.django_db
+def test_search_results_pagination(product_info_factory):
+    """
+    Курсор результатов поиска хранит релевантность и pk: товары с одинаковой
+    релевантностью не пропускаются и не повторяются на соседних страницах
+    """
+    for price in (10, 10, 10, 20, 20, 40, 40, 40):
+        product_info_factory(price=price, is_active=True)
+    rebuild_catalog()
+    queryset = CatalogItem.objects.annotate(search_rank=ExpressionWrapper(1.0 / F('price'), output_field=FloatField()))
+    paginator = CatalogCursorPagination()
+
+    ids, url = [], api_url + 'products/?page_size=3'
+    while url:
+        ids.extend(item.pk for item in paginator.paginate_queryset(queryset, Request(APIRequestFactory().get(url))))
+        url = paginator.get_next_link()
+
+    assert ids == list(queryset.order_by('-search_rank', 'pk').values_list('pk', flat=True))
+
+
+@pytest.mark.django_db
+def test_filter_product_info_by_parameters(client):
+    """
+    Проверка ProductInfoView на фильтрацию по параметрам товара и подсчет фасетов
+    """
+    shop = baker.make(Shop, state=True)
+    color, memory = baker.make(Parameter, name='Цвет'), baker.make(Parameter, name='Встроенная память (Гб)')
+    goods = {}
+    for key, values in {'black_256': ('черный', '256'), 'black_64': ('черный', '64'),
+                        'white_256': ('белый', '256')}.items():
+        goods[key] = baker.make(ProductInfo, shop=shop)
+        baker.make(ProductParameter, product_info=goods[key], parameter=color, value=values[0])
+        baker.make(ProductParameter, product_info=goods[key], parameter=memory, value=values[1])
+    rebuild_catalog()
+
+    respone = client.get(api_url + 'products/', {'param[Цвет]': 'черный', 'param[Встроенная память (Гб)]': '256'})
+    assert [item['id'] for item in respone.json()['results']] == [goods['black_256'].id]
+
+    respone = client.get(api_url + 'products/?param[Цвет]=черный&param[Цвет]=белый&facets=1')
+    data = respone.json()
+    assert respone.status_code == 200
+    assert len(data['results']) == 3
+    assert data['facets'] == {'Встроенная память (Гб)': {'256': 2, '64': 1}, 'Цвет': {'черный': 2, 'белый': 1}}
+
+    respone = client.get(api_url + 'products/', {'param[Вес]': '1', 'facets': 1})
+    assert respone.json()['results'] == []
+    assert respone.json()['facets'] == {}
+
+    for value in ('0', 'false'):
+        assert 'facets' not in client.get(api_url + 'products/', {'facets': value}).json()
+    respone = client.get(api_url + 'products/', {'facets': 'maybe'})
+    assert respone.status_code == 400
+    assert 'facets' in respone.json()
+
+
+@pytest.mark.django_db
+def test_compare_product_prices(client, django_assert_num_queries):
+    """
+    Проверка ProductCompareView: сводка цен продукта по включенным магазинам
+    """
+    shops = baker.make(Shop, state=True, _quantity=3)
+    disabled_shop = baker.make(Shop, state=False)
+    phone, case = baker.make(Product, _quantity=2)
+    color = baker.make(Parameter, name='Цвет')
+    for shop, price, quantity in ((shops[0], 300, 5), (shops[1], 100, 0), (shops[2], 200, 1), (disabled_shop, 50, 9)):
+        product_info = baker.make(ProductInfo, shop=shop, product=phone, price=price, quantity=quantity)
+        baker.make(ProductParameter, product_info=product_info, parameter=color,
+                   value='черный' if shop == shops[0] else 'белый')
+    baker.make(ProductInfo, shop=shops[0], product=case, price=10, quantity=1)
+    rebuild_catalog()
+
+    with django_assert_num_queries(1):
+        respone = client.get(api_url + 'products/compare')
+    data = respone.json()['results']
+
+    assert respone.status_code == 200
+    assert data[0] == {'product_id': phone.id, 'name': phone.name, 'category': phone.category.name, 'offers': 3,
+                       'min_price': 100, 'max_price': 300, 'avg_price': 200.0, 'quantity': 6,
+                       'cheapest_shop': shops[2].id}
+    assert [item['product_id'] for item in data] == [phone.id, case.id]
+
+    respone = client.get(api_url + 'products/compare', {'param[Цвет]': 'белый', 'category_id': phone.category_id})
+    assert [(item['offers'], item['cheapest_shop']) for item in respone.json()['results']] == [(2, shops[2].id)]
+
+
+@pytest.mark.django_db
+def test_export_catalog(client, product_info_factory):
+    """
+    Проверка CatalogExportView: потоковая выгрузка каталога в NDJSON и CSV, в том числе со сжатием gzip
+    """
+    shop = baker.make(Shop, state=True)
+    product_infos = product_info_factory(shop=shop, _quantity=3)
+    baker.make(ProductParameter, product_info=product_infos[0], parameter__name='Цвет', value='черный')
+    product_info_factory(shop=baker.make(Shop, state=False))
+    rebuild_catalog()
+    expected = client.get(api_url + 'products/').json()['results']
+
+    respone = client.get(api_url + 'products/export')
+    assert respone.streaming
+    assert respone['Content-Type'] == 'application/x-ndjson'
+    lines = b''.join(respone.streaming_content).decode().splitlines()
+    assert [json.loads(line) for line in lines] == expected
+
+    respone = client.get(api_url + 'products/export', {'export_format': 'csv', 'shop_id': shop.id},
+                         HTTP_ACCEPT_ENCODING='gzip')
+    assert respone['Content-Encoding'] == 'gzip'
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(b''.join(respone.streaming_content)).decode())))
+    assert [int(row['id']) for row in rows] == [item['id'] for item in expected]
+    assert json.loads(rows[0]['parameters']) == {'Цвет': 'черный'}
+    assert rows[0]['name'] == expected[0]['product']['name']
+
+
+@pytest.mark.django_db
+def test_export_catalog_errors_and_throttle(client, monkeypatch):
+    """
+    Проверка CatalogExportView: неизвестный формат - 400, gzip с q=0 не используется,
+    число выгрузок ограничено
+    """
+    monkeypatch.setattr(ScopedRateThrottle, 'THROTTLE_RATES', {'catalog_export': '2/minute'})
+
+    assert client.get(api_url + 'products/export', {'export_format': 'xml'}).status_code == 400
+    respone = client.get(api_url + 'products/export', HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+    assert respone.status_code == 200
+    assert not respone.has_header('Content-Encoding')
+    assert client.get(api_url + 'products/export').status_code == 429
 
 
 @pytest.mark.django_db
@@ -309,3 +599,111 @@ def test_addendum_product_basket(client, order_item_factory, create_token_factor
     assert respone.status_code == 201
     new_order_items = OrderItem.objects.filter(order=order).count()
     assert new_order_items == len(order_items) + 1
+
+
+@pytest.mark.django_db
+def test_basket_order_totals(client, create_token_factory, user_factory, order_factory, product_info_factory):
+    """
+    Проверка суммы и количества позиций корзины, которые хранятся в заказе
+    и пересчитываются при изменении позиций и цен
+    """
+    user = user_factory()
+    order = order_factory(user=user, state='basket')
+    first, second = product_info_factory(price=100, is_active=True), product_info_factory(price=30, is_active=True)
+
+    token = create_token_factory(user=user)
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    client.post(api_url + 'basket/', data={'product_info': first.id, 'quantity': 2})
+    client.post(api_url + 'basket/', data={'product_info': second.id, 'quantity': 1})
+    data = client.get(api_url + 'basket/').json()
+    assert (data[0]['total_sum'], data[0]['items_count']) == (230, 2)
+
+    client.put(api_url + 'basket/', data={'product_info': second.id, 'quantity': 3})
+    order.refresh_from_db()
+    assert (order.total_sum, order.items_count) == (290, 2)
+
+    first.price = 150
+    first.save()
+    order.refresh_from_db()
+    assert order.total_sum == 390
+
+    respone = client.delete(api_url + 'basket/', data={'product_info': first.id})
+    assert respone.status_code == 204
+    order.refresh_from_db()
+    assert (order.total_sum, order.items_count) == (90, 1)
+
+
+@pytest.mark.django_db
+def test_bulk_update_basket(client, create_token_factory, user_factory, order_factory, product_info_factory,
+                            django_assert_max_num_queries):
+    """
+    Проверка изменения нескольких позиций корзины одним запросом
+    """
+    user = user_factory()
+    order = order_factory(user=user, state='basket')
+    product_infos = product_info_factory(_quantity=4, price=10, is_active=True)
+    baker.make(OrderItem, order=order, product_info=product_infos[0], quantity=1)
+    baker.make(OrderItem, order=order, product_info=product_infos[1], quantity=1)
+
+    token = create_token_factory(user=user)
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    items = [{'product_info': product_infos[0].id, 'quantity': 5},
+             {'product_info': product_infos[1].id, 'quantity': 0},
+             {'product_info': product_infos[2].id, 'quantity': 2},
+             {'product_info': product_infos[3].id, 'quantity': 3}]
+    with django_assert_max_num_queries(15):
+        respone = client.post(api_url + 'basket/bulk', data={'items': items})
+    data = respone.json()
+
+    assert respone.status_code == 200
+    assert data['id'] == order.id
+    assert {item['product_info']['id']: item['quantity'] for item in data['ordered_items']} == {
+        product_infos[0].id: 5, product_infos[2].id: 2, product_infos[3].id: 3}
+    assert (data['total_sum'], data['items_count']) == (100, 3)
+
+
+@pytest.mark.django_db
+def test_bulk_update_basket_inactive_product(client, create_token_factory, user_factory, order_factory,
+                                             product_info_factory):
+    """
+    Если в списке есть снятый с продажи товар, корзина не изменяется
+    """
+    user = user_factory()
+    order = order_factory(user=user, state='basket')
+    active, inactive = product_info_factory(is_active=True), product_info_factory(is_active=False)
+
+    token = create_token_factory(user=user)
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    respone = client.post(api_url + 'basket/bulk', data={'items': [{'product_info': active.id, 'quantity': 1},
+                                                                    {'product_info': inactive.id, 'quantity': 1}]})
+
+    assert respone.status_code == 400
+    assert not OrderItem.objects.filter(order=order).exists()
+
+
+@pytest.mark.django_db
+def test_get_basket_for_update_single_basket(user_factory, monkeypatch):
+    """
+    У пользователя одна корзина: если ее создал параллельный запрос, возвращается она
+    """
+    user = user_factory()
+    get = QuerySet.get
+    competing = []
+
+    def get_after_competing_create(queryset, *args, **kwargs):
+        if queryset.model is Order and not competing:
+            competing.append(Order.objects.create(user=user, state='basket'))
+            raise Order.DoesNotExist
+        return get(queryset, *args, **kwargs)
+
+    monkeypatch.setattr(QuerySet, 'get', get_after_competing_create)
+    with transaction.atomic():
+        order = get_basket_for_update(user.id)
+
+    assert order == competing[0]
+    assert Order.objects.filter(user=user, state='basket').count() == 1
+    with pytest.raises(IntegrityError), transaction.atomic():
+        Order.objects.create(user=user, state='basket')
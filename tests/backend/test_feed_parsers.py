@@ -0,0 +1,113 @@
+from io import BytesIO, StringIO
+from pathlib import Path
+
+import pytest
+from yaml import load as load_yaml, Loader
+
+from backend.services.feed_parsers import SHOP, CATEGORY, GOOD, FeedFormatError, PARSERS, iter_yaml_records, \
+    iter_document_records, detect_format
+from backend.services.price_list_import import clean_good
+from benchmarks.feeds import WRITERS
+
+DATA_DIR = Path(__file__).resolve().parents[2] / 'data'
+
+
+class CountingStream(BytesIO):
+    """
+    Поток, запоминающий количество прочитанных байт
+    """
+
+    def __init__(self, content):
+        super().__init__(content)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def make_yaml_feed(goods_count):
+    lines = ['shop: Магазин', 'categories:', '  - id: 224', '    name: Смартфоны', 'goods:']
+    for number in range(goods_count):
+        lines += [f'  - id: {number}', '    category: 224', f'    model: model/{number}', f'    name: Товар {number}',
+                  '    price: 100', '    price_rrc: 110', '    quantity: 5', '    parameters:',
+                  '      "Цвет": черный', '      "Диагональ (дюйм)": 6.5']
+    return '\n'.join(lines).encode()
+
+
+@pytest.mark.parametrize('file_name', ['shop1.yaml', 'shop2.yaml'])
+def test_yaml_records_match_full_load(file_name):
+    """
+    Потоковый разбор возвращает те же данные, что и полная загрузка YAML
+    """
+    content = (DATA_DIR / file_name).read_bytes()
+
+    records = list(iter_yaml_records(BytesIO(content)))
+
+    assert records == list(iter_document_records(load_yaml(content, Loader=Loader)))
+    assert records[0][0] == SHOP
+    assert {kind for kind, _ in records} == {SHOP, CATEGORY, GOOD}
+
+
+def test_yaml_records_are_streamed():
+    """
+    Первый товар возвращается до того, как прочитан весь файл
+    """
+    stream = CountingStream(make_yaml_feed(5000))
+
+    records = iter_yaml_records(stream)
+    kind, item = next((kind, item) for kind, item in records if kind == GOOD)
+
+    assert item['id'] == 0
+    assert item['parameters'] == {'Цвет': 'черный', 'Диагональ (дюйм)': 6.5}
+    assert stream.bytes_read < len(stream.getvalue()) / 10
+    assert sum(1 for kind, _ in records if kind == GOOD) == 4999
+
+
+def test_yaml_records_reject_non_mapping():
+    """
+    Прайс, который не является словарем, не разбирается
+    """
+    with pytest.raises(FeedFormatError):
+        list(iter_yaml_records(BytesIO(b'- 1\n- 2\n')))
+
+
+@pytest.mark.parametrize('feed_format', list(PARSERS))
+def test_formats_produce_same_records(feed_format):
+    """
+    Все форматы прайса дают одинаковый нормализованный поток записей
+    """
+    data = load_yaml((DATA_DIR / 'shop1.yaml').read_bytes(), Loader=Loader)
+    file = StringIO()
+    WRITERS[feed_format](file, data['shop'], iter(data['goods']))
+
+    records = list(PARSERS[feed_format](BytesIO(file.getvalue().encode())))
+
+    assert records[0] == (SHOP, data['shop'])
+    assert {i['category'] for i in data['goods']} <= {int(i['id']) for kind, i in records if kind == CATEGORY}
+    assert [clean_good(i) for kind, i in records if kind == GOOD] == [clean_good(i) for i in data['goods']]
+
+
+@pytest.mark.parametrize('content_type, file_name, feed_format', [
+    ('application/x-yaml', 'https://example.com/shop.json', 'yaml'),
+    ('application/json; charset=utf-8', '', 'json'),
+    ('application/x-ndjson', '', 'ndjson'),
+    ('text/csv', '', 'csv'),
+    ('application/octet-stream', 'https://example.com/price.CSV?token=1', 'csv'),
+    ('text/plain', 'price.jsonl', 'ndjson'),
+    ('', 'https://example.com/price', 'yaml'),
+])
+def test_detect_format(content_type, file_name, feed_format):
+    """
+    Формат определяется по Content-Type, затем по расширению
+    """
+    assert detect_format(content_type, file_name) == feed_format
+
+
+def test_csv_requires_good_columns():
+    """
+    CSV без обязательных колонок не разбирается
+    """
+    with pytest.raises(FeedFormatError):
+        list(PARSERS['csv'](BytesIO('shop,id,name\nМагазин,1,Товар\n'.encode())))
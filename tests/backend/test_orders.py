@@ -0,0 +1,304 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from model_bakery import baker
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from backend.models import User, Shop, Contact, ProductInfo, ProductParameter, Order, OrderItem, ConfirmOrderToken, \
+    CatalogItem, OrderShop
+from backend.serializers import OrderSerializer, OrderFastSerializer
+from backend.services import email_templates
+from backend.services.catalog import rebuild_shop_catalog
+from backend.services.toolbox_queryset import get_queryset_orders
+
+api_url = '/api/v1/'
+
+
+def make_orders(count):
+    """
+    Покупатель с корзиной и count заказами из товаров двух магазинов
+    """
+    user = baker.make(User)
+    contact = baker.make(Contact, user=user, _fill_optional=True)
+    shops = baker.make(Shop, user__type='shop', state=True, _quantity=2)
+    product_infos = [product_info for shop in shops for product_info in baker.make(ProductInfo, shop=shop, _quantity=2)]
+    for product_info in product_infos:
+        baker.make(ProductParameter, product_info=product_info, _quantity=2)
+    # корзина у пользователя одна, поэтому создается последней
+    for state in ['new'] * count + ['basket']:
+        order = baker.make(Order, user=user, contact=contact)
+        for product_info in product_infos:
+            baker.make(OrderItem, order=order, product_info=product_info, quantity=1)
+        # статус меняется через update, чтобы не отправлять письма
+        Order.objects.filter(id=order.id).update(state=state)
+    return user, shops
+
+
+def make_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + baker.make(Token, user=user).key)
+    return client
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('count', [1, 20])
+@pytest.mark.parametrize('scope', ['user', 'basket', 'shop', 'order'])
+def test_orders_query_count(django_assert_num_queries, scope, count):
+    """
+    Заказы любого набора загружаются и сериализуются тремя запросами
+    """
+    user, shops = make_orders(count)
+    scopes = {
+        'user': {'user_id': user.id, 'exclude_state': 'basket'},
+        'basket': {'user_id': user.id, 'state': 'basket'},
+        'shop': {'shop_user_id': shops[0].user_id, 'exclude_state': 'basket'},
+        'order': {'order_id': Order.objects.filter(user=user, state='new').first().id},
+    }
+
+    for serializer_class in (OrderFastSerializer, OrderSerializer):
+        with django_assert_num_queries(3):
+            JSONRenderer().render(serializer_class(get_queryset_orders(**scopes[scope]), many=True).data)
+
+
+@pytest.mark.django_db
+def test_orders_of_shop():
+    """
+    Поставщик видит только заказы со своими товарами и только свои позиции в них
+    """
+    user, shops = make_orders(2)
+    other_shop = baker.make(Shop, user__type='shop', state=True)
+    other_order = baker.make(Order)
+    baker.make(OrderItem, order=other_order, product_info=baker.make(ProductInfo, shop=other_shop), quantity=1)
+    Order.objects.filter(id=other_order.id).update(state='new')
+
+    orders = list(get_queryset_orders(shop_user_id=shops[0].user_id, exclude_state='basket'))
+
+    assert len(orders) == 2
+    assert {order_item.product_info.shop_id for order in orders for order_item in order.ordered_items.all()} == {
+        shops[0].id}
+    assert [order.id for order in get_queryset_orders(shop_user_id=other_shop.user_id)] == [other_order.id]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url', ['order', 'partner/orders'])
+def test_order_history_pagination(url):
+    """
+    История заказов покупателя и поставщика выдается постранично от новых к старым
+    с фильтрами по статусу и дате
+    """
+    user, shops = make_orders(5)
+    started = datetime(2022, 9, 1, tzinfo=timezone.utc)
+    orders = list(Order.objects.filter(user=user).exclude(state='basket').order_by('id'))
+    for day, order in enumerate(orders):
+        Order.objects.filter(id=order.id).update(dt=started + timedelta(days=day),
+                                                 state='canceled' if day % 2 else 'new')
+        OrderShop.objects.filter(order=order).update(dt=started + timedelta(days=day))
+    client = make_client(user if url == 'order' else shops[0].user)
+
+    respone = client.get(api_url + url, {'page_size': 2})
+    data = respone.json()
+    ids = [order['id'] for order in data['results']]
+    while data['next']:
+        data = client.get(data['next']).json()
+        ids.extend(order['id'] for order in data['results'])
+
+    assert respone.status_code == 200
+    assert ids == [order.id for order in reversed(orders)]
+
+    data = client.get(api_url + url, {'state': 'new', 'dt_after': '2022-09-02T00:00:00Z',
+                                      'dt_before': '2022-09-05T00:00:00Z'}).json()
+    assert [order['id'] for order in data['results']] == [orders[4].id, orders[2].id]
+
+
+@pytest.fixture
+def checkout(monkeypatch):
+    """
+    Корзина покупателя с контактом из двух товаров одного магазина (остатки 5 и 3)
+    """
+    monkeypatch.setattr(email_templates.celery_send_email, 'delay', lambda *args: None)
+    user = baker.make(User)
+    contact = baker.make(Contact, user=user, _fill_optional=True)
+    shop = baker.make(Shop, user__type='shop', state=True)
+    product_infos = [baker.make(ProductInfo, shop=shop, quantity=quantity, is_active=True) for quantity in (5, 3)]
+    rebuild_shop_catalog(shop.id)
+    order = baker.make(Order, user=user, contact=contact, state='basket')
+    for product_info in product_infos:
+        baker.make(OrderItem, order=order, product_info=product_info, quantity=2)
+    return SimpleNamespace(order=order, product_infos=product_infos, client=make_client(user))
+
+
+def stock(product_infos):
+    """
+    Свободный остаток товаров в ProductInfo и в каталоге
+    """
+    ids = [product_info.id for product_info in product_infos]
+    return ([quantity - reserved for quantity, reserved in ProductInfo.objects.filter(id__in=ids).order_by(
+        'id').values_list('quantity', 'reserved_quantity')],
+            list(CatalogItem.objects.filter(pk__in=ids).order_by('pk').values_list('quantity', flat=True)))
+
+
+@pytest.mark.django_db
+def test_checkout_reserves_stock(checkout):
+    """
+    Оформление заказа списывает остатки один раз, отмена возвращает их
+    """
+    catalog = APIClient().get(api_url + 'products/', {'ordering': 'id'})
+    assert [item['quantity'] for item in catalog.json()['results']] == [5, 3]
+    shops = APIClient().get(api_url + 'shops')
+
+    respone = checkout.client.put(api_url + 'order', data={'state': 'new'})
+
+    assert respone.status_code == 200
+    assert APIClient().get(api_url + 'shops', HTTP_IF_NONE_MATCH=shops['ETag']).status_code == 304
+    assert stock(checkout.product_infos) == ([3, 1], [3, 1])
+    assert list(ProductInfo.objects.order_by('id').values_list('quantity', flat=True)) == [5, 3]
+    assert APIClient().get(api_url + 'products/', {'ordering': 'id'},
+                           HTTP_IF_NONE_MATCH=catalog['ETag']).status_code == 200
+    assert [item['quantity'] for item in APIClient().get(api_url + 'products/', {'ordering': 'id'}).json()[
+        'results']] == [3, 1]
+
+    token = ConfirmOrderToken.objects.get(order=checkout.order)
+    assert checkout.client.get(api_url + 'confirm/order', {'key': token.key}).json() == {'state': True}
+    checkout.order.refresh_from_db()
+    assert (checkout.order.state, checkout.order.stock_reserved) == ('confirmed', True)
+    assert stock(checkout.product_infos) == ([3, 1], [3, 1])
+
+    checkout.order.state = 'canceled'
+    checkout.order.save()
+    assert stock(checkout.product_infos) == ([5, 3], [5, 3])
+    assert not Order.objects.get(id=checkout.order.id).stock_reserved
+
+    checkout.order.save()
+    assert stock(checkout.product_infos) == ([5, 3], [5, 3])
+
+
+@pytest.mark.django_db
+def test_shipped_order_releases_stock(checkout):
+    """
+    Отправленный заказ снимает резерв, дальнейшая смена статуса его не возвращает
+    """
+    assert checkout.client.put(api_url + 'order', data={'state': 'new'}).status_code == 200
+    order = Order.objects.get(id=checkout.order.id)
+
+    order.state = 'sent'
+    order.save()
+    assert stock(checkout.product_infos) == ([5, 3], [5, 3])
+    assert not Order.objects.get(id=order.id).stock_reserved
+
+    order.state = 'delivered'
+    order.save()
+    assert stock(checkout.product_infos) == ([5, 3], [5, 3])
+
+
+@pytest.mark.django_db
+def test_placed_order_without_reservation(checkout):
+    """
+    Заказ, оформленный до появления резерва, не резервирует товар при смене статуса
+    """
+    Order.objects.filter(id=checkout.order.id).update(state='sent')
+    OrderItem.objects.filter(order=checkout.order).update(quantity=10)
+    order = Order.objects.get(id=checkout.order.id)
+
+    for state in ('delivered', 'confirmed'):
+        order.state = state
+        order.save()
+
+    assert stock(checkout.product_infos) == ([5, 3], [5, 3])
+    assert not Order.objects.get(id=order.id).stock_reserved
+
+
+@pytest.mark.django_db
+def test_checkout_out_of_stock(checkout):
+    """
+    Если товара не хватает, заказ остается в корзине, а остатки не меняются
+    """
+    OrderItem.objects.filter(product_info=checkout.product_infos[1]).update(quantity=4)
+
+    respone = checkout.client.put(api_url + 'order', data={'state': 'new'})
+
+    assert respone.status_code == 400
+    assert respone.json()['product_info'] == [checkout.product_infos[1].id]
+    assert Order.objects.get(id=checkout.order.id).state == 'basket'
+    assert stock(checkout.product_infos) == ([5, 3], [5, 3])
+
+
+@pytest.mark.django_db
+def test_checkout_keeps_fresh_totals(checkout):
+    """
+    Смена статуса не затирает сумму заказа, пересчитанную после его загрузки
+    """
+    order = Order.objects.get(id=checkout.order.id)
+    OrderItem.objects.filter(product_info=checkout.product_infos[0]).update(quantity=1)
+    Order.objects.filter(id=order.id).update(total_sum=12345)
+
+    serializer = OrderSerializer(order, data={'state': 'new'}, partial=True)
+    assert serializer.is_valid()
+    serializer.save()
+
+    assert Order.objects.filter(id=order.id).values_list('state', 'total_sum').get() == ('new', 12345)
+
+    token = ConfirmOrderToken.objects.get(order=order)
+    Order.objects.filter(id=order.id).update(total_sum=54321)
+    assert checkout.client.get(api_url + 'confirm/order', {'key': token.key}).json() == {'state': True}
+    assert Order.objects.filter(id=order.id).values_list('state', 'total_sum').get() == ('confirmed', 54321)
+
+
+@pytest.mark.django_db
+def test_checkout_retired_offer(checkout):
+    """
+    Товар, снятый с продажи после добавления в корзину, не оформляется
+    """
+    ProductInfo.objects.filter(id=checkout.product_infos[0].id).update(is_active=False)
+
+    respone = checkout.client.put(api_url + 'order', data={'state': 'new'})
+
+    assert respone.status_code == 400
+    assert respone.json()['product_info'] == [checkout.product_infos[0].id]
+    assert Order.objects.get(id=checkout.order.id).state == 'basket'
+    assert not ProductInfo.objects.filter(reserved_quantity__gt=0).exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url', ['order', 'partner/orders'])
+def test_order_history_pagination_same_dt(url):
+    """
+    Заказы с одинаковой датой не пропускаются и не повторяются на соседних страницах,
+    ссылка на предыдущую страницу возвращает ту же страницу
+    """
+    user, shops = make_orders(5)
+    dt = datetime(2022, 9, 1, tzinfo=timezone.utc)
+    Order.objects.filter(user=user).update(dt=dt)
+    OrderShop.objects.update(dt=dt)
+    client = make_client(user if url == 'order' else shops[0].user)
+
+    pages = [client.get(api_url + url, {'page_size': 2}).json()]
+    while pages[-1]['next']:
+        pages.append(client.get(pages[-1]['next']).json())
+
+    ids = [order['id'] for page in pages for order in page['results']]
+    assert ids == list(Order.objects.filter(user=user).exclude(state='basket').order_by('-id').values_list(
+        'id', flat=True))
+    assert client.get(pages[2]['previous']).json()['results'] == pages[1]['results']
+    assert client.get(api_url + url, {'cursor': 'cD1ub25zZW5zZQ=='}).status_code == 404
+
+
+@pytest.mark.django_db
+def test_order_shops_follow_order_items():
+    """
+    Заказ виден поставщику, пока в нем есть товары его магазина
+    """
+    user, shops = make_orders(1)
+    order = Order.objects.get(user=user, state='new')
+    assert set(OrderShop.objects.filter(order=order).values_list('shop_id', flat=True)) == {shop.id for shop in shops}
+
+    OrderItem.objects.get(order=order, product_info__shop=shops[1], product_info=ProductInfo.objects.filter(
+        shop=shops[1]).first()).delete()
+    assert list(get_queryset_orders(shop_user_id=shops[1].user_id, exclude_state='basket')) == [order]
+    for order_item in OrderItem.objects.filter(order=order, product_info__shop=shops[1]):
+        order_item.delete()
+
+    assert list(OrderShop.objects.filter(order=order).values_list('shop_id', flat=True)) == [shops[0].id]
+    assert not get_queryset_orders(shop_user_id=shops[1].user_id, exclude_state='basket').exists()
@@ -0,0 +1,701 @@
+import gzip
+import hashlib
+import os
+from io import BytesIO, StringIO
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+from rest_framework.authtoken.models import Token
+from rest_framework.parsers import JSONParser
+from rest_framework.test import APIClient
+from yaml import load as load_yaml, Loader
+
+from backend.models import User, Shop, Category, Product, ProductInfo, Parameter, ProductParameter, Order, OrderItem, \
+    CatalogItem
+from backend.services import partner_update, email_templates, feed_fetch
+from backend.services.feed_parsers import iter_yaml_records, iter_document_records, FeedFormatError
+from backend.services.catalog import rebuild_shop_catalog
+from backend.services.feed_scheduler import refresh_shop_feeds
+from backend.services.import_cache import LOOKUPS_VERSION_KEY, get_shared_lookups, clear_shared_lookups
+from backend.services.price_list_import import import_price_list, PriceListImporter, load_price_list_from_url
+from backend.services.response_cache import get_catalog_version, PRODUCTS
+from backend.tasks import celery_update_price_list, celery_refresh_shop_feed, celery_refresh_shop_feeds
+from benchmarks.feeds import write_csv, write_json, write_ndjson
+
+DATA_DIR = Path(__file__).resolve().parents[2] / 'data'
+api_url = '/api/v1/'
+
+
+def make_goods(count, category_id=224):
+    return [{'id': number,
+             'category': category_id,
+             'model': f'model/{number}',
+             'name': f'Товар {number}',
+             'price': 100 + number,
+             'price_rrc': 200 + number,
+             'quantity': number,
+             'parameters': {'Цвет': 'черный', 'Размер': number}} for number in range(1, count + 1)]
+
+
+@pytest.fixture
+def shop_user():
+    return baker.make(User, type='shop')
+
+
+@pytest.fixture
+def shop_client(shop_user):
+    client = APIClient()
+    token = baker.make(Token, user=shop_user)
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+    return client
+
+
+@pytest.fixture
+def shop1_data():
+    with open(DATA_DIR / 'shop1.yaml', 'rb') as file:
+        return load_yaml(file, Loader=Loader)
+
+
+@pytest.mark.django_db
+def test_import_price_list(shop_user, shop1_data):
+    """
+    Проверка загрузки прайса из data/shop1.yaml
+    """
+    result = import_price_list(shop1_data, shop_user.id)
+
+    shop = Shop.objects.get(user=shop_user)
+    goods = shop1_data['goods']
+    assert result['Status'] is True
+    assert result['processed'] == len(goods)
+    assert result['errors_count'] == 0
+    assert shop.name == shop1_data['shop']
+    assert set(shop.categories.values_list('id', flat=True)) == {i['id'] for i in shop1_data['categories']}
+    assert ProductInfo.objects.filter(shop=shop).count() == len(goods)
+    assert ProductParameter.objects.filter(product_info__shop=shop).count() == sum(
+        len(i['parameters']) for i in goods)
+
+    product_info = ProductInfo.objects.get(shop=shop, external_id=goods[0]['id'])
+    assert product_info.product.name == goods[0]['name']
+    assert product_info.price == goods[0]['price']
+    assert {i.parameter.name: i.value for i in product_info.product_parameters.all()} == {
+        name: str(value) for name, value in goods[0]['parameters'].items()}
+
+
+@pytest.mark.django_db
+def test_reimport_price_list_reuses_lookups(shop_user, shop1_data):
+    """
+    Повторная загрузка не дублирует категории, продукты и имена параметров
+    """
+    import_price_list(shop1_data, shop_user.id)
+    counts = Category.objects.count(), Product.objects.count(), Parameter.objects.count()
+
+    import_price_list(shop1_data, shop_user.id)
+
+    assert (Category.objects.count(), Product.objects.count(), Parameter.objects.count()) == counts
+    assert ProductInfo.objects.count() == len(shop1_data['goods'])
+
+
+@pytest.mark.django_db
+def test_reimport_updates_only_changes(shop_user):
+    """
+    Повторная загрузка сверяет товары по external_id: изменяет отличающиеся,
+    добавляет новые и снимает с продажи отсутствующие, не трогая заказы
+    """
+    categories = [{'id': 224, 'name': 'Смартфоны'}]
+    goods = make_goods(4)
+    import_price_list({'shop': 'Магазин', 'categories': categories, 'goods': goods}, shop_user.id)
+    ids = dict(ProductInfo.objects.values_list('external_id', 'id'))
+    order_item = baker.make(OrderItem, order=baker.make(Order), product_info_id=ids[4], quantity=1)
+
+    goods[0]['price'] = 1
+    goods[1]['parameters']['Цвет'] = 'белый'
+    del goods[1]['parameters']['Размер']
+    goods[3:] = make_goods(5)[4:]
+    result = import_price_list({'shop': 'Магазин', 'categories': categories, 'goods': goods}, shop_user.id)
+
+    assert (result['created'], result['updated'], result['retired']) == (1, 1, 1)
+    assert dict(ProductInfo.objects.filter(external_id__lte=3).values_list('external_id', 'id')) == {
+        1: ids[1], 2: ids[2], 3: ids[3]}
+    assert ProductInfo.objects.get(external_id=1).price == 1
+    assert dict(ProductParameter.objects.filter(product_info_id=ids[2]).values_list(
+        'parameter__name', 'value')) == {'Цвет': 'белый'}
+    assert not ProductInfo.objects.get(id=ids[4]).is_active
+    assert ProductInfo.objects.get(external_id=5).is_active
+    assert OrderItem.objects.filter(id=order_item.id).exists()
+
+    goods.append(make_goods(4)[3])
+    result = import_price_list({'shop': 'Магазин', 'categories': categories, 'goods': goods}, shop_user.id)
+
+    assert (result['created'], result['updated'], result['retired']) == (0, 1, 0)
+    assert ProductInfo.objects.get(id=ids[4]).is_active
+
+
+@pytest.mark.django_db
+def test_reimport_keeps_stock_reservations(shop_user, monkeypatch):
+    """
+    Загрузка прайса обновляет остаток поставщика, не затрагивая резерв оформленных заказов
+    """
+    monkeypatch.setattr(email_templates.celery_send_email, 'delay', lambda *args: None)
+    categories = [{'id': 224, 'name': 'Смартфоны'}]
+    goods = make_goods(3)
+    import_price_list({'shop': 'Магазин', 'categories': categories, 'goods': goods}, shop_user.id)
+    product_info = ProductInfo.objects.get(external_id=3)
+    order = baker.make(Order)
+    baker.make(OrderItem, order=order, product_info=product_info, quantity=2)
+    order.state = 'new'
+    order.save()
+
+    goods[2]['quantity'] = 10
+    import_price_list({'shop': 'Магазин', 'categories': categories, 'goods': goods}, shop_user.id)
+
+    product_info.refresh_from_db()
+    assert (product_info.quantity, product_info.reserved_quantity) == (10, 2)
+    assert CatalogItem.objects.get(pk=product_info.id).quantity == 8
+
+    order.state = 'canceled'
+    order.save()
+    product_info.refresh_from_db()
+    assert (product_info.quantity, product_info.reserved_quantity) == (10, 0)
+    assert CatalogItem.objects.get(pk=product_info.id).quantity == 10
+
+
+@pytest.mark.django_db
+def test_reimport_refreshes_order_totals(shop_user):
+    """
+    Изменение цены в прайсе пересчитывает суммы корзин с этой позицией,
+    а суммы оформленных заказов не меняет
+    """
+    categories = [{'id': 224, 'name': 'Смартфоны'}]
+    goods = make_goods(2)
+    import_price_list({'shop': 'Магазин', 'categories': categories, 'goods': goods}, shop_user.id)
+    ids = dict(ProductInfo.objects.values_list('external_id', 'id'))
+    orders = baker.make(Order, state='basket', _quantity=2)
+    for order in orders:
+        baker.make(OrderItem, order=order, product_info_id=ids[1], quantity=2)
+        baker.make(OrderItem, order=order, product_info_id=ids[2], quantity=1)
+    # статус меняется через update, чтобы не отправлять письма
+    Order.objects.filter(id=orders[1].id).update(state='delivered')
+    basket, placed = orders
+
+    goods[0]['price'] = 50
+    import_price_list({'shop': 'Магазин', 'categories': categories, 'goods': goods}, shop_user.id)
+
+    basket.refresh_from_db()
+    placed.refresh_from_db()
+    assert (basket.total_sum, basket.items_count) == (2 * 50 + 102, 2)
+    assert (placed.total_sum, placed.items_count) == (2 * 101 + 102, 2)
+
+
+@pytest.mark.django_db
+def test_not_modified_feed_is_skipped(shop_user, feed_server):
+    """
+    Прайс запрашивается условно: при 304 Not Modified загрузка не выполняется
+    """
+    feed_server.content = (DATA_DIR / 'shop1.yaml').read_bytes()
+
+    first = load_price_list_from_url(feed_server.url(), shop_user.id)
+    shop = Shop.objects.get(user=shop_user)
+    with CaptureQueriesContext(connection) as context:
+        second = load_price_list_from_url(feed_server.url(), shop_user.id)
+
+    assert first['processed'] == 4
+    assert (shop.url, shop.feed_etag, shop.feed_last_modified) == (
+        feed_server.url(), feed_server.etag, feed_server.last_modified)
+    assert second == {'Status': True, 'skipped': True}
+    assert feed_server.requests[1]['If-None-Match'] == feed_server.etag
+    assert feed_server.requests[1]['If-Modified-Since'] == feed_server.last_modified
+    assert 'gzip' in feed_server.requests[0]['Accept-Encoding']
+    assert len(context.captured_queries) == 2
+
+
+@pytest.mark.django_db
+def test_unchanged_feed_content_is_skipped(shop_user, feed_server):
+    """
+    Прайс с тем же содержимым, что и при прошлой загрузке, не разбирается,
+    даже если сервер не поддерживает условные запросы
+    """
+    feed_server.content = (DATA_DIR / 'shop1.yaml').read_bytes()
+
+    load_price_list_from_url(feed_server.url(), shop_user.id)
+    Shop.objects.filter(user=shop_user).update(feed_etag='')
+    ProductInfo.objects.update(price=1)
+    with CaptureQueriesContext(connection) as context:
+        second = load_price_list_from_url(feed_server.url(), shop_user.id)
+
+    assert second == {'Status': True, 'skipped': True}
+    assert not any('backend_productinfo' in query['sql'] for query in context.captured_queries)
+    assert set(ProductInfo.objects.values_list('price', flat=True)) == {1}
+
+
+@pytest.mark.django_db
+def test_changed_feed_is_imported(shop_user, feed_server):
+    """
+    Измененный прайс загружается повторно
+    """
+    feed_server.content = (DATA_DIR / 'shop1.yaml').read_bytes()
+    load_price_list_from_url(feed_server.url(), shop_user.id)
+
+    feed_server.content = feed_server.content.replace(b'price: 110000', b'price: 99000')
+    result = load_price_list_from_url(feed_server.url(), shop_user.id)
+
+    assert (result['created'], result['updated'], result['retired']) == (0, 1, 0)
+    assert ProductInfo.objects.get(external_id=4216292).price == 99000
+    assert Shop.objects.get(user=shop_user).feed_etag == feed_server.etag
+
+
+@pytest.mark.django_db
+def test_feed_size_limit(shop_user, feed_server, settings, monkeypatch):
+    """
+    Скачивание прайса больше PRICE_LIST_MAX_FEED_SIZE прерывается, файл не сохраняется целиком
+    """
+    written = []
+
+    class SpooledFile(BytesIO):
+        def __init__(self, **kwargs):
+            super().__init__()
+
+        def write(self, data):
+            written.append(len(data))
+            return super().write(data)
+
+    settings.PRICE_LIST_MAX_FEED_SIZE = 1024
+    feed_server.content = (DATA_DIR / 'shop1.yaml').read_bytes()
+    monkeypatch.setattr(feed_fetch, 'FEED_CHUNK_SIZE', 256)
+    monkeypatch.setattr(feed_fetch, 'SpooledTemporaryFile', SpooledFile)
+
+    with pytest.raises(FeedFormatError):
+        load_price_list_from_url(feed_server.url(), shop_user.id)
+    assert sum(written) <= 1024
+    assert not Shop.objects.filter(user=shop_user).exists()
+
+
+@pytest.mark.django_db
+def test_csv_feed_is_imported(shop_user, feed_server, shop1_data):
+    """
+    Формат прайса определяется по Content-Type ответа
+    """
+    file = StringIO()
+    write_csv(file, shop1_data['shop'], iter(shop1_data['goods']))
+    feed_server.content = file.getvalue().encode()
+    feed_server.content_type = 'text/csv; charset=utf-8'
+
+    result = load_price_list_from_url(feed_server.url('/price'), shop_user.id)
+
+    assert result['processed'] == len(shop1_data['goods'])
+    assert result['errors_count'] == 0
+    product_info = ProductInfo.objects.get(external_id=shop1_data['goods'][0]['id'])
+    assert product_info.price == shop1_data['goods'][0]['price']
+    assert product_info.product_parameters.count() == len(shop1_data['goods'][0]['parameters'])
+
+
+@pytest.mark.django_db
+def test_import_query_count_does_not_depend_on_goods(shop_user):
+    """
+    Число запросов на пачку товаров не зависит от её размера
+    """
+    categories = [{'id': 224, 'name': 'Смартфоны'}]
+    import_price_list({'shop': 'Магазин', 'categories': categories, 'goods': make_goods(1)}, shop_user.id)
+    query_counts = []
+    for count in (5, 50):
+        data = {'shop': 'Магазин', 'categories': categories, 'goods': make_goods(count)}
+        Product.objects.all().delete()
+        with CaptureQueriesContext(connection) as context:
+            import_price_list(data, shop_user.id)
+        query_counts.append(len(context.captured_queries))
+
+    assert query_counts[0] == query_counts[1]
+    assert ProductInfo.objects.count() == 50
+
+
+@pytest.mark.django_db
+def test_import_resolves_lookups_once(shop_user):
+    """
+    Имена параметров и продукты ищутся в базе один раз на прайс, а не на каждую пачку
+    """
+    categories = [{'id': 224, 'name': 'Смартфоны'}]
+    import_price_list({'shop': 'Магазин', 'categories': categories, 'goods': make_goods(10)}, shop_user.id)
+    importer = PriceListImporter(shop_user.id, chunk_size=2)
+
+    with CaptureQueriesContext(connection) as context:
+        importer.import_records(iter_document_records(
+            {'shop': 'Магазин', 'categories': categories, 'goods': make_goods(10)}))
+
+    tables = [query['sql'] for query in context.captured_queries if 'FROM "backend_parameter"' in query['sql']
+              or 'FROM "backend_product"' in query['sql'] or 'FROM "backend_category"' in query['sql']]
+    assert len(tables) == 3
+    assert (importer.created, importer.updated) == (0, 0)
+
+
+@pytest.mark.django_db
+def test_import_uses_shared_lookup_cache(settings, django_capture_on_commit_callbacks):
+    """
+    Общий кэш процесса избавляет загрузку другого магазина от поиска тех же продуктов
+    """
+    settings.PRICE_LIST_LOOKUP_CACHE_SIZE = 100
+    data = {'shop': 'Магазин', 'categories': [{'id': 224, 'name': 'Смартфоны'}], 'goods': make_goods(5)}
+    try:
+        with django_capture_on_commit_callbacks(execute=True):
+            import_price_list(data, baker.make(User, type='shop').id)
+
+        with CaptureQueriesContext(connection) as context:
+            import_price_list({**data, 'shop': 'Другой магазин'}, baker.make(User, type='shop').id)
+
+        assert len([query for query in context.captured_queries
+                    if 'FROM "backend_product"' in query['sql']]) == 1
+        assert Product.objects.count() == 5
+        assert ProductInfo.objects.count() == 10
+
+        Product.objects.filter(id=Product.objects.first().id).delete()
+        assert not get_shared_lookups()['products']
+    finally:
+        clear_shared_lookups()
+
+
+@pytest.mark.django_db
+def test_shared_lookup_cache_reset_by_other_process(settings):
+    """
+    Удаление справочника в другом процессе (новая версия в общем кэше) сбрасывает кэш этого процесса
+    """
+    settings.PRICE_LIST_LOOKUP_CACHE_SIZE = 100
+    get_shared_lookups()['products'].set_many({('Товар', 224): 1})
+
+    cache.incr(LOOKUPS_VERSION_KEY)
+
+    assert not get_shared_lookups()['products'].get_many([('Товар', 224)])
+
+
+@pytest.mark.django_db
+def test_import_rebuilds_catalog(shop_user, shop_client):
+    """
+    Загрузка прайса и изменение статуса магазина перестраивают плоский каталог
+    """
+    categories = [{'id': 224, 'name': 'Смартфоны'}]
+    goods = make_goods(3)
+    import_price_list({'shop': 'Магазин', 'categories': categories, 'goods': goods}, shop_user.id)
+    other_user = baker.make(User, type='shop')
+    import_price_list({'shop': 'Другой магазин', 'categories': categories, 'goods': make_goods(1)}, other_user.id)
+
+    item = CatalogItem.objects.get(shop__user=shop_user, external_id=1)
+    assert (item.product_name, item.category_name, item.price) == (goods[0]['name'], 'Смартфоны', goods[0]['price'])
+    assert item.parameters == [{'parameter': 'Цвет', 'value': 'черный'}, {'parameter': 'Размер', 'value': '1'}]
+
+    goods[0]['price'] = 1
+    del goods[2]
+    import_price_list({'shop': 'Магазин', 'categories': [{'id': 224, 'name': 'Телефоны'}], 'goods': goods},
+                      shop_user.id)
+    assert dict(CatalogItem.objects.filter(shop__user=shop_user).values_list('external_id', 'price')) == {
+        1: 1, 2: goods[1]['price']}
+    assert set(CatalogItem.objects.values_list('category_name', flat=True)) == {'Телефоны'}
+
+    shop_client.put(api_url + 'partner/state', {'state': False})
+    assert not CatalogItem.objects.filter(shop__user=shop_user).exists()
+    shop_client.put(api_url + 'partner/state', {'state': True})
+    assert CatalogItem.objects.filter(shop__user=shop_user).count() == 2
+
+
+@pytest.mark.django_db
+def test_rebuild_catalog_writes_only_changes(shop_user):
+    """
+    Перестроение каталога обновляет только изменившиеся позиции и удаляет снятые с продажи
+    """
+    import_price_list({'shop': 'Магазин', 'categories': [{'id': 224, 'name': 'Смартфоны'}], 'goods': make_goods(3)},
+                      shop_user.id)
+    shop = Shop.objects.get(user=shop_user)
+    version = get_catalog_version(PRODUCTS)
+
+    with CaptureQueriesContext(connection) as queries:
+        assert rebuild_shop_catalog(shop.id) == 3
+    assert not [query for query in queries if query['sql'].startswith(('INSERT INTO "backend_catalogitem"',
+                                                                       'UPDATE "backend_catalogitem"'))]
+    assert get_catalog_version(PRODUCTS) == version
+
+    ProductInfo.objects.filter(shop=shop, external_id=1).update(price=7)
+    ProductInfo.objects.filter(shop=shop, external_id=3).update(is_active=False)
+    assert rebuild_shop_catalog(shop.id) == 2
+    assert dict(CatalogItem.objects.filter(shop=shop).values_list('external_id', 'price')) == {1: 7, 2: 102}
+    assert get_catalog_version(PRODUCTS) > version
+
+
+@pytest.mark.django_db
+def test_import_yaml_stream_in_chunks(shop_user, shop1_data):
+    """
+    Потоковая загрузка YAML пачками дает тот же результат, что и загрузка словаря
+    """
+    batches = []
+    importer = PriceListImporter(shop_user.id, chunk_size=3, progress=lambda i: batches.append(i.processed))
+
+    with open(DATA_DIR / 'shop1.yaml', 'rb') as file:
+        importer.import_records(iter_yaml_records(file))
+
+    assert batches == [3, 4]
+    assert sorted(ProductInfo.objects.values_list('external_id', flat=True)) == sorted(
+        i['id'] for i in shop1_data['goods'])
+
+
+@pytest.mark.django_db
+def test_import_skips_invalid_goods(shop_user):
+    """
+    Некорректные товары пропускаются и попадают в список ошибок
+    """
+    goods = make_goods(3)
+    goods[0]['price'] = 'бесплатно'
+    del goods[1]['model']
+    data = {'shop': 'Магазин', 'categories': [{'id': 224, 'name': 'Смартфоны'}], 'goods': goods}
+
+    result = import_price_list(data, shop_user.id)
+
+    assert result['processed'] == 3
+    assert result['errors_count'] == 2
+    assert len(result['errors']) == 2
+    assert list(ProductInfo.objects.values_list('external_id', flat=True)) == [goods[2]['id']]
+
+
+@pytest.mark.django_db
+def test_partner_update_enqueues_task(shop_client, shop_user, monkeypatch):
+    """
+    Проверка PartnerUpdate: загрузка ставится в очередь и возвращается task_id
+    """
+    calls = []
+
+    def apply_async(args, task_id):
+        calls.append((args, task_id))
+
+    monkeypatch.setattr(partner_update.celery_update_price_list, 'apply_async', apply_async)
+
+    respone = shop_client.post(api_url + 'partner/update', data={'url': 'https://example.com/shop1.yaml'})
+    data = respone.json()
+
+    assert respone.status_code == 200
+    assert data['Status'] is True
+    assert calls == [(('https://example.com/shop1.yaml', shop_user.id), data['task_id'])]
+    assert cache.get(partner_update.task_owner_key(data['task_id'])) == shop_user.id
+
+
+@pytest.mark.django_db
+def test_partner_update_rejects_invalid_url(shop_client):
+    """
+    Проверка PartnerUpdate на некорректную ссылку
+    """
+    respone = shop_client.post(api_url + 'partner/update', data={'url': 'not a url'})
+
+    assert respone.json()['Status'] is False
+
+
+@pytest.mark.django_db
+def test_update_price_list_task(shop_user, feed_server):
+    """
+    Проверка задачи celery, загружающей прайс по ссылке
+    """
+    feed_server.content = (DATA_DIR / 'shop1.yaml').read_bytes()
+
+    result = celery_update_price_list.apply(args=(feed_server.url(), shop_user.id)).get()
+
+    assert result['Status'] is True
+    assert result['user_id'] == shop_user.id
+    assert result['processed'] == ProductInfo.objects.filter(shop__user=shop_user).count() == 4
+    assert result['elapsed'] >= 0
+
+
+@pytest.mark.django_db
+def test_partner_update_status(shop_client, shop_user, monkeypatch):
+    """
+    Проверка PartnerUpdateStatus на получение хода загрузки
+    """
+    info = {'user_id': shop_user.id, 'processed': 1000, 'errors_count': 1, 'errors': ['1: ValueError()'],
+            'elapsed': 1.5}
+    cache.set(partner_update.task_owner_key('task-id'), shop_user.id)
+    monkeypatch.setattr(partner_update, 'get_result',
+                        lambda task_id: SimpleNamespace(state='PROGRESS', info=info, failed=lambda: False))
+
+    respone = shop_client.get(api_url + 'partner/update/status', {'task_id': 'task-id'})
+    data = respone.json()
+
+    assert respone.status_code == 200
+    assert data == {'Status': True, 'task_id': 'task-id', 'state': 'PROGRESS', 'processed': 1000,
+                    'errors_count': 1, 'errors': ['1: ValueError()'], 'elapsed': 1.5}
+
+
+@pytest.mark.django_db
+def test_partner_update_status_of_other_shop(shop_client, shop_user, monkeypatch):
+    """
+    Проверка PartnerUpdateStatus: чужие и неизвестные загрузки недоступны (в том числе с ошибкой)
+    """
+    cache.set(partner_update.task_owner_key('other-task'), shop_user.id + 1)
+    monkeypatch.setattr(partner_update, 'get_result', lambda task_id: SimpleNamespace(
+        state='FAILURE', info=ValueError('secret'), failed=lambda: True))
+
+    for task_id in ('other-task', 'unknown-task'):
+        respone = shop_client.get(api_url + 'partner/update/status', {'task_id': task_id})
+        assert respone.json() == {'Status': False, 'Errors': 'Задача не найдена'}
+
+
+@pytest.fixture
+def upload_settings(settings, tmp_path, monkeypatch):
+    settings.PRICE_LIST_UPLOAD_DIR = str(tmp_path)
+    settings.PRICE_LIST_UPLOAD_STORAGE = {'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                                          'OPTIONS': {'location': str(tmp_path)}}
+    task = partner_update.celery_update_price_list_from_file
+    monkeypatch.setattr(task, 'apply_async', lambda args, task_id: task.apply(args=args, task_id=task_id))
+    return settings
+
+
+@pytest.mark.django_db
+def test_partner_update_raw_body_upload(shop_client, shop_user, shop1_data, upload_settings):
+    """
+    Проверка PartnerUpdate: прайс передан телом запроса
+    """
+    file = StringIO()
+    write_csv(file, shop1_data['shop'], iter(shop1_data['goods']))
+
+    respone = shop_client.post(api_url + 'partner/update', data=file.getvalue().encode(), content_type='text/csv')
+
+    assert respone.json()['Status'] is True
+    assert ProductInfo.objects.filter(shop__user=shop_user).count() == len(shop1_data['goods'])
+    assert os.listdir(upload_settings.PRICE_LIST_UPLOAD_DIR) == []
+
+
+@pytest.mark.django_db
+def test_partner_update_multipart_gzip_upload(shop_client, shop_user, shop1_data, upload_settings):
+    """
+    Проверка PartnerUpdate: сжатый gzip прайс передан файлом,
+    ETag и Last-Modified прошлой загрузки по ссылке сбрасываются
+    """
+    baker.make(Shop, user=shop_user, feed_etag='"old"', feed_last_modified='Wed, 21 Oct 2015 07:28:00 GMT')
+    content = gzip.compress((DATA_DIR / 'shop1.yaml').read_bytes())
+    upload = SimpleUploadedFile('shop1.yaml.gz', content, content_type='application/gzip')
+
+    respone = shop_client.post(api_url + 'partner/update', data={'file': upload}, format='multipart')
+
+    assert respone.json()['Status'] is True
+    assert ProductInfo.objects.filter(shop__user=shop_user).count() == len(shop1_data['goods'])
+    assert Shop.objects.filter(user=shop_user).values_list('feed_hash', 'feed_etag', 'feed_last_modified').get() == (
+        hashlib.sha256(content).hexdigest(), '', '')
+
+
+@pytest.mark.django_db
+def test_partner_update_zstd_upload(shop_client, shop_user, shop1_data, upload_settings):
+    """
+    Проверка PartnerUpdate: сжатый zstd NDJSON передан телом запроса
+    """
+    zstandard = pytest.importorskip('zstandard')
+    file = StringIO()
+    write_ndjson(file, shop1_data['shop'], iter(shop1_data['goods']))
+    content = zstandard.ZstdCompressor().compress(file.getvalue().encode())
+
+    respone = shop_client.post(api_url + 'partner/update', data=content, content_type='application/zstd',
+                               HTTP_CONTENT_DISPOSITION='attachment; filename="price.ndjson.zst"')
+
+    assert respone.json()['Status'] is True
+    assert ProductInfo.objects.filter(shop__user=shop_user).count() == len(shop1_data['goods'])
+
+
+@pytest.mark.django_db
+def test_partner_update_json_body_upload(shop_client, shop_user, upload_settings, monkeypatch):
+    """
+    Проверка PartnerUpdate: JSON прайс телом запроса без Content-Disposition не разбирается в память
+    """
+    def parse(*args, **kwargs):
+        raise AssertionError('тело запроса разобрано парсером DRF')
+
+    monkeypatch.setattr(JSONParser, 'parse', parse)
+    file = StringIO()
+    write_json(file, 'Магазин', iter(make_goods(100)))
+
+    respone = shop_client.post(api_url + 'partner/update', data=file.getvalue().encode(),
+                               content_type='application/json')
+
+    assert respone.json()['Status'] is True
+    assert ProductInfo.objects.filter(shop__user=shop_user).count() == 100
+
+
+@pytest.mark.django_db
+def test_partner_update_upload_size_limit(shop_client, shop_user, upload_settings, monkeypatch):
+    """
+    Проверка PartnerUpdate: файл больше PRICE_LIST_MAX_UPLOAD_SIZE не принимается
+    """
+    upload_settings.PRICE_LIST_MAX_UPLOAD_SIZE = 1024
+
+    respone = shop_client.post(api_url + 'partner/update', data=b'x' * 100 * 1024, content_type='text/csv')
+
+    assert respone.json()['Status'] is False
+    assert os.listdir(upload_settings.PRICE_LIST_UPLOAD_DIR) == []
+    assert not ProductInfo.objects.exists()
+
+    def is_price_list_upload(request):
+        raise AssertionError('multipart разобран до проверки размера')
+
+    monkeypatch.setattr(partner_update, 'is_price_list_upload', is_price_list_upload)
+    upload = SimpleUploadedFile('price.csv', b'x' * 100 * 1024, content_type='text/csv')
+    respone = shop_client.post(api_url + 'partner/update', data={'file': upload}, format='multipart')
+
+    assert respone.json()['Status'] is False
+
+
+@pytest.mark.django_db
+def test_partner_update_upload_enqueue_failure(shop_client, shop1_data, upload_settings, monkeypatch):
+    """
+    Проверка PartnerUpdate: если задачу не удалось поставить в очередь, файл удаляется из хранилища
+    """
+    def apply_async(args, task_id):
+        raise ConnectionError('broker unavailable')
+
+    monkeypatch.setattr(partner_update.celery_update_price_list_from_file, 'apply_async', apply_async)
+    file = StringIO()
+    write_csv(file, shop1_data['shop'], iter(shop1_data['goods']))
+
+    with pytest.raises(ConnectionError):
+        shop_client.post(api_url + 'partner/update', data=file.getvalue().encode(), content_type='text/csv')
+
+    assert os.listdir(upload_settings.PRICE_LIST_UPLOAD_DIR) == []
+
+
+@pytest.mark.django_db(transaction=True)
+def test_refresh_shop_feeds(feed_server, shop1_data):
+    """
+    Прайсы всех магазинов со ссылкой обновляются, результат записывается в магазин
+    """
+    feed_server.content = (DATA_DIR / 'shop1.yaml').read_bytes()
+    shops = [baker.make(Shop, user=baker.make(User, type='shop'), url=feed_server.url(f'/{number}.yaml'))
+             for number in range(3)]
+    baker.make(Shop, user=baker.make(User, type='shop'), url=None)
+
+    results = refresh_shop_feeds()
+
+    assert set(results) == {shop.id for shop in shops}
+    assert all(result['processed'] == len(shop1_data['goods']) for result in results.values())
+    for shop in Shop.objects.filter(id__in=results):
+        assert shop.last_import_at is not None
+        assert shop.last_import_duration >= 0
+        assert shop.last_import_rows == len(shop1_data['goods'])
+        assert shop.product_infos.count() == len(shop1_data['goods'])
+
+    call_command('refresh_shop_feeds', stdout=StringIO())
+
+    assert len(feed_server.requests) == 6
+    assert Shop.objects.get(id=shops[0].id).last_import_rows == len(shop1_data['goods'])
+
+
+@pytest.mark.django_db
+def test_refresh_shop_feeds_fan_out(settings, monkeypatch):
+    """
+    Задача celery beat ставит отдельную задачу на каждый магазин со ссылкой
+    с отложенным на случайное время стартом
+    """
+    settings.PRICE_LIST_REFRESH_JITTER = 60
+    calls = []
+    monkeypatch.setattr(celery_refresh_shop_feed, 'apply_async',
+                        lambda args, countdown: calls.append((args, countdown)))
+    shops = [baker.make(Shop, user=baker.make(User, type='shop'), url=f'https://example.com/{number}.yaml')
+             for number in range(3)]
+    baker.make(Shop, user=baker.make(User, type='shop'), url='')
+
+    assert celery_refresh_shop_feeds() == 3
+    assert [args for args, _ in calls] == [(shop.id,) for shop in shops]
+    assert all(0 <= countdown <= 60 for _, countdown in calls)
@@ -0,0 +1,60 @@
+import pytest
+from model_bakery import baker
+from rest_framework.renderers import JSONRenderer
+
+from backend.models import User, Shop, Contact, ProductInfo, ProductParameter, Order, OrderItem, CatalogItem
+from backend.serializers import ProductInfoSerializer, ProductInfoFastSerializer, CatalogItemSerializer, \
+    OrderSerializer, OrderFastSerializer
+from backend.services.catalog import rebuild_shop_catalog
+from backend.services.toolbox_queryset import get_queryset_orders
+
+
+def render(data):
+    return JSONRenderer().render(data)
+
+
+@pytest.fixture
+def orders():
+    user = baker.make(User)
+    shop = baker.make(Shop, state=True)
+    product_infos = baker.make(ProductInfo, shop=shop, _quantity=3)
+    for product_info in product_infos:
+        baker.make(ProductParameter, product_info=product_info, _quantity=2)
+    contact = baker.make(Contact, user=user, _fill_optional=True)
+    # корзина у пользователя одна, поэтому создается последней
+    for state in ('new', 'confirmed', 'canceled', 'basket'):
+        order = baker.make(Order, user=user, contact=None if state == 'basket' else contact)
+        for product_info in product_infos[:2 if state == 'canceled' else 3]:
+            baker.make(OrderItem, order=order, product_info=product_info, quantity=2)
+        # статус меняется через update, чтобы не отправлять письма
+        Order.objects.filter(id=order.id).update(state=state)
+    return user
+
+
+@pytest.mark.django_db
+def test_product_info_fast_serializer_matches(orders):
+    """
+    Быстрые сериализаторы товара дают тот же JSON, что и ProductInfoSerializer
+    """
+    product_infos = ProductInfo.objects.select_related('product__category').prefetch_related(
+        'product_parameters__parameter').order_by('id')
+    for shop_id in Shop.objects.values_list('id', flat=True):
+        rebuild_shop_catalog(shop_id)
+
+    expected = render(ProductInfoSerializer(product_infos, many=True).data)
+
+    assert render(ProductInfoFastSerializer(product_infos, many=True).data) == expected
+    assert render(CatalogItemSerializer(CatalogItem.objects.order_by('pk'), many=True).data) == expected
+
+
+@pytest.mark.django_db
+def test_order_fast_serializer_matches(orders):
+    """
+    OrderFastSerializer дает тот же JSON, что и OrderSerializer
+    """
+    for queryset in (get_queryset_orders(user_id=orders.id, exclude_state='basket'),
+                     get_queryset_orders(user_id=orders.id, state='basket')):
+        queryset = queryset.order_by('id')
+
+        assert render(OrderFastSerializer(queryset, many=True).data) == render(
+            OrderSerializer(queryset, many=True).data)